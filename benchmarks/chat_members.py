@@ -0,0 +1,58 @@
+"""
+Benchmark of building member lists of large group chats.
+
+Run from the root of the repository::
+
+    python -m benchmarks.chat_members
+"""
+import timeit
+from contextlib import suppress
+
+from ehforwarderbot.chat import GroupChat
+
+MODULE = dict(module_id="benchmarks.slave", module_name="Benchmark slave", channel_emoji="⏱")
+
+
+def make_group() -> GroupChat:
+    return GroupChat(uid="group", name="Group", **MODULE)
+
+
+def one_by_one(size: int):
+    """Add members one by one, checking for duplicates and verifying each time."""
+    group = make_group()
+    for i in range(size):
+        uid = f"member{i}"
+        with suppress(KeyError):
+            group.get_member(uid)
+            continue
+        group.add_member(name=uid, uid=uid)
+        group.verify()
+
+
+def plain_loop(size: int):
+    """Add members one by one with ``add_member``, without checking for
+    duplicates or verifying."""
+    group = make_group()
+    for i in range(size):
+        group.add_member(name=f"member{i}", uid=f"member{i}")
+
+
+def in_batch(size: int):
+    """Add members with ``add_members``."""
+    group = make_group()
+    group.add_members({"name": f"member{i}", "uid": f"member{i}"} for i in range(size))
+
+
+def main():
+    for size in (10_000, 100_000):
+        for fn in (in_batch, plain_loop, one_by_one):
+            if fn is one_by_one and size > 10_000:
+                # Verifying on every member is quadratic.
+                print(f"{fn.__name__:>10} {size:>7} members: skipped")
+                continue
+            seconds = min(timeit.repeat(lambda: fn(size), number=1, repeat=3))
+            print(f"{fn.__name__:>10} {size:>7} members: {seconds:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
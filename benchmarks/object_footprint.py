@@ -0,0 +1,87 @@
+"""
+Benchmark of memory footprint of chats, members and messages, and of the
+time to pickle them.
+
+Run from the root of the repository::
+
+    python -m benchmarks.object_footprint
+
+Results are printed along with the ones measured on CPython 3.11 before
+attributes are stored in ``__slots__``.
+"""
+import gc
+import pickle
+import timeit
+import tracemalloc
+from typing import Callable, List
+
+from ehforwarderbot import MsgType
+from ehforwarderbot.chat import GroupChat, ChatMember
+from ehforwarderbot.message import Message, LinkAttribute, LocationAttribute
+
+MODULE = dict(module_id="benchmarks.slave", module_name="Benchmark slave", channel_emoji="⏱")
+
+GROUP = GroupChat(uid="group", name="Group", **MODULE)
+
+# Bytes per object, before ``__slots__``.
+BASELINE_FOOTPRINT = {
+    "make_member": 224,
+    "make_message": 368,
+    "make_link": 104,
+    "make_location": 88,
+}
+
+# Seconds of 200 pickling round trips of a message in a group of 1000
+# members, before ``__slots__``.
+BASELINE_ROUND_TRIP = 0.78
+
+
+def make_member(uid: str) -> ChatMember:
+    return ChatMember(GROUP, name=uid, uid=uid)
+
+
+def make_message(uid: str) -> Message:
+    return Message(chat=GROUP, author=GROUP.self, type=MsgType.Text, text="text", uid=uid)
+
+
+def make_link(uid: str) -> LinkAttribute:
+    return LinkAttribute(title="title", url="https://example.com/")
+
+
+def make_location(uid: str) -> LocationAttribute:
+    return LocationAttribute(latitude=0.0, longitude=0.0)
+
+
+def footprint(factory: Callable[[str], object], size: int) -> float:
+    """Average number of bytes allocated per object created by the factory."""
+    # IDs are created before tracing to leave them out of the result.
+    uids = [f"id{i}" for i in range(size)]
+    objects: List[object] = [None] * size
+    gc.collect()
+    tracemalloc.start()
+    for i, uid in enumerate(uids):
+        objects[i] = factory(uid)
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return current / size
+
+
+def round_trip(size: int, number: int) -> float:
+    """Seconds taken to pickle and unpickle a message in a group of the given size."""
+    group = GroupChat(uid="group", name="Group", **MODULE)
+    for i in range(size):
+        group.add_member(name=f"Member {i}", uid=f"member{i}")
+    msg = Message(chat=group, author=group.get_member("member0"), type=MsgType.Text, text="text", uid="1")
+    return min(timeit.repeat(lambda: pickle.loads(pickle.dumps(msg)), number=number, repeat=5))
+
+
+def main():
+    size = 100_000
+    for factory in (make_member, make_message, make_link, make_location):
+        print(f"{factory.__name__}: {footprint(factory, size):.1f} bytes per object "
+              f"(baseline {BASELINE_FOOTPRINT[factory.__name__]})")
+    print(f"pickle round trips: {round_trip(1000, 200):.2f} s (baseline {BASELINE_ROUND_TRIP:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark of size and speed of serialized messages, with pickle and with
+:mod:`ehforwarderbot.serialization`.
+
+Run from the root of the repository::
+
+    python -m benchmarks.serialization
+"""
+import pickle
+import timeit
+from typing import Callable, Any
+
+from ehforwarderbot import Message, MsgType, serialization
+from ehforwarderbot.chat import GroupChat
+from ehforwarderbot.message import Substitutions
+
+MODULE = dict(module_id="benchmarks.slave", module_name="Benchmark slave", channel_emoji="⏱")
+
+
+def make_message(size: int) -> Message:
+    """A reply with a mention in a group of the given size."""
+    group = GroupChat(uid="group", name="Group", **MODULE)
+    group.add_members({"name": f"Member {i}", "uid": f"member{i}"} for i in range(size))
+    target = Message(chat=group, author=group.get_member("member1"), type=MsgType.Text,
+                     text="Question", uid="1")
+    return Message(chat=group, author=group.get_member("member0"), type=MsgType.Text,
+                   text="@Member 2 answer", uid="2", target=target,
+                   substitutions=Substitutions({(0, 9): group.get_member("member2")}))
+
+
+def measure(name: str, dumps: Callable[[Message], bytes], loads: Callable[[bytes], Any], msg: Message):
+    data = dumps(msg)
+    number = 200
+    dump_time = timeit.timeit(lambda: dumps(msg), number=number) / number
+    load_time = timeit.timeit(lambda: loads(data), number=number) / number
+    print(f"  {name}: {len(data)} bytes, dumps {dump_time * 1e6:.1f} µs, loads {load_time * 1e6:.1f} µs")
+
+
+def main():
+    for size in (3, 100, 1000):
+        msg = make_message(size)
+        print(f"Group of {size} members:")
+        measure("pickle", lambda m: pickle.dumps(m, pickle.HIGHEST_PROTOCOL), pickle.loads, msg)
+        measure("serialization", serialization.dumps,
+                lambda d: serialization.loads(d, resolve_chats=False), msg)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 # coding=utf-8
 import argparse
 import atexit
+import builtins
 import gettext
 import logging
 import logging.config
@@ -8,15 +9,17 @@ import mimetypes
 import signal
 import sys
 import threading
-from typing import Dict
+import time
+from typing import Dict, Any
 
 import pkg_resources
 
-from . import config, utils
+from . import config, utils, exceptions
 from . import coordinator
 from .__version__ import __version__
 from .channel import MasterChannel, SlaveChannel
 from .middleware import Middleware
+from .retry import RetryPolicy
 from .utils import LogLevelFilter
 
 # gettext.install('ehforwarderbot', 'locale')
@@ -47,6 +50,14 @@ parser.add_argument("-p", "--profile",
 parser.add_argument("--trace-threads", action='store_true',
                     help=_("Trace hanging threads which are preventing EFB from stopping."))
 
+subparsers = parser.add_subparsers(dest="command", metavar="command")
+dead_letters_parser = subparsers.add_parser("dead-letters",
+                                            help=_("Inspect and deliver again messages failed to deliver."))
+dead_letters_parser.add_argument("action", choices=("list", "replay", "remove"), nargs="?", default="list",
+                                 help=_("List, deliver again, or remove messages. (Default: list)"))
+dead_letters_parser.add_argument("ids", nargs="*", metavar="id",
+                                 help=_("IDs of messages to deliver again or remove. (Default: all)"))
+
 telemetry = None  # type: ignore
 signal_call_counter = 0
 MAX_SIG_CALL_BEFORE_FORCE_EXIT = 5
@@ -111,6 +122,59 @@ def stop_gracefully(*_, **__):
         if i.is_alive():
             i.join()
 
+    # Deliver messages still pending in dispatch queues.
+    coordinator.stop_dispatch()
+
+    # Commit messages still pending in the message store.
+    if coordinator.message_store is not None:
+        coordinator.message_store.close()
+    if coordinator.message_id_map is not None:
+        coordinator.message_id_map.close()
+
+    # Save changes to indexes of cached pictures.
+    for cache in coordinator.picture_caches.values():
+        cache.save()
+
+
+def setup_retry_policies(retry_conf: Dict[str, Any]):
+    """
+    Update :data:`.coordinator.retry_policies` with the ``retry`` section
+    of the profile config.
+
+    ``max_attempts``, ``initial_delay`` and ``max_delay`` on the top level
+    apply to all policies, and are overridden per class of exceptions under
+    ``policies``, keyed by the class name. ``null`` under ``policies``
+    disables retrying of the class.
+
+    Raises:
+        ValueError: When a class of exceptions under ``policies`` is not found.
+    """
+    options = ('max_attempts', 'initial_delay', 'max_delay')
+    defaults = {k: retry_conf[k] for k in options if k in retry_conf}
+    overrides = retry_conf.get('policies') or {}
+    policies = coordinator.retry_policies
+    classes = {cls.__name__: cls for cls in policies}
+    for name in overrides:
+        if name not in classes:
+            cls = getattr(exceptions, name, None) or getattr(builtins, name, None)
+            if not (isinstance(cls, type) and issubclass(cls, Exception)):
+                raise ValueError(_("Exception class \"{}\" in retry policies is not found.").format(name))
+            classes[name] = cls
+            policies[cls] = RetryPolicy()
+    for name, cls in classes.items():
+        policy = policies[cls]
+        if name in overrides and overrides[name] is None:
+            policies[cls] = None
+            continue
+        if policy is None:
+            continue
+        values = dict(defaults)
+        values.update(overrides.get(name) or {})
+        policies[cls] = RetryPolicy(max_attempts=int(values.get('max_attempts', policy.max_attempts)),
+                                    initial_delay=float(values.get('initial_delay', policy.initial_delay)),
+                                    max_delay=float(values.get('max_delay', policy.max_delay)),
+                                    multiplier=policy.multiplier, jitter=policy.jitter)
+
 
 def init(conf):
     """
@@ -122,6 +186,49 @@ def init(conf):
     # Initialize mimetypes library
     mimetypes.init([pkg_resources.resource_filename('ehforwarderbot', 'mimetypes')])
 
+    # Setup dispatch queues
+    dispatch_conf = conf.get('dispatch') or {}
+    coordinator.dispatch_workers = int(dispatch_conf.get('workers', coordinator.dispatch_workers))
+    coordinator.dispatch_queue_size = int(dispatch_conf.get('queue_size', coordinator.dispatch_queue_size))
+    coordinator.prefetch_workers = int(dispatch_conf.get('prefetch_workers', coordinator.prefetch_workers))
+    coordinator.prefetch_per_channel = int(dispatch_conf.get('prefetch_per_channel',
+                                                             coordinator.prefetch_per_channel))
+
+    coordinator.incremental_verification = bool(conf.get('incremental_verification', False))
+
+    # Setup chat caches
+    chat_cache_conf = conf.get('chat_cache') or {}
+    coordinator.chat_cache_enabled = bool(chat_cache_conf.get('enabled', False))
+    coordinator.chat_cache_ttl = chat_cache_conf.get('ttl', coordinator.chat_cache_ttl)
+    coordinator.chat_cache_size = int(chat_cache_conf.get('max_size', coordinator.chat_cache_size))
+
+    # Setup picture caches
+    picture_cache_conf = conf.get('picture_cache') or {}
+    coordinator.picture_cache_enabled = bool(picture_cache_conf.get('enabled', False))
+    coordinator.picture_cache_size = int(picture_cache_conf.get('max_size', coordinator.picture_cache_size))
+    coordinator.picture_cache_ttl = picture_cache_conf.get('ttl', coordinator.picture_cache_ttl)
+
+    # Setup media store
+    media_store_conf = conf.get('media_store') or {}
+    coordinator.media_store_size = int(media_store_conf.get('max_size', coordinator.media_store_size))
+    coordinator.media_store_age = media_store_conf.get('max_age', coordinator.media_store_age)
+    coordinator.media_spool_size = int(media_store_conf.get('spool_size', coordinator.media_spool_size))
+
+    # Setup message store
+    message_store_conf = conf.get('message_store') or {}
+    coordinator.message_store_enabled = bool(message_store_conf.get('enabled', False))
+    coordinator.message_store_size = int(message_store_conf.get('max_size', coordinator.message_store_size))
+
+    # Setup retry policies
+    retry_conf = conf.get('retry') or {}
+    coordinator.retry_enabled = bool(retry_conf.get('enabled', False))
+    setup_retry_policies(retry_conf)
+
+    # Setup message ID map
+    message_id_map_conf = conf.get('message_id_map') or {}
+    coordinator.message_id_map_size = int(message_id_map_conf.get('max_size', coordinator.message_id_map_size))
+    coordinator.message_id_map_age = message_id_map_conf.get('max_age', coordinator.message_id_map_age)
+
     # Initialize all channels
     # (Load libraries and modules and init them)
 
@@ -303,6 +410,54 @@ def print_versions(args):
         print(versions)
 
 
+def dead_letters(args, conf):
+    """Inspect, deliver again or remove messages in the dead-letter queue."""
+    queue = coordinator.get_dead_letter_queue()
+    ids = args.ids or queue.ids()
+
+    if args.action == "list":
+        if not ids:
+            print(_("No message is in the dead-letter queue."))
+        for i in ids:
+            letter = queue.get(i)
+            if letter is None:
+                print(_("{id}: Not found.").format(id=i))
+                continue
+            print(_("{id}: To {destination} at {time}, {attempts} attempt(s): {error}")
+                  .format(id=letter.id, destination=letter.destination,
+                          time=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(letter.time)),
+                          attempts=letter.attempts, error=letter.error))
+            print("    {}".format(letter.message))
+        return
+
+    if args.action == "remove":
+        for i in ids:
+            if queue.remove(i):
+                print(_("{id}: Removed.").format(id=i))
+            else:
+                print(_("{id}: Not found.").format(id=i))
+        return
+
+    # Replay
+    init(conf)
+    failed = 0
+    try:
+        for i in ids:
+            try:
+                queue.replay(i)
+                print(_("{id}: Delivered.").format(id=i))
+            except KeyError:
+                failed += 1
+                print(_("{id}: Not found.").format(id=i))
+            except Exception as e:
+                failed += 1
+                print(_("{id}: Failed to deliver: {error!r}").format(id=i, error=e))
+    finally:
+        stop_gracefully()
+    if failed:
+        exit(1)
+
+
 def main():
     args = parser.parse_args()
 
@@ -332,6 +487,9 @@ def main():
     setup_logging(args, conf)
     setup_telemetry(conf['telemetry'])
 
+    if args.command == "dead-letters":
+        return dead_letters(args, conf)
+
     init(conf)
 
     # Only register graceful stop signals when we are ready to start
@@ -0,0 +1,406 @@
+# coding=utf-8
+
+"""
+Caching of chats and profile pictures retrieved from slave channels.
+
+Caches are installed on slave channels by the :mod:`.coordinator` when
+enabled in the configuration. Chats cached are invalidated by
+:class:`.ChatUpdates` and :class:`.MemberUpdates` statuses sent through
+the coordinator.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Optional, Tuple, List, Collection, TYPE_CHECKING, Dict, Callable, Any, BinaryIO, Union
+
+from .types import ChatID
+
+if TYPE_CHECKING:
+    from .channel import SlaveChannel
+    from .chat import Chat, ChatMember
+
+__all__ = ["ChatCache", "PictureCache"]
+
+
+class _ChannelMethodsCache:
+    """Base of caches serving methods of a slave channel."""
+
+    _methods: Tuple[str, ...] = ()
+
+    def __init__(self, channel: 'SlaveChannel'):
+        self.channel: 'SlaveChannel' = channel
+        self._originals: Dict[str, Callable] = {name: getattr(channel, name) for name in self._methods}
+        self._installed = False
+
+    def install(self):
+        """Serve methods of the channel from this cache."""
+        if self._installed:
+            return
+        for name in self._methods:
+            self._originals[name] = getattr(self.channel, name)
+            setattr(self.channel, name, getattr(self, name))
+        self._installed = True
+
+    def uninstall(self):
+        """Restore methods of the channel replaced by :meth:`install`."""
+        if not self._installed:
+            return
+        for name in self._methods:
+            method = self._originals[name]
+            if getattr(method, '__func__', None) is getattr(type(self.channel), name, None):
+                # Drop the instance attribute if the original is the method of the class.
+                delattr(self.channel, name)
+            else:
+                setattr(self.channel, name, method)
+        self._installed = False
+
+
+class ChatCache(_ChannelMethodsCache):
+    """
+    A cache of chats in front of :meth:`.SlaveChannel.get_chat` and
+    :meth:`.SlaveChannel.get_chats` of a slave channel.
+
+    Chats are kept for at most :attr:`ttl` seconds, and the least recently
+    used chats are evicted when there are more than :attr:`max_size` of them.
+    The list of chats from :meth:`~.SlaveChannel.get_chats` is cached as
+    a whole with the same TTL, and chats in it are also cached individually.
+    Chats not found are not cached.
+
+    Attributes:
+        channel (:obj:`.SlaveChannel`): The slave channel cached.
+        ttl (Optional[float]): Number of seconds a chat is kept,
+            ``None`` to keep chats until invalidated or evicted.
+        max_size (int): Maximum number of chats kept, ``0`` for unlimited.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups passed to the slave channel.
+    """
+
+    _methods = ('get_chat', 'get_chats')
+
+    def __init__(self, channel: 'SlaveChannel', ttl: Optional[float] = 300, max_size: int = 1024):
+        """
+        Args:
+            channel: The slave channel to cache.
+            ttl: Number of seconds a chat is kept, ``None`` for no expiry.
+            max_size: Maximum number of chats kept, ``0`` for unlimited.
+        """
+        super().__init__(channel)
+        self.ttl: Optional[float] = ttl
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self._chats: 'OrderedDict[ChatID, Tuple[float, Chat]]' = OrderedDict()
+        self._list: 'Optional[Tuple[float, List[Chat]]]' = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of chats cached individually."""
+        return len(self._chats)
+
+    def _expiry(self) -> float:
+        if self.ttl is None:
+            return float('inf')
+        return time.monotonic() + self.ttl
+
+    def _put(self, chat: 'Chat', expiry: float):
+        self._chats[chat.uid] = (expiry, chat)
+        self._chats.move_to_end(chat.uid)
+        if self.max_size:
+            while len(self._chats) > self.max_size:
+                self._chats.popitem(last=False)
+
+    def get_chat(self, chat_uid: ChatID) -> 'Chat':
+        """
+        Get a chat from the cache, or from the slave channel
+        if it is not cached or expired.
+
+        Raises:
+            EFBChatNotFound: Raised by the slave channel.
+        """
+        with self._lock:
+            entry = self._chats.get(chat_uid)
+            if entry is not None and entry[0] > time.monotonic():
+                self._chats.move_to_end(chat_uid)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        chat = self._originals['get_chat'](chat_uid)
+        with self._lock:
+            self._put(chat, self._expiry())
+        return chat
+
+    def get_chats(self) -> Collection['Chat']:
+        """Get the list of all chats from the cache, or from the slave
+        channel if it is not cached or expired."""
+        with self._lock:
+            if self._list is not None and self._list[0] > time.monotonic():
+                self.hits += 1
+                return self._list[1].copy()
+            self.misses += 1
+        chats = list(self._originals['get_chats']())
+        with self._lock:
+            expiry = self._expiry()
+            self._list = (expiry, chats)
+            for chat in chats:
+                self._put(chat, expiry)
+        return chats.copy()
+
+    def invalidate(self, chat_uid: Optional[ChatID] = None):
+        """
+        Drop a chat, and the list of all chats.
+
+        Args:
+            chat_uid: ID of the chat to drop, ``None`` to drop all chats.
+        """
+        with self._lock:
+            self._list = None
+            if chat_uid is None:
+                self._chats.clear()
+            else:
+                self._chats.pop(chat_uid, None)
+
+    def invalidate_list(self):
+        """Drop the list of all chats, keeping chats cached individually."""
+        with self._lock:
+            self._list = None
+
+
+_PictureKey = Tuple[ChatID, ...]
+
+
+class PictureCache(_ChannelMethodsCache):
+    """
+    A disk-backed cache of profile pictures in front of
+    :meth:`.SlaveChannel.get_chat_picture` and
+    :meth:`.SlaveChannel.get_chat_member_picture` of a slave channel.
+
+    Pictures are stored by the SHA-256 hash of their content, so the same
+    picture shared by multiple chats or members is stored once. A cached
+    picture is served without calling the slave channel when:
+
+    * :meth:`.SlaveChannel.get_chat_picture_version` gives the same version
+      as the one cached, or
+    * the slave channel gives no version, and the picture was retrieved
+      less than :attr:`ttl` seconds ago.
+
+    The least recently used pictures are evicted when the total size of
+    pictures exceeds :attr:`max_size`. Errors raised by the slave channel
+    are not cached.
+
+    Changes to the index of pictures are saved to the disk every
+    :attr:`batch_size` changes, and on :meth:`save` or :meth:`uninstall`.
+    Pictures not in the index saved, e.g. after a crash, are discarded when
+    the cache is loaded again.
+
+    Pictures served from the cache are copies in temporary files, which can
+    be deleted once closed as with the slave channel.
+
+    Attributes:
+        channel (:obj:`.SlaveChannel`): The slave channel cached.
+        path (Path): Directory of the cache, defaulted to
+            ``picture_cache`` under the data path of the channel.
+        max_size (int): Maximum total size of pictures in bytes,
+            ``0`` for unlimited.
+        ttl (Optional[float]): Number of seconds a picture without a version
+            is served from the cache, ``None`` to always retrieve it again.
+        batch_size (int): Number of changes to the index saved at once.
+        hits (int): Number of pictures served from the cache.
+        misses (int): Number of pictures retrieved from the slave channel.
+    """
+
+    _methods = ('get_chat_picture', 'get_chat_member_picture')
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, channel: 'SlaveChannel', path: Optional[Path] = None,
+                 max_size: int = 64 * 1024 * 1024, ttl: Optional[float] = None, batch_size: int = 32):
+        """
+        Args:
+            channel: The slave channel to cache.
+            path: Directory of the cache.
+            max_size: Maximum total size of pictures in bytes, ``0`` for unlimited.
+            ttl: Number of seconds a picture without a version is served
+                from the cache, ``None`` to always retrieve it again.
+            batch_size: Number of changes to the index saved at once.
+        """
+        super().__init__(channel)
+        if path is None:
+            from . import utils
+            path = utils.get_data_path(channel.channel_id) / "picture_cache"
+        self.path: Path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size: int = max_size
+        self.ttl: Optional[float] = ttl
+        self.batch_size: int = batch_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[_PictureKey, Dict[str, Any]]' = OrderedDict()
+        # Number of entries referring to each picture, keyed by file name
+        self._refs: Dict[str, int] = dict()
+        self._size = 0
+        # Number of changes not saved to the index
+        self._unsaved = 0
+        self._load_index()
+
+    @property
+    def size(self) -> int:
+        """Total size of pictures cached in bytes."""
+        return self._size
+
+    def __len__(self) -> int:
+        """Number of chats and members with pictures cached."""
+        return len(self._entries)
+
+    def _load_index(self):
+        index = self.path / self.INDEX_NAME
+        if not index.exists():
+            return
+        try:
+            with index.open() as f:
+                entries = json.load(f)
+            for entry in entries:
+                key = tuple(entry.pop('key'))
+                self._add(key, entry)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # Start over with a corrupted index.
+            self._entries.clear()
+            self._refs.clear()
+            self._size = 0
+        # Pictures stored after the index is last saved
+        for i in self.path.iterdir():
+            if i.name != self.INDEX_NAME and i.name not in self._refs and i.is_file():
+                with suppress(OSError):
+                    i.unlink()
+
+    def _add(self, key: _PictureKey, entry: Dict[str, Any]):
+        name = entry['hash'] + entry['suffix']
+        if name not in self._refs:
+            self._refs[name] = 0
+            self._size += entry['size']
+        # Referred before dropping the previous entry, which may use the same picture.
+        self._refs[name] += 1
+        self._drop(key)
+        self._entries[key] = entry
+
+    def _drop(self, key: _PictureKey):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        name = entry['hash'] + entry['suffix']
+        self._refs[name] -= 1
+        if not self._refs[name]:
+            # Picture not used by any other chat.
+            del self._refs[name]
+            self._size -= entry['size']
+            with suppress(FileNotFoundError):
+                (self.path / name).unlink()
+
+    def _save_index(self):
+        entries = [dict(entry, key=list(key)) for key, entry in self._entries.items()]
+        with NamedTemporaryFile('w', dir=str(self.path), suffix=".tmp", delete=False) as f:
+            json.dump(entries, f)
+        os.replace(f.name, str(self.path / self.INDEX_NAME))
+        self._unsaved = 0
+
+    def _changed(self):
+        self._unsaved += 1
+        if self._unsaved >= self.batch_size:
+            self._save_index()
+
+    def save(self):
+        """Save changes to the index of pictures, if any."""
+        with self._lock:
+            if self._unsaved:
+                self._save_index()
+
+    def uninstall(self):
+        """Restore methods of the channel replaced by :meth:`install`,
+        and save changes to the index of pictures."""
+        super().uninstall()
+        self.save()
+
+    def _evict(self):
+        while self.max_size and self._size > self.max_size and self._entries:
+            self._drop(next(iter(self._entries)))
+
+    @staticmethod
+    def _key(chat: 'Union[Chat, ChatMember]') -> _PictureKey:
+        member_of = getattr(chat, 'chat', None)
+        if member_of is not None:
+            return ChatID("member"), member_of.uid, chat.uid
+        return ChatID("chat"), chat.uid
+
+    def _is_fresh(self, entry: Dict[str, Any], version: Optional[str]) -> bool:
+        if version is not None:
+            return entry.get('version') == version
+        return self.ttl is not None and time.time() - entry['updated'] < self.ttl
+
+    def _get_picture(self, chat: 'Union[Chat, ChatMember]', method: str) -> BinaryIO:
+        key = self._key(chat)
+        version = self.channel.get_chat_picture_version(chat)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry, version):
+                blob = self.path / (entry['hash'] + entry['suffix'])
+                with suppress(FileNotFoundError), blob.open('rb') as source:
+                    file = NamedTemporaryFile(suffix=entry['suffix'])
+                    shutil.copyfileobj(source, file)
+                    file.seek(0)
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return file  # type: ignore
+            self.misses += 1
+
+        file = self._originals[method](chat)
+        data = file.read()
+        file.seek(0)
+        digest = hashlib.sha256(data).hexdigest()
+        name = getattr(file, 'name', None)
+        suffix = Path(name).suffix if isinstance(name, str) else ""
+
+        with self._lock:
+            blob = self.path / (digest + suffix)
+            if not blob.exists():
+                with NamedTemporaryFile(dir=str(self.path), suffix=".tmp", delete=False) as f:
+                    f.write(data)
+                os.replace(f.name, str(blob))
+            self._add(key, {'hash': digest, 'suffix': suffix, 'size': len(data),
+                            'version': version, 'updated': time.time()})
+            self._evict()
+            self._changed()
+        return file
+
+    def get_chat_picture(self, chat: 'Chat') -> BinaryIO:
+        """Get the profile picture of a chat from the cache,
+        or from the slave channel if not cached or outdated."""
+        return self._get_picture(chat, 'get_chat_picture')
+
+    def get_chat_member_picture(self, chat_member: 'ChatMember') -> BinaryIO:
+        """Get the profile picture of a chat member from the cache,
+        or from the slave channel if not cached or outdated."""
+        return self._get_picture(chat_member, 'get_chat_member_picture')
+
+    def invalidate(self, chat: 'Optional[Union[Chat, ChatMember]]' = None):
+        """
+        Retrieve the picture of a chat or member from the slave channel
+        on the next request.
+
+        Args:
+            chat: The chat or member, ``None`` for all pictures.
+        """
+        with self._lock:
+            if chat is None:
+                for key in list(self._entries):
+                    self._drop(key)
+            else:
+                self._drop(self._key(chat))
+            self._changed()
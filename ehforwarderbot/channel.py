@@ -1,7 +1,8 @@
 # coding=utf-8
 
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Set, Callable, TYPE_CHECKING, Sequence, BinaryIO, Collection
+from itertools import islice
+from typing import Optional, Dict, Set, Callable, TYPE_CHECKING, Sequence, BinaryIO, Collection, Iterator, Union
 
 from .constants import MsgType
 from .types import ModuleID, InstanceID, ExtraCommandName, ReactionName, ChatID, MessageID
@@ -31,6 +32,11 @@ class Channel(ABC):
             This ID will be appended with its instance ID when available.
         instance_id (str):
             The instance ID if available.
+        use_message_store (bool):
+            Opt into the message store of the framework. Messages sent to
+            or from the channel are recorded by the coordinator, and
+            :meth:`get_message_by_id` looks them up from the store, unless
+            overridden.
 
     .. _grapheme cluster: http://unicode.org/reports/tr29/
     """
@@ -39,6 +45,7 @@ class Channel(ABC):
     channel_emoji: str = "�"
     channel_id: ModuleID = ModuleID("efb.empty_channel")
     instance_id: Optional[InstanceID] = None
+    use_message_store: bool = False
     __version__: str = 'undefined version'
 
     def __init__(self, instance_id: InstanceID = None):
@@ -159,10 +166,17 @@ class Channel(ABC):
         :exc:`~.exceptions.EFBOperationNotSupported`
         if it is not feasible to perform this for your platform.
 
+        When :attr:`use_message_store` is enabled, the default implementation
+        looks up the message from the message store of the framework,
+        see :meth:`.coordinator.get_message_store`.
+
         Args:
             chat: Chat in slave channel / middleware.
             msg_id: ID of message from the chat in slave channel / middleware.
         """
+        if self.use_message_store:
+            from . import coordinator
+            return coordinator.get_message_store().get(chat.module_id, chat.uid, msg_id)
         raise NotImplementedError()
 
 
@@ -309,3 +323,61 @@ class SlaveChannel(Channel, ABC):
             Collection[:class:`.Chat`]: a list of available chats in the channel.
         """
         raise NotImplementedError()
+
+    def iter_chats(self, offset: int = 0, limit: Optional[int] = None,
+                   filter: 'Optional[Callable[[Chat], bool]]' = None) -> Iterator['Chat']:
+        """
+        Iterate through available chats in the channel, page by page.
+
+        Master channels SHOULD use this method over :meth:`get_chats` to
+        list chats lazily, e.g. in a chat picker, so that only chats shown
+        are retrieved.
+
+        The default implementation is backed by :meth:`get_chats`. Slave
+        channels with a large number of chats SHOULD override this method
+        to retrieve chats from the IM platform on demand.
+
+        Args:
+            offset: Number of chats to skip, after the filter is applied.
+                Use the number of chats already retrieved to get the next page.
+            limit: Maximum number of chats to yield, ``None`` for all
+                remaining chats.
+            filter: A callable returning ``True`` for chats to include.
+                All chats are included if ``None``.
+
+        Returns:
+            Iterator[:class:`.Chat`]: An iterator of chats.
+
+        Examples:
+            .. code-block:: Python
+
+                page = list(slave.iter_chats(offset=20, limit=10,
+                                             filter=lambda c: isinstance(c, GroupChat)))
+        """
+        chats: Iterator['Chat'] = iter(self.get_chats())
+        if filter is not None:
+            chats = (i for i in chats if filter(i))
+        return islice(chats, offset, None if limit is None else offset + limit)
+
+    def get_chat_picture_version(self, chat: 'Union[Chat, ChatMember]') -> Optional[str]:
+        """
+        Get a version of the profile picture of a chat or a chat member,
+        without retrieving the picture itself.
+
+        The version can be any string that changes when the picture
+        changes, e.g. an ID, a hash or a modification time of the picture
+        provided by the IM platform. When the picture cache is enabled,
+        pictures with the same version are served from the cache instead of
+        calling :meth:`get_chat_picture` or :meth:`get_chat_member_picture`.
+
+        This method SHOULD NOT take significantly more time or network
+        traffic than retrieving the picture. The default implementation
+        returns ``None``.
+
+        Args:
+            chat: The chat or chat member.
+
+        Returns:
+            The version of the picture, or ``None`` if not available.
+        """
+        return None
@@ -1,20 +1,29 @@
 # coding=utf-8
 
 import copy
+import copyreg
+import threading
 import warnings
+import weakref
 from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager, suppress
 from enum import Enum
-from typing import Dict, Any, Optional, TypeVar, MutableSequence
+from typing import Dict, Any, Optional, TypeVar, MutableSequence, Iterable, List, Union, overload, Mapping, \
+    Callable, Tuple, Iterator, Type, cast
 
+from . import coordinator
 from .channel import SlaveChannel
 from .coordinator import translator
+from .exceptions import EFBChannelNotFound, EFBChatNotFound
 from .middleware import Middleware
 from .types import ModuleID, ChatID
+from .utils import _get_slots_state, _set_slots_state
 
 __all__ = ['BaseChat',
            'Chat', 'PrivateChat', 'SystemChat', 'GroupChat',
            'ChatMember', 'SelfChatMember', 'SystemChatMember',
-           'ChatNotificationState']
+           'ChatMembers', 'ChatNotificationState', 'ModuleDescriptor', 'identity_pickling']
 
 
 class ChatNotificationState(Enum):
@@ -35,6 +44,121 @@ class ChatNotificationState(Enum):
     """All messages in the chat triggers notifications."""
 
 
+class ModuleDescriptor:
+    """
+    Metadata of the module a chat or member belongs to.
+
+    Descriptors are interned and immutable: all chats and members of the
+    same module refer to the same object, which is only stored once in
+    memory, and pickled once per payload. Use :meth:`get` to obtain one.
+
+    Attributes:
+        module_id (:obj:`.ModuleID` (str)): Unique ID of the module.
+        module_name (str): Name of the module.
+        channel_emoji (str): Emoji of the channel, empty string if the
+            module is a middleware.
+    """
+
+    __slots__ = ('module_id', 'module_name', 'channel_emoji', '__weakref__')
+
+    _interned: 'weakref.WeakValueDictionary[Tuple[str, str, str], ModuleDescriptor]' = \
+        weakref.WeakValueDictionary()
+    _lock = threading.Lock()
+
+    module_id: ModuleID
+    module_name: str
+    channel_emoji: str
+
+    @classmethod
+    def get(cls, module_id: ModuleID = ModuleID(""), module_name: str = "",
+            channel_emoji: str = "") -> 'ModuleDescriptor':
+        """Get the descriptor with the metadata given.
+
+        Args:
+            module_id: Unique ID of the module.
+            module_name: Name of the module.
+            channel_emoji: Emoji of the channel.
+        """
+        key = (module_id, module_name, channel_emoji)
+        descriptor = cls._interned.get(key)
+        if descriptor is None:
+            with cls._lock:
+                descriptor = cls._interned.get(key)
+                if descriptor is None:
+                    descriptor = object.__new__(cls)
+                    object.__setattr__(descriptor, 'module_id', module_id)
+                    object.__setattr__(descriptor, 'module_name', module_name)
+                    object.__setattr__(descriptor, 'channel_emoji', channel_emoji)
+                    cls._interned[key] = descriptor
+        return descriptor
+
+    def replace(self, **kwargs: str) -> 'ModuleDescriptor':
+        """Get the descriptor with some of the metadata replaced."""
+        values = {'module_id': self.module_id,
+                  'module_name': self.module_name,
+                  'channel_emoji': self.channel_emoji}
+        values.update(kwargs)
+        return self.get(**values)  # type: ignore
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("Module descriptors are immutable.")
+
+    def __reduce__(self):
+        # Interned again when unpickled.
+        return ModuleDescriptor.get, (self.module_id, self.module_name, self.channel_emoji)
+
+    def __eq__(self, other):
+        return isinstance(other, ModuleDescriptor) and \
+            (self.module_id, self.module_name, self.channel_emoji) == \
+            (other.module_id, other.module_name, other.channel_emoji)
+
+    def __hash__(self):
+        return hash((self.module_id, self.module_name, self.channel_emoji))
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(module_id={self.module_id!r}, "
+                f"module_name={self.module_name!r}, channel_emoji={self.channel_emoji!r})")
+
+
+_identity_pickling = threading.local()
+
+
+@contextmanager
+def identity_pickling() -> Iterator[None]:
+    """
+    Pickle chats and members by their identity within the context.
+
+    By default, a pickled chat carries all of its members, and a pickled
+    member carries the chat it belongs to, so that pickling a message from
+    a large group also pickles every member of the group. Within this
+    context, chats are pickled with their identity, i.e.
+    :attr:`~.BaseChat.module_id` and :attr:`~.BaseChat.uid`, and their own
+    attributes only. Members are pickled with their own attributes and the
+    chat they belong to.
+
+    When unpickled, chats are looked up with :meth:`.coordinator.get_chat`,
+    and members are looked up from the chats found. If a chat is not found,
+    it is restored from the attributes pickled, with only the members
+    pickled along with it.
+
+    Only chats and members of classes defined in this module are pickled
+    by identity. Objects of other classes are pickled as usual.
+
+    Example:
+        .. code-block:: python
+
+            with identity_pickling():
+                data = pickle.dumps(message)
+            message = pickle.loads(data)
+    """
+    depth = getattr(_identity_pickling, 'depth', 0)
+    _identity_pickling.depth = depth + 1
+    try:
+        yield
+    finally:
+        _identity_pickling.depth = depth
+
+
 class BaseChat(ABC):
     """
     Base chat class, this is an abstract class sharing properties among all
@@ -44,7 +168,17 @@ class BaseChat(ABC):
         ``BaseChat`` objects are picklable, thus it is RECOMMENDED
         to keep any object of its subclass also picklable.
 
+    Note:
+        Attributes of chats and members are stored in ``__slots__`` to
+        reduce the memory footprint, and :attr:`vendor_specific` is only
+        created when accessed. Extra attributes can still be assigned.
+
+        :attr:`module_id`, :attr:`module_name` and :attr:`channel_emoji`
+        are stored in a :class:`ModuleDescriptor` shared by all chats and
+        members of the module, available as :attr:`module`.
+
     Attributes:
+        module (:obj:`ModuleDescriptor`): Metadata of the module.
         module_id (:obj:`.ModuleID` (str)): Unique ID of the module.
         channel_emoji (str): Emoji of the channel, empty string if the chat
             is from a middleware.
@@ -56,8 +190,15 @@ class BaseChat(ABC):
             A text description of the chat, usually known as “bio”,
             “description”, “purpose”, or “topic” of the chat.
         vendor_specific (Dict[str, Any]): Any vendor specific attributes.
+
+    Chats are hashable by their identity, i.e. :attr:`module_id` and
+    :attr:`uid`, so that they can be used in sets and as dict keys.
+    Members are identified by their :attr:`uid` and the chat they belong to.
     """
 
+    # ``__dict__`` is only created when attributes not listed here are assigned.
+    __slots__ = ('module', 'name', 'alias', 'uid', '_vendor_specific', 'description', '_verified', '__dict__', '__weakref__')
+
     # Allow mypy to recognize subclass output for `return self` methods.
     _BaseChatSelf = TypeVar('_BaseChatSelf', bound='BaseChat', covariant=True)
 
@@ -71,7 +212,8 @@ class BaseChat(ABC):
                  uid: ChatID = ChatID(""),
                  id: ChatID = ChatID(""),
                  vendor_specific: Dict[str, Any] = None,
-                 description: str = ""):
+                 description: str = "",
+                 module: Optional[ModuleDescriptor] = None):
         """
         Args:
             channel (Optional[:obj:`.SlaveChannel`]):
@@ -91,23 +233,22 @@ class BaseChat(ABC):
                 A text description of the chat, usually known as “bio”,
                 “description”, “purpose”, or “topic” of the chat.
             vendor_specific (Dict[str, Any]): Any vendor specific attributes.
+            module (Optional[ModuleDescriptor]): Descriptor of the module,
+                taking precedence over other arguments of the module.
         """
-        if channel:
+        if module is not None:
+            self.module = module
+        elif channel:
             if isinstance(channel, SlaveChannel):
-                self.module_name = channel.channel_name
-                self.channel_emoji = channel.channel_emoji
-                self.module_id = channel.channel_id
+                self.module = ModuleDescriptor.get(channel.channel_id, channel.channel_name,
+                                                   channel.channel_emoji)
             else:
                 raise ValueError(
                     "channel value should be an SlaveChannel object")
         elif isinstance(middleware, Middleware):
-            self.module_id = middleware.middleware_id
-            self.module_name = middleware.middleware_name
-            self.channel_emoji = ""
+            self.module = ModuleDescriptor.get(middleware.middleware_id, middleware.middleware_name)
         else:
-            self.module_name = module_name
-            self.channel_emoji = channel_emoji
-            self.module_id = module_id
+            self.module = ModuleDescriptor.get(module_id, module_name, channel_emoji)
 
         self.name: str = name
         self.alias: Optional[str] = alias
@@ -116,9 +257,45 @@ class BaseChat(ABC):
             self.uid: ChatID = id
         else:
             self.uid = uid
-        self.vendor_specific: Dict[str,
-                                   Any] = vendor_specific if vendor_specific is not None else dict()
+        # Created on demand, see ``vendor_specific``.
+        self._vendor_specific: Optional[Dict[str, Any]] = vendor_specific
         self.description: str = description
+        self._verified: Any = None
+
+    @property
+    def module_id(self) -> ModuleID:
+        return self.module.module_id
+
+    @module_id.setter
+    def module_id(self, value: ModuleID):
+        self.module = self.module.replace(module_id=value)
+
+    @property
+    def module_name(self) -> str:
+        return self.module.module_name
+
+    @module_name.setter
+    def module_name(self, value: str):
+        self.module = self.module.replace(module_name=value)
+
+    @property
+    def channel_emoji(self) -> str:
+        return self.module.channel_emoji
+
+    @channel_emoji.setter
+    def channel_emoji(self, value: str):
+        self.module = self.module.replace(channel_emoji=value)
+
+    @property
+    def vendor_specific(self) -> Dict[str, Any]:
+        if self._vendor_specific is None:
+            # Created on the first access without invalidating the verification.
+            object.__setattr__(self, '_vendor_specific', dict())
+        return self._vendor_specific  # type: ignore
+
+    @vendor_specific.setter
+    def vendor_specific(self, value: Dict[str, Any]):
+        self._vendor_specific = value
 
     @property
     def id(self) -> ChatID:
@@ -150,11 +327,53 @@ class BaseChat(ABC):
         """Return a shallow copy of the object."""
         return copy.copy(self)
 
+    def __getstate__(self) -> Dict[str, Any]:
+        state = _get_slots_state(self)
+        # Verification state is not carried over
+        state.pop('_verified', None)
+        # Keep the same format as objects pickled without ``__slots__``.
+        state.pop('_vendor_specific', None)
+        state['vendor_specific'] = self.vendor_specific
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        if 'module' not in state:
+            # Objects pickled before ``ModuleDescriptor`` is introduced
+            state['module'] = ModuleDescriptor.get(state.pop('module_id', ModuleID("")),
+                                                   state.pop('module_name', ""),
+                                                   state.pop('channel_emoji', ""))
+        # Verified in full for the first time.
+        self._verified = None
+        _set_slots_state(self, state)
+
+    def __copy__(self):
+        # Copy attributes as is, bypassing ``__getstate__``.
+        obj = self.__class__.__new__(self.__class__)
+        _set_slots_state(obj, _get_slots_state(self))
+        return obj
+
+    def _verification_token(self) -> Any:
+        """A snapshot of states checked by :meth:`verify`, which
+        invalidates the previous verification when changed.
+        """
+        return self.module, self.name, self.alias, self.uid, self.description
+
+    def _is_verified(self) -> bool:
+        """Check if the object is verified and not changed since then."""
+        verified = self._verified
+        return verified is not None and verified == self._verification_token()
+
+    def _mark_verified(self):
+        self._verified = self._verification_token()
+
     @abstractmethod
     def verify(self):
         """
         Verify the completeness of the data.
 
+        Result of the verification is cached until any attribute is
+        assigned, or members are added or removed for chats.
+
         Raises:
             AssertionError: When this chat is invalid.
         """
@@ -178,6 +397,11 @@ class BaseChat(ABC):
     def __eq__(self, other):
         return self.module_id == other.module_id and self.uid == other.uid
 
+    def __hash__(self):
+        # Consistent with ``__eq__``. Do not change the identity of objects
+        # used in sets or as dict keys.
+        return hash((self.module_id, self.uid))
+
     def __str__(self):
         return f"<{self.__class__.__name__}: {self.long_name} ({self.uid}) @ {self.module_name}>"
 
@@ -196,6 +420,10 @@ class BaseChat(ABC):
         )
 
 
+_BASE_CHAT_UID = BaseChat.__dict__['uid']
+"""Slot of :attr:`BaseChat.uid`, wrapped by :attr:`ChatMember.uid`."""
+
+
 class ChatMember(BaseChat):
     """Member of a chat. Usually indicates a member in a group, or the other
     participant in a private chat. Chat bots created by the users of the
@@ -217,6 +445,9 @@ class ChatMember(BaseChat):
         ``ChatMember`` objects are picklable, thus it is RECOMMENDED
         to keep any object of its subclass also picklable.
     """
+
+    __slots__ = ('chat',)
+
     def __init__(self, chat: 'Chat', *,
                  name: str = "", alias: Optional[str] = None, uid: ChatID = ChatID(""),
                  id: ChatID = ChatID(""),
@@ -238,19 +469,48 @@ class ChatMember(BaseChat):
             middleware (:class:`.Middleware`): Initialize this chat as a part
                 of a middleware.
         """
-        if middleware:
-            super().__init__(module_name=middleware.middleware_name, channel_emoji="",
-                             module_id=middleware.middleware_id, name=name, alias=alias, id=id, uid=uid,
-                             vendor_specific=vendor_specific, description=description)
-        else:
-            super().__init__(module_name=chat.module_name, channel_emoji=chat.channel_emoji,
-                             module_id=chat.module_id, name=name, alias=alias, id=id, uid=uid,
-                             vendor_specific=vendor_specific, description=description)
+        # Share the module descriptor of the chat.
+        super().__init__(name=name, alias=alias, id=id, uid=uid, middleware=middleware,
+                         vendor_specific=vendor_specific, description=description,
+                         module=None if middleware else chat.module)
         self.chat: 'Chat' = chat
 
+    @property  # type: ignore
+    def uid(self) -> ChatID:
+        return _BASE_CHAT_UID.__get__(self, ChatMember)
+
+    @uid.setter
+    def uid(self, value: ChatID):
+        _BASE_CHAT_UID.__set__(self, value)
+        # Keep the member index of the chat up to date. The chat is not
+        # assigned yet while the member is being initialized.
+        chat = getattr(self, 'chat', None)
+        if chat is None:
+            return
+        members = getattr(chat, '_members', None)
+        if members is not None and isinstance(members, ChatMembers):
+            members._member_updated(self)
+
+    def _verification_token(self) -> Any:
+        return super()._verification_token(), id(self.chat)
+
     def verify(self):
+        if self._is_verified():
+            return
         super().verify()
         assert isinstance(self.chat, Chat)
+        self._mark_verified()
+
+    def __reduce_ex__(self, protocol):
+        if getattr(_identity_pickling, 'depth', 0) and type(self) in _IDENTITY_MEMBER_CLASSES:
+            # Members shared with the chat are not pickled, see ``identity_pickling``.
+            module = None
+            if self.module is not self.chat.module:
+                module = (self.module_id, self.module_name, self.channel_emoji)
+            return _load_member, (self.chat, type(self), self.uid, self.name, self.alias,
+                                  self.description, module, self._vendor_specific or None)
+        # Same as the default reduction, without looking up ``__getstate__`` again.
+        return copyreg.__newobj__, (type(self),), self.__getstate__()
 
     def __eq__(self, other):
         return (
@@ -259,6 +519,9 @@ class ChatMember(BaseChat):
                 other.chat == self.chat
         )
 
+    def __hash__(self):
+        return hash((self.uid, self.chat))
+
     def __str__(self):
         return f"<{self.__class__.__name__}: {self.long_name} ({self.uid}) @ {self.chat}>"
 
@@ -298,6 +561,8 @@ class SelfChatMember(ChatMember):
         SELF_ID: The default ID of a :class:`.SelfChatMember`.
     """
 
+    __slots__ = ()
+
     SELF_ID = ChatID("__self__")
 
     def __init__(self, chat: 'Chat', *,
@@ -349,6 +614,8 @@ class SystemChatMember(ChatMember):
         SYSTEM_ID: The default ID of a :class:`.SystemChatMember`.
     """
 
+    __slots__ = ()
+
     SYSTEM_ID = ChatID("__system__")
 
     def __init__(self, chat: 'Chat', *,
@@ -379,6 +646,206 @@ class SystemChatMember(ChatMember):
                          middleware=middleware)
 
 
+class ChatMembers(MutableSequence[ChatMember]):
+    """A list of members of a chat, indexed by their IDs.
+
+    This is a mutable sequence behaving like a :obj:`list`, which keeps
+    an index of members by their :attr:`~.BaseChat.uid` and a reference to
+    the :class:`SelfChatMember` (if available), so that looking up a member
+    does not scan through the whole list. When more than one member shares
+    the same ID, the first one in the list is indexed.
+
+    The index is updated when items in the list are changed, or when
+    :attr:`~.BaseChat.uid` of a member in the list is assigned.
+
+    Note:
+        ``ChatMembers`` objects are picklable.
+    """
+
+    def __init__(self, members: Iterable[ChatMember] = ()):
+        """
+        Args:
+            members: Initial members in the list.
+        """
+        self._list: List[ChatMember] = list(members)
+        self._index: Optional[Dict[ChatID, ChatMember]] = None
+        self._self: Optional[SelfChatMember] = None
+        self.generation: int = 0
+        """Number of changes made to the list, used to detect changes."""
+
+    def _reindex(self):
+        # Built again on demand, as members might not be fully
+        # initialized yet while unpickling.
+        self._index = None
+        self._self = None
+
+    def _get_index(self) -> Dict[ChatID, ChatMember]:
+        if self._index is None:
+            self._index = dict()
+            for i in self._list:
+                self._add_to_index(i)
+        return self._index
+
+    def _add_to_index(self, member: ChatMember):
+        index = self._index
+        if index is None or not isinstance(member, ChatMember):
+            return
+        index.setdefault(member.uid, member)
+        if self._self is None and isinstance(member, SelfChatMember):
+            self._self = member
+
+    def _member_updated(self, member: ChatMember):
+        """Update the index when ID of a member is changed."""
+        if self._index is not None and any(i is member for i in self._list):
+            self._reindex()
+
+    @property
+    def self_member(self) -> Optional[SelfChatMember]:
+        """The first :class:`SelfChatMember` in the list, ``None`` if not found."""
+        self._get_index()
+        return self._self
+
+    def get(self, member_id: ChatID) -> Optional[ChatMember]:
+        """Find a member by its ID.
+
+        Args:
+            member_id: ID of the member.
+
+        Returns:
+            The first member with the ID, ``None`` if not found.
+        """
+        member = self._get_index().get(member_id)
+        if member is not None and member.uid != member_id:
+            # ID is changed without notifying the index.
+            self._reindex()
+            member = self._get_index().get(member_id)
+        return member
+
+    def __contains__(self, value: object) -> bool:
+        uid = getattr(value, 'uid', None)
+        if uid is not None:
+            member = self._get_index().get(uid)
+            if member is not None and (member is value or member == value):
+                return True
+        return value in self._list
+
+    @overload
+    def __getitem__(self, index: int) -> ChatMember: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> MutableSequence[ChatMember]: ...
+
+    def __getitem__(self, index):
+        return self._list[index]
+
+    @overload
+    def __setitem__(self, index: int, value: ChatMember) -> None: ...
+
+    @overload
+    def __setitem__(self, index: slice, value: Iterable[ChatMember]) -> None: ...
+
+    def __setitem__(self, index, value):
+        self._list[index] = value
+        self.generation += 1
+        self._reindex()
+
+    @overload
+    def __delitem__(self, index: int) -> None: ...
+
+    @overload
+    def __delitem__(self, index: slice) -> None: ...
+
+    def __delitem__(self, index):
+        del self._list[index]
+        self.generation += 1
+        self._reindex()
+
+    def __len__(self) -> int:
+        return len(self._list)
+
+    def __iter__(self):
+        return iter(self._list)
+
+    def insert(self, index: int, value: ChatMember):
+        self._list.insert(index, value)
+        self.generation += 1
+        if self._list[-1] is value:
+            self._add_to_index(value)
+        else:
+            self._reindex()
+
+    def append(self, value: ChatMember):
+        self._list.append(value)
+        self.generation += 1
+        self._add_to_index(value)
+
+    def extend(self, values: Iterable[ChatMember]):
+        for i in values:
+            self._list.append(i)
+            self._add_to_index(i)
+        self.generation += 1
+
+    def _extend_by_id(self, members: Dict[ChatID, ChatMember]):
+        """Extend the list with members keyed by their IDs, without
+        reading the ID of each member again."""
+        self._list.extend(members.values())
+        self.generation += 1
+        index = self._index
+        if index is None:
+            return
+        deque(map(index.setdefault, members.keys(), members.values()), maxlen=0)
+        if self._self is None:
+            self._self = next((i for i in members.values() if isinstance(i, SelfChatMember)), None)
+
+    def clear(self):
+        self._list.clear()
+        self.generation += 1
+        self._reindex()
+
+    def __eq__(self, other):
+        if isinstance(other, ChatMembers):
+            return self._list == other._list
+        if isinstance(other, list):
+            return self._list == other
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self._list)
+
+    def __getstate__(self):
+        return {'_list': self._list, 'generation': self.generation}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._reindex()
+
+
+MemberLoader = Callable[['Chat'], Iterable[Union[ChatMember, Mapping[str, Any]]]]
+
+
+def _load_members_from_module(chat: 'Chat') -> List[ChatMember]:
+    """Load members of an unpickled chat from the slave channel it belongs to.
+
+    Only the members pickled with the chat are kept if the module is not
+    running, or if it does not know the chat anymore.
+    """
+    try:
+        channel = coordinator.get_module_by_id(chat.module_id)
+        if not isinstance(channel, SlaveChannel):
+            return []
+        origin = channel.get_chat(chat.uid)
+    except (NameError, EFBChannelNotFound, EFBChatNotFound):
+        return []
+    members: List[ChatMember] = []
+    for i in origin.members:
+        if isinstance(i, SelfChatMember):
+            continue
+        member = copy.copy(i)
+        member.chat = chat
+        members.append(member)
+    return members
+
+
 class Chat(BaseChat, ABC):  # lgtm [py/missing-equals]
     """
     A chat object, indicates a user, a group, or a system chat. This class is
@@ -427,11 +894,12 @@ class Chat(BaseChat, ABC):  # lgtm [py/missing-equals]
             “description”, “purpose”, or “topic” of the chat.
         notification (:class:`ChatNotificationState`): Indicate the notification settings of the chat in
             its slave channel (or middleware), defaulted to :const:`~.ChatNotificationState.ALL`.
-        members (list of :obj:`.ChatMember`): Provide a list of members
-            in the chat. Defaulted to an empty ``list``.
+        members (:obj:`.ChatMembers`): Provide a list of members
+            in the chat. Defaulted to an empty list. Any mutable sequence
+            of members assigned is converted to :obj:`.ChatMembers`.
 
-            You can extend this object and implement a ``@property`` method
-            set for loading members on demand.
+            To load members on demand, provide a ``member_loader`` when
+            creating the chat, see :meth:`load_members`.
 
             Note that this list may include members created by middlewares when the object is
             a part of a message, and these members MAY not appear when trying to retrieve
@@ -441,6 +909,8 @@ class Chat(BaseChat, ABC):  # lgtm [py/missing-equals]
         self (Optional[:obj:`SelfChatMember`]): the User as a member of the chat (if available).
     """
 
+    __slots__ = ('_members', '_member_loader', '_member_lock', '_member_loading', 'self', 'notification')
+
     self: Optional[SelfChatMember]
     """The user as a member of the chat (if available)."""
 
@@ -451,7 +921,8 @@ class Chat(BaseChat, ABC):  # lgtm [py/missing-equals]
                  vendor_specific: Dict[str, Any] = None, description: str = "",
                  members: MutableSequence[ChatMember] = None,
                  notification: ChatNotificationState = ChatNotificationState.ALL,
-                 with_self: bool = True):
+                 with_self: bool = True,
+                 member_loader: 'Optional[MemberLoader]' = None):
         """
         Keyword Args:
             module_id (str): Unique ID of the module.
@@ -470,21 +941,129 @@ class Chat(BaseChat, ABC):  # lgtm [py/missing-equals]
                 Defaulted to an empty :obj:`list`.
             vendor_specific (Dict[str, Any]): Any vendor specific attributes.
             with_self (bool): Initialize the chat with the User Themself as a member.
+            member_loader (Optional[Callable[[Chat], Iterable]]):
+                A callable to load members of the chat on demand, see
+                :meth:`load_members`.
         """
         super().__init__(channel=channel, middleware=middleware, module_name=module_name, channel_emoji=channel_emoji,
                          module_id=module_id, name=name, alias=alias, id=id, uid=uid,
                          vendor_specific=vendor_specific, description=description)
-        self.members: MutableSequence[ChatMember] = members if members is not None else []
+        self.members = members if members is not None else []
+        self._member_loader: 'Optional[MemberLoader]' = member_loader
+        # Only chats with members to load need a lock.
+        self._member_lock: Optional[threading.RLock] = threading.RLock() if member_loader is not None else None
+        self._member_loading: bool = False
         if with_self:
             self.self = self.add_self()
         else:
             self.self = None
         self.notification: ChatNotificationState = notification
 
+    @property
+    def members(self) -> MutableSequence[ChatMember]:
+        if not self.members_loaded:
+            self.load_members()
+        return self._members
+
+    @members.setter
+    def members(self, value: MutableSequence[ChatMember]):
+        if not isinstance(value, ChatMembers):
+            value = ChatMembers(value)
+        self._members: ChatMembers = value
+        # Members assigned explicitly are considered as loaded.
+        self._member_loader = None
+
+    @property
+    def members_loaded(self) -> bool:
+        """Indicate if members of the chat are loaded, i.e. no
+        ``member_loader`` is pending."""
+        return getattr(self, '_member_loader', None) is None
+
+    def load_members(self):
+        """Load members of the chat with its ``member_loader``, if not loaded yet.
+
+        Members of a chat with a ``member_loader`` are loaded when
+        :attr:`members` is accessed for the first time, or when a member
+        not known yet is looked up with :meth:`get_member`. Slave channels
+        can provide a loader to avoid fetching members of large groups until
+        they are actually needed:
+
+        .. code-block:: python
+
+            chat = GroupChat(
+                channel=self, name=group.name, uid=ChatID(group.id),
+                member_loader=lambda chat: (
+                    {"name": i.name, "uid": ChatID(i.id)}
+                    for i in api.get_group_members(chat.uid)
+                )
+            )
+
+        The loader is called once with the chat as its only argument, and
+        returns members accepted by :meth:`add_members`. Members added before
+        loading are kept, and loaded members are deduplicated against them.
+
+        When a chat with members not loaded yet is pickled, the loader
+        is not pickled. Members are then loaded from
+        :meth:`.SlaveChannel.get_chat` of the module of the chat on demand.
+        If the module is not running, or the chat is not found there, only
+        the members pickled with the chat are kept.
+
+        Members are loaded by one thread at a time. Other threads reading
+        :attr:`members` wait until loading is finished. If the loader
+        fails, members are loaded again on the next access.
+        """
+        lock = getattr(self, '_member_lock', None)
+        if lock is None or self._member_loader is None:
+            return
+        with lock:
+            loader = self._member_loader
+            # Members are read by the loader itself while loading.
+            if loader is None or self._member_loading:
+                return
+            self._member_loading = True
+            try:
+                self.add_members(loader(self))
+                self._member_loader = None
+            finally:
+                self._member_loading = False
+
+    def _loaded_members(self) -> MutableSequence[ChatMember]:
+        """Members of the chat, without loading pending members."""
+        return self._members
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = super().__getstate__()
+        state.pop('_member_lock', None)
+        state.pop('_member_loading', None)
+        if state.get('_member_loader') is not None:
+            state['_member_loader'] = _load_members_from_module
+        return state
+
+    def __reduce_ex__(self, protocol):
+        if getattr(_identity_pickling, 'depth', 0) and type(self) in _IDENTITY_CHAT_CLASSES:
+            # Members are not pickled, see ``identity_pickling``.
+            return _load_chat, (type(self), self.module_id, self.module_name, self.channel_emoji, self.uid,
+                                self.name, self.alias, self.description, self.notification.value,
+                                self._vendor_specific or None,
+                                self.self.uid if self.self is not None else None)
+        return super().__reduce_ex__(protocol)
+
+    def __setstate__(self, state: Dict[str, Any]):
+        # Objects pickled before ``ChatMembers`` is introduced
+        if 'members' in state:
+            state['_members'] = ChatMembers(state.pop('members'))
+        state.setdefault('_member_loader', None)
+        state['_member_lock'] = threading.RLock() if state['_member_loader'] is not None else None
+        state['_member_loading'] = False
+        super().__setstate__(state)
+
     @property
     def has_self(self) -> bool:
         """Indicate if this chat has yourself."""
-        return any(isinstance(member, SelfChatMember) for member in self.members)
+        members = self._loaded_members()
+        if isinstance(members, ChatMembers):
+            return members.self_member is not None
+        return any(isinstance(member, SelfChatMember) for member in members)
 
     def add_self(self) -> SelfChatMember:
         """Add self to the list of members.
@@ -494,9 +1073,9 @@ class Chat(BaseChat, ABC):  # lgtm [py/missing-equals]
         """
         if getattr(self, 'self', None) and isinstance(self.self, SelfChatMember):
             return self.self
-        assert not any(isinstance(i, SelfChatMember) for i in self.members)
+        assert not self.has_self
         s = SelfChatMember(self)
-        self.members.append(s)
+        self._loaded_members().append(s)
         return s
 
     def add_member(self, name: str, uid: ChatID, alias: Optional[str] = None,
@@ -536,9 +1115,119 @@ class Chat(BaseChat, ABC):  # lgtm [py/missing-equals]
         member = ChatMember(self, name=name, alias=alias, uid=uid,
                             vendor_specific=vendor_specific, description=description,
                             middleware=middleware)
-        self.members.append(member)
+        self._loaded_members().append(member)
         return member
 
+    def add_members(self, members: Iterable[Union[ChatMember, Mapping[str, Any]]]) -> List[ChatMember]:
+        """Add members to the chat in batch, skipping duplicates.
+
+        Members are deduplicated by their IDs, against both members already in
+        the chat and those given earlier. The chat is verified once after all
+        members are added.
+
+        Args:
+            members: Members to add. Each item can either be a
+                :class:`ChatMember` of this chat, or a mapping of keyword
+                arguments of :meth:`add_member` (``name``, ``uid``, ``alias``,
+                ``vendor_specific``, ``description`` and ``middleware``).
+
+        Returns:
+            Members in the same order as given. For duplicated IDs, the
+            member already in the chat (or given first) is returned.
+
+        Examples:
+            .. code-block:: python
+
+                chat.add_members(
+                    {"name": i.name, "uid": ChatID(i.id), "alias": i.remark}
+                    for i in api.get_group_members(chat.uid)
+                )
+        """
+        members_list = self._loaded_members()
+        index: Dict[ChatID, ChatMember]
+        if isinstance(members_list, ChatMembers):
+            index = members_list._get_index()
+        else:
+            index = {i.uid: i for i in reversed(members_list)}
+        added: Dict[ChatID, ChatMember] = dict()
+        result: List[ChatMember] = []
+        for i in members:
+            # Plain dicts are the most common, checked first to skip the ABC check.
+            given = type(i) is not dict and isinstance(i, ChatMember)
+            uid = i.uid if given else i['uid']  # type: ignore
+            member = added.get(uid)
+            if member is None:
+                member = index.get(uid)
+                if member is not None and member.uid != uid:
+                    # ID is changed without notifying the index.
+                    member = self._get_loaded_member(uid)
+            if member is None:
+                new_member: ChatMember = i if given else ChatMember(self, **i)  # type: ignore
+                member = added[uid] = new_member
+            result.append(member)
+        if isinstance(members_list, ChatMembers):
+            members_list._extend_by_id(added)
+        else:
+            for member in added.values():
+                members_list.append(member)
+        self.verify()
+        return result
+
+    def _get_loaded_member(self, member_id: ChatID) -> Optional[ChatMember]:
+        """Find a member by its ID without loading pending members."""
+        members = self._loaded_members()
+        if isinstance(members, ChatMembers):
+            return members.get(member_id)
+        for i in members:
+            if i.uid == member_id:
+                return i
+        return None
+
+    def replace_members(self, members: Iterable[Union[ChatMember, Mapping[str, Any]]]) -> List[ChatMember]:
+        """Replace all members of the chat except the User Themself, in batch.
+
+        Existing members with IDs found in the mapping given are updated
+        in place and kept, so that references to them remain valid.
+        Members are deduplicated by their IDs. The chat is verified once after
+        all members are replaced.
+
+        Note:
+            For :class:`PrivateChat` and :class:`SystemChat`, :attr:`~PrivateChat.other`
+            is not updated by this method.
+
+        Args:
+            members: New members of the chat. Each item can either be a
+                :class:`ChatMember` of this chat, or a mapping of keyword
+                arguments of :meth:`add_member`.
+
+        Returns:
+            Members in the same order as given. For duplicated IDs, the
+            member given first is returned.
+        """
+        new_members: Dict[ChatID, ChatMember] = dict()
+        if self.self is not None:
+            new_members[self.self.uid] = self.self
+        result: List[ChatMember] = []
+        for i in members:
+            uid = i.uid if isinstance(i, ChatMember) else i['uid']
+            member = new_members.get(uid)
+            if member is None:
+                if isinstance(i, ChatMember):
+                    member = i
+                else:
+                    member = self._get_loaded_member(uid)
+                    if member is not None and not isinstance(member, SelfChatMember):
+                        for key, value in i.items():
+                            if key != 'middleware':
+                                setattr(member, key, value)
+                    else:
+                        member = ChatMember(self, **i)
+                new_members[uid] = member
+            result.append(member)
+        self.members = ChatMembers(new_members.values())
+        self.verify()
+        return result
+
     def make_system_member(self, name: str = "", alias: Optional[str] = None, id: ChatID = ChatID(""),
                            uid: ChatID = ChatID(""),
                            vendor_specific: Dict[str, Any] = None, description: str = "",
@@ -592,9 +1281,26 @@ class Chat(BaseChat, ABC):  # lgtm [py/missing-equals]
         member = self.make_system_member(name=name, alias=alias, id=id, uid=uid,
                                          vendor_specific=vendor_specific, description=description,
                                          middleware=middleware)
-        self.members.append(member)
+        self._loaded_members().append(member)
         return member
 
+    def _verification_token(self) -> Any:
+        members = self._loaded_members()
+        if isinstance(members, ChatMembers):
+            return super()._verification_token(), id(members), members.generation
+        return super()._verification_token(), id(members), len(members)
+
+    @abstractmethod
+    def verify(self):
+        if self._is_verified():
+            return
+        super().verify()
+        # Pending members are verified when they are loaded.
+        members = self._loaded_members()
+        assert all(isinstance(member, ChatMember) for member in members), \
+            f"Some members of this chat is not a valid one: {members!r}"
+        self._mark_verified()
+
     def get_member(self, member_id: ChatID) -> ChatMember:
         """Find a member of chat by its ID.
 
@@ -607,10 +1313,13 @@ class Chat(BaseChat, ABC):  # lgtm [py/missing-equals]
         Raises:
             KeyError: when the ID provided is not found.
         """
-        for i in self.members:
-            if i.uid == member_id:
-                return i
-        raise KeyError
+        member = self._get_loaded_member(member_id)
+        if member is None and not self.members_loaded:
+            self.load_members()
+            member = self._get_loaded_member(member_id)
+        if member is None:
+            raise KeyError(member_id)
+        return member
 
     def __str__(self):
         return f"<{self.__class__.__name__}: {self.long_name} ({self.uid}) @ {self.channel_emoji}{self.module_name} ({self.module_id})>"
@@ -625,7 +1334,7 @@ class Chat(BaseChat, ABC):  # lgtm [py/missing-equals]
             f"alias={self.alias!r}, "
             f"uid={self.uid!r}, "
             f"vendor_specific={self.vendor_specific!r}, "
-            f"members={self.members!r}, "
+            f"members={self._loaded_members()!r}, "
             f"notification={self.notification!r}, "
             f"description={self.description!r}"
             f")"
@@ -653,6 +1362,8 @@ class PrivateChat(Chat):
         ``PrivateChat`` objects are picklable, thus it is RECOMMENDED
         to keep any object of its subclass also picklable.
     """
+    __slots__ = ('other',)
+
     other: ChatMember
 
     def __init__(self, *, channel: Optional[SlaveChannel] = None, middleware: Optional[Middleware] = None,
@@ -674,8 +1385,6 @@ class PrivateChat(Chat):
 
     def verify(self):
         super().verify()
-        assert all(isinstance(member, ChatMember) for member in self.members), \
-            f"Some members of this chat is not a valid one: {self.members!r}"
 
 
 class SystemChat(Chat):
@@ -701,6 +1410,8 @@ class SystemChat(Chat):
         to keep any object of its subclass also picklable.
     """
 
+    __slots__ = ('other',)
+
     other: SystemChatMember
 
     def __init__(self, *, channel: Optional[SlaveChannel] = None, middleware: Optional[Middleware] = None,
@@ -718,7 +1429,6 @@ class SystemChat(Chat):
 
     def verify(self):
         super().verify()
-        assert all(isinstance(member, ChatMember) for member in self.members)
 
 
 class GroupChat(Chat):
@@ -747,16 +1457,85 @@ class GroupChat(Chat):
         to keep any object of its subclass also picklable.
     """
 
+    __slots__ = ()
+
     def __init__(self, *, channel: Optional[SlaveChannel] = None, middleware: Optional[Middleware] = None,
                  module_name: str = "", channel_emoji: str = "", module_id: ModuleID = ModuleID(""), name: str = "",
                  alias: Optional[str] = None, id: ChatID = ChatID(""), uid: ChatID = ChatID(""), vendor_specific: Dict[str, Any] = None,
                  description: str = "", notification: ChatNotificationState = ChatNotificationState.ALL,
-                 with_self: bool = True):
+                 with_self: bool = True, member_loader: Optional[MemberLoader] = None):
         super().__init__(channel=channel, middleware=middleware, module_name=module_name, channel_emoji=channel_emoji,
                          module_id=module_id, name=name, alias=alias, id=id, uid=uid, vendor_specific=vendor_specific,
-                         description=description, notification=notification, with_self=with_self)
+                         description=description, notification=notification, with_self=with_self,
+                         member_loader=member_loader)
         self.verify()
 
     def verify(self):
         super().verify()
-        assert all(isinstance(member, ChatMember) for member in self.members)
+
+
+_IDENTITY_CHAT_CLASSES = (PrivateChat, SystemChat, GroupChat)
+_IDENTITY_MEMBER_CLASSES = (ChatMember, SelfChatMember, SystemChatMember)
+
+
+def _restore_chat(cls: Type[Chat], module_id: ModuleID, module_name: str, channel_emoji: str, uid: ChatID,
+                  name: str, alias: Optional[str], description: str, notification: int,
+                  vendor_specific: Dict[str, Any], self_uid: Optional[ChatID],
+                  resolve: bool = True) -> Tuple[Chat, bool]:
+    """Look up a chat by its identity, or restore it from its attributes.
+
+    Shared by :func:`identity_pickling` and :mod:`.serialization`.
+
+    Returns:
+        The chat, and whether it is restored from its attributes.
+    """
+    if resolve:
+        with suppress(EFBChannelNotFound, EFBChatNotFound):
+            return coordinator.get_chat(module_id, uid), False
+    chat = cls(module_id=module_id, module_name=module_name, channel_emoji=channel_emoji,
+               uid=uid, name=name, alias=alias, description=description,
+               notification=ChatNotificationState(notification),
+               vendor_specific=vendor_specific, with_self=self_uid is not None)
+    if chat.self is not None and self_uid is not None:
+        chat.self.uid = self_uid
+    return chat, True
+
+
+def _restore_member(chat: Chat, cls: Type[ChatMember], uid: ChatID, name: str, alias: Optional[str],
+                    description: str, module: Optional[Tuple[ModuleID, str, str]],
+                    vendor_specific: Dict[str, Any], restored: bool) -> ChatMember:
+    """Look up a member by its ID from its chat, or restore it from its attributes.
+
+    Shared by :func:`identity_pickling` and :mod:`.serialization`.
+
+    Args:
+        restored: If the chat is restored by :func:`_restore_chat`, where
+            members restored are the only members known.
+    """
+    with suppress(KeyError):
+        member = chat.get_member(uid)
+        if type(member) is cls:
+            return member
+    member = cls(chat, name=name, alias=alias, uid=uid, description=description,
+                 vendor_specific=vendor_specific)
+    if module is not None:
+        member.module = ModuleDescriptor.get(*module)
+    if restored:
+        chat._loaded_members().append(member)
+    return member
+
+
+def _load_chat(cls: Type[Chat], module_id: ModuleID, module_name: str, channel_emoji: str, uid: ChatID,
+               name: str, alias: Optional[str], description: str, notification: int,
+               vendor_specific: Dict[str, Any], self_uid: Optional[ChatID]) -> Chat:
+    """Look up a chat pickled by identity, or restore it from its attributes."""
+    return _restore_chat(cls, module_id, module_name, channel_emoji, uid, name, alias, description,
+                         notification, vendor_specific, self_uid)[0]
+
+
+def _load_member(chat: Chat, cls: Type[ChatMember], uid: ChatID, name: str, alias: Optional[str],
+                 description: str, module: Optional[Tuple[ModuleID, str, str]],
+                 vendor_specific: Dict[str, Any]) -> ChatMember:
+    """Look up a member pickled by identity from its chat, or restore it from its attributes."""
+    restored = coordinator.chats.get((chat.module_id, chat.uid)) is not chat
+    return _restore_member(chat, cls, uid, name, alias, description, module, vendor_specific, restored)
@@ -12,7 +12,14 @@ from .middleware import Middleware
 
 OPTIONAL_DEFAULTS: Final[Dict[str, Any]] = {
     "logging": {},
-    "telemetry": ''
+    "telemetry": '',
+    "dispatch": {},
+    "chat_cache": {},
+    "picture_cache": {},
+    "media_store": {},
+    "message_store": {},
+    "message_id_map": {},
+    "retry": {}
 }
 
 
@@ -77,4 +84,42 @@ def load_config() -> Dict[str, Any]:
                                      .format(i, middleware))
         else:
             data['middlewares'] = list()
+
+        # - Dispatch queues
+        if not isinstance(data['dispatch'], dict):
+            raise ValueError(_("Dispatch settings must be a dict, but a {} is found.")
+                             .format(type(data['dispatch'])))
+
+        # - Chat cache
+        if not isinstance(data['chat_cache'], dict):
+            raise ValueError(_("Chat cache settings must be a dict, but a {} is found.")
+                             .format(type(data['chat_cache'])))
+
+        # - Picture cache
+        if not isinstance(data['picture_cache'], dict):
+            raise ValueError(_("Picture cache settings must be a dict, but a {} is found.")
+                             .format(type(data['picture_cache'])))
+
+        # - Media store
+        if not isinstance(data['media_store'], dict):
+            raise ValueError(_("Media store settings must be a dict, but a {} is found.")
+                             .format(type(data['media_store'])))
+
+        # - Message store
+        if not isinstance(data['message_store'], dict):
+            raise ValueError(_("Message store settings must be a dict, but a {} is found.")
+                             .format(type(data['message_store'])))
+
+        # - Message ID map
+        if not isinstance(data['message_id_map'], dict):
+            raise ValueError(_("Message ID map settings must be a dict, but a {} is found.")
+                             .format(type(data['message_id_map'])))
+
+        # - Retry
+        if not isinstance(data['retry'], dict):
+            raise ValueError(_("Retry settings must be a dict, but a {} is found.")
+                             .format(type(data['retry'])))
+        if not isinstance(data['retry'].get('policies') or {}, dict):
+            raise ValueError(_("Retry policies must be a dict, but a {} is found.")
+                             .format(type(data['retry']['policies'])))
     return data
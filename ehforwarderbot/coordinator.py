@@ -10,20 +10,51 @@ Attributes:
     slaves (Dict[str, EFBChannel]): Dictionary of running slave channel object.
         Keys are the unique identifier of the channel.
     middlewares (List[Middleware]): List of middlewares
+    modules (Dict[str, Union[Channel, Middleware]]): Index of all
+        registered channels and middlewares. Keys are the module IDs.
+    dispatch_queues (Dict[str, DispatchQueue]): Queues of deliveries to channels.
+        Keys are the unique identifier of the channel.
+    chats (WeakValueDictionary[Tuple[str, str], Chat]): Registry of chats
+        published by slave channels. Keys are ``(module_id, chat_uid)``.
+    chat_caches (Dict[str, ChatCache]): Caches of chats installed on slave
+        channels. Keys are the unique identifier of the channel.
+    picture_caches (Dict[str, PictureCache]): Caches of profile pictures
+        installed on slave channels. Keys are the unique identifier of the channel.
+    media_store (Optional[MediaStore]): Store of media files of the profile,
+        created on demand by :meth:`get_media_store`.
+    message_store (Optional[MessageStore]): Store of messages of the profile,
+        created on demand by :meth:`get_message_store`.
+    message_id_map (Optional[MessageIDMap]): Map of message IDs changed on
+        delivery, created on demand by :meth:`get_message_id_map`.
+    retry_policies (Dict[Type[Exception], Optional[RetryPolicy]]): Policies
+        to retry deliveries by classes of exceptions raised.
+    dead_letter_queue (Optional[DeadLetterQueue]): Queue of messages failed to
+        deliver, created on demand by :meth:`get_dead_letter_queue`.
 """
 
+import logging
 import threading
+import weakref
+from concurrent.futures import Future
 from contextlib import suppress
 from gettext import NullTranslations
-from typing import List, Dict, Optional, cast, TYPE_CHECKING, Union
+from typing import List, Dict, Optional, cast, TYPE_CHECKING, Union, Tuple, Any, Callable, Iterable, BinaryIO, \
+    Type
 
+from .cache import ChatCache, PictureCache
 from .channel import Channel, MasterChannel, SlaveChannel
-from .exceptions import EFBChannelNotFound
+from .dispatch import DispatchQueue, ChatSequencer, PrefetchPool, SequenceTicket
+from .exceptions import EFBChannelNotFound, EFBMessageError, EFBChatNotFound, EFBMessageNotFound, \
+    EFBMessageTypeNotSupported, EFBOperationNotSupported, EFBMessageRetrying
+from .media import MediaStore
 from .middleware import Middleware
-from .types import ModuleID
+from .retry import RetryPolicy, DeadLetterQueue, find_policy
+from .store import MessageStore, MessageIDMap
+from .types import ModuleID, ChatID, MessageID
 
 if TYPE_CHECKING:
     from . import Message
+    from .chat import Chat, BaseChat
     from .status import Status
 
 profile: str = "default"
@@ -41,6 +72,13 @@ slaves: Dict[ModuleID, SlaveChannel] = dict()
 middlewares: List[Middleware] = list()
 """Instances of middlewares. Sorted in the order of execution."""
 
+modules: Dict[ModuleID, Union[Channel, Middleware]] = dict()
+"""Index of registered channels and middlewares. Keys are the module IDs.
+
+Maintained by :meth:`add_channel`, :meth:`add_middleware`,
+:meth:`remove_channel` and :meth:`remove_middleware`.
+"""
+
 master_thread: Optional[threading.Thread] = None
 """The thread running poll() of the master channel."""
 
@@ -50,21 +88,208 @@ slave_threads: Dict[ModuleID, threading.Thread] = dict()
 translator: NullTranslations = NullTranslations()
 """Internal GNU gettext translator."""
 
+dispatch_workers: int = 1
+"""Number of worker threads delivering queued messages to each channel."""
+
+dispatch_queue_size: int = 128
+"""Maximum number of pending messages queued for each channel, ``0`` for unbounded."""
+
+dispatch_queues: Dict[ModuleID, DispatchQueue] = dict()
+"""Queues of messages pending delivery. Keys are the channel IDs."""
+
+_dispatch_lock: threading.Lock = threading.Lock()
+
+prefetch_workers: int = 8
+"""Number of worker threads retrieving profile pictures in :meth:`prefetch_pictures`."""
+
+prefetch_per_channel: int = 2
+"""Maximum number of profile pictures retrieved concurrently from each slave channel."""
+
+prefetch_pool: Optional[PrefetchPool] = None
+"""Pool retrieving profile pictures, created on demand."""
+
+incremental_verification: bool = False
+"""Verify messages only on attributes assigned since they are created or last verified.
+
+Changes made in place to mutable attributes of a message (e.g. adding
+an item to :attr:`~.message.Message.substitutions`), or an attribute assigned
+with the same object again, are not tracked when this is enabled.
+"""
+
+sequencer: ChatSequencer = ChatSequencer()
+"""Sequencer keeping messages and statuses of the same chat in order."""
+
+chats: 'weakref.WeakValueDictionary[Tuple[ModuleID, ChatID], Chat]' = weakref.WeakValueDictionary()
+"""Registry of chats published by slave channels, keyed by ``(module_id, chat_uid)``.
+
+Chats are held weakly: an entry is dropped once no other reference to the
+chat remains, e.g. when the slave channel discards it. Maintained by
+:meth:`register_chat`, and queried with :meth:`get_chat`.
+"""
+
+chat_cache_enabled: bool = False
+"""Cache chats from slave channels added with :meth:`add_channel`."""
+
+chat_cache_ttl: Optional[float] = 300
+"""Number of seconds a chat is cached, ``None`` for no expiry."""
+
+chat_cache_size: int = 1024
+"""Maximum number of chats cached for each slave channel, ``0`` for unlimited."""
+
+chat_caches: Dict[ModuleID, ChatCache] = dict()
+"""Caches of chats installed on slave channels. Keys are the channel IDs."""
+
+picture_cache_enabled: bool = False
+"""Cache profile pictures from slave channels added with :meth:`add_channel`."""
+
+picture_cache_size: int = 64 * 1024 * 1024
+"""Maximum total size of profile pictures cached for each slave channel in bytes,
+``0`` for unlimited."""
+
+picture_cache_ttl: Optional[float] = None
+"""Number of seconds a profile picture without a version is served from the cache,
+``None`` to always retrieve it again."""
+
+picture_caches: Dict[ModuleID, PictureCache] = dict()
+"""Caches of profile pictures installed on slave channels. Keys are the channel IDs."""
+
+media_store_size: int = 1024 * 1024 * 1024
+"""Maximum total size of files kept in the media store in bytes, ``0`` for unlimited."""
+
+media_store_age: Optional[float] = 7 * 24 * 60 * 60
+"""Number of seconds a file is kept in the media store since its last use,
+``None`` for no limit."""
+
+media_spool_size: int = 1024 * 1024
+"""Maximum size of a :class:`.media.SpooledMediaFile` kept in memory in bytes."""
+
+media_store: Optional[MediaStore] = None
+"""Store of media files of the profile, created on demand by :meth:`get_media_store`."""
+
+_media_store_lock: threading.Lock = threading.Lock()
+
+message_store_enabled: bool = False
+"""Record all messages delivered in the message store. Messages sent to or
+from channels with :attr:`.Channel.use_message_store` are recorded regardless."""
+
+message_store_size: int = 100000
+"""Maximum number of messages kept in the message store, ``0`` for unlimited."""
+
+message_store: Optional[MessageStore] = None
+"""Store of messages of the profile, created on demand by :meth:`get_message_store`."""
+
+_message_store_lock: threading.Lock = threading.Lock()
+
+message_id_map_size: int = 100000
+"""Maximum number of entries kept in the message ID map, ``0`` for unlimited."""
+
+message_id_map_age: Optional[float] = 30 * 24 * 60 * 60
+"""Number of seconds an entry is kept in the message ID map since its last use,
+``None`` for no limit."""
+
+message_id_map: Optional[MessageIDMap] = None
+"""Map of message IDs changed on delivery, created on demand by :meth:`get_message_id_map`."""
+
+_message_id_map_lock: threading.Lock = threading.Lock()
+
+retry_enabled: bool = False
+"""Retry deliveries of messages failed with exceptions listed in
+:data:`retry_policies`, and queue messages still failed in the dead-letter queue."""
+
+retry_policies: Dict[Type[Exception], Optional[RetryPolicy]] = {
+    EFBMessageError: RetryPolicy(),
+    ConnectionError: RetryPolicy(),
+    TimeoutError: RetryPolicy(),
+    EFBChatNotFound: None,
+    EFBMessageNotFound: None,
+    EFBMessageTypeNotSupported: None,
+    EFBOperationNotSupported: None,
+}
+"""Policies to retry deliveries by classes of exceptions raised by
+:meth:`.Channel.send_message`. The policy of the closest class of the exception
+applies, ``None`` for exceptions not to retry. Exceptions not listed are not retried.
+
+Transient errors are retried by default, while errors that would fail again,
+e.g. a chat or a message not found, are not."""
+
+_retry_timers: 'Dict[threading.Timer, Tuple[Message, Exception, int, SequenceTicket, Future[Optional[Message]]]]' \
+    = dict()
+"""Timers of scheduled retries, with the message, the last exception, the number of attempts made,
+the ticket of the chat held by the message and the future of the delivery."""
+
+dead_letter_queue: Optional[DeadLetterQueue] = None
+"""Queue of messages failed to deliver, created on demand by :meth:`get_dead_letter_queue`."""
+
+_dead_letter_queue_lock: threading.Lock = threading.Lock()
+
+_RouteKey = Tuple[Any, Optional[ModuleID], Optional[ModuleID]]
+_Route = Tuple[Tuple[int, Middleware], ...]
+
+_message_routes: Dict[_RouteKey, _Route] = dict()
+"""Middlewares to process messages, keyed by message type, source and destination."""
+
+_status_routes: Dict[_RouteKey, _Route] = dict()
+"""Middlewares to process statuses, keyed by status class, source and destination."""
+
+_routes_signature: Tuple[Middleware, ...] = ()
+"""Middlewares in the list the routes are compiled from, compared by identity."""
+
 
 def add_channel(channel: Channel):
     """
     Register the channel with the coordinator.
 
+    When :data:`chat_cache_enabled` or :data:`picture_cache_enabled` is set,
+    a :class:`.ChatCache` or a :class:`.PictureCache` is installed on slave
+    channels respectively.
+
     Args:
         channel (Channel): Channel to register
     """
     global master, slaves
     if isinstance(channel, MasterChannel):
+        with suppress(NameError, AttributeError):
+            modules.pop(master.channel_id, None)
         master = channel
     elif isinstance(channel, SlaveChannel):
         slaves[channel.channel_id] = channel
+        if chat_cache_enabled and channel.channel_id not in chat_caches:
+            cache = ChatCache(channel, ttl=chat_cache_ttl, max_size=chat_cache_size)
+            cache.install()
+            chat_caches[channel.channel_id] = cache
+        if picture_cache_enabled and channel.channel_id not in picture_caches:
+            picture_cache = PictureCache(channel, max_size=picture_cache_size, ttl=picture_cache_ttl)
+            picture_cache.install()
+            picture_caches[channel.channel_id] = picture_cache
     else:
         raise TypeError("Channel instance is expected")
+    modules[channel.channel_id] = channel
+
+
+def remove_channel(channel: Channel):
+    """
+    Unregister a slave channel from the coordinator.
+
+    Args:
+        channel (Channel): Channel to unregister
+
+    Raises:
+        EFBChannelNotFound: When the channel is not registered.
+        ValueError: When the channel is the master channel.
+    """
+    global slaves
+    if isinstance(channel, MasterChannel):
+        raise ValueError("Master channel cannot be removed")
+    if slaves.get(channel.channel_id) is not channel:
+        raise EFBChannelNotFound()
+    del slaves[channel.channel_id]
+    modules.pop(channel.channel_id, None)
+    for caches in (chat_caches, picture_caches):
+        cache = caches.pop(channel.channel_id, None)
+        if cache is not None:
+            cache.uninstall()
+    for key in [i for i in list(chats.keys()) if i[0] == channel.channel_id]:
+        chats.pop(key, None)
 
 
 def add_middleware(middleware: Middleware):
@@ -77,10 +302,97 @@ def add_middleware(middleware: Middleware):
     global middlewares
     if isinstance(middleware, Middleware):
         middlewares.append(middleware)
+        modules[middleware.middleware_id] = middleware
+        _invalidate_routes()
     else:
         raise TypeError("Middleware instance is expected")
 
 
+def remove_middleware(middleware: Middleware):
+    """
+    Unregister a middleware from the coordinator.
+
+    Args:
+        middleware (Middleware): Middleware to unregister
+
+    Raises:
+        ValueError: When the middleware is not registered.
+    """
+    global middlewares
+    middlewares.remove(middleware)
+    if modules.get(middleware.middleware_id) is middleware:
+        del modules[middleware.middleware_id]
+    _invalidate_routes()
+
+
+def _invalidate_routes():
+    """Drop compiled middleware routes, to be compiled again on demand."""
+    global _message_routes, _status_routes, _routes_signature
+    _message_routes = dict()
+    _status_routes = dict()
+    _routes_signature = tuple(middlewares)
+
+
+def _subscribes(middleware: Middleware, kind: str, type_: Any,
+                source: Optional[ModuleID], destination: Optional[ModuleID]) -> bool:
+    """Check if a middleware subscribes to messages or statuses of a route."""
+    method = 'process_' + kind
+    if getattr(type(middleware), method, None) is getattr(Middleware, method):
+        # Not overridden, nothing to do.
+        return False
+    if kind == 'message':
+        types = middleware.subscribed_message_types
+        if types is not None and type_ not in types:
+            return False
+    else:
+        status_types = middleware.subscribed_status_types
+        if status_types is not None and not issubclass(type_, tuple(status_types)):
+            return False
+    if middleware.subscribed_sources is not None and source not in middleware.subscribed_sources:
+        return False
+    if middleware.subscribed_destinations is not None and \
+            destination not in middleware.subscribed_destinations:
+        return False
+    return True
+
+
+def _get_route(kind: str, key: _RouteKey) -> _Route:
+    """Get middlewares to go through for a route, compiled from subscriptions."""
+    if _routes_signature != tuple(middlewares):
+        # Middleware list is changed without ``add_middleware``.
+        _invalidate_routes()
+    routes = _message_routes if kind == 'message' else _status_routes
+    route = routes.get(key)
+    if route is None:
+        route = routes[key] = tuple((idx, i) for idx, i in enumerate(middlewares)
+                                    if _subscribes(i, kind, *key))
+    return route
+
+
+def _run_middlewares(kind: str, obj: Any, route_key: Callable[[Any], _RouteKey]) -> Any:
+    """Pass a message or status through middlewares subscribed to it.
+
+    When a middleware changes the route of the object, the rest of
+    middlewares are selected again with the new route.
+    """
+    key = route_key(obj)
+    route = _get_route(kind, key)
+    idx = 0
+    while idx < len(route):
+        position, middleware = route[idx]
+        obj = getattr(middleware, 'process_' + kind)(obj)
+        if obj is None:
+            return None
+        new_key = route_key(obj)
+        if new_key != key:
+            key = new_key
+            route = tuple(i for i in _get_route(kind, key) if i[0] > position)
+            idx = 0
+        else:
+            idx += 1
+    return obj
+
+
 def send_message(msg: 'Message') -> Optional['Message']:
     """
     Deliver a new message or edited message to the destination channel.
@@ -92,47 +404,473 @@ def send_message(msg: 'Message') -> Optional['Message']:
         The message processed and delivered by the destination channel,
         includes the updated message ID if sent to a slave channel.
         Returns ``None`` if the message is not sent.
-    """
-    global middlewares, master, slaves
 
+        When the message ID is changed by the destination channel, the IDs
+        before and after the delivery are added to the
+        :meth:`message ID map <get_message_id_map>`.
+
+    Raises:
+        EFBMessageRetrying: When the delivery fails and :data:`retry_enabled`
+            is set, if the next attempt is scheduled according to the
+            :data:`retry policy <retry_policies>` of the exception raised.
+            The attempt is made later without blocking the sender, and
+            :attr:`~.EFBMessageRetrying.future` of the exception resolves
+            to the outcome of the delivery.
+
+    Note:
+        Messages and statuses of the same chat are processed in the
+        order they are sent to the coordinator, while those of different
+        chats are processed in parallel. Messages and statuses of a chat
+        sent after a message being retried wait until the message is
+        delivered, or put in the dead-letter queue.
+    """
     if msg is None:
-        return
+        return None
 
-    # Go through middlewares
-    for i in middlewares:
-        m = i.process_message(msg)
-        if m is None:
-            return None
-        msg = m
+    ticket = sequencer.reserve(_message_sequence_key(msg))
+    ticket.wait()
+    future: 'Future[Optional[Message]]' = Future()
+    error = _deliver_message(msg, ticket, future)
+    if error is not None:
+        raise EFBMessageRetrying(error, future)
+    return future.result()
+
+
+def _deliver_message(msg: 'Message', ticket: SequenceTicket,
+                     future: 'Future[Optional[Message]]') -> Optional[Exception]:
+    """Deliver a message through middlewares, in the turn of the ticket given.
+
+    Returns:
+        The exception of the first attempt if the next attempt is scheduled,
+        see :meth:`_attempt_delivery`.
+    """
+    try:
+        m = _run_middlewares('message', msg, _message_route_key)
+    except BaseException as e:
+        ticket.release()
+        future.set_exception(e)
+        return None
+    if m is None:
+        ticket.release()
+        future.set_result(None)
+        return None
+    return _attempt_delivery(m, ticket, future)
 
+
+def redeliver_message(msg: 'Message') -> Optional['Message']:
+    """
+    Deliver a message again to the destination channel, without passing
+    it through middlewares again, e.g. a message from the
+    :meth:`dead-letter queue <get_dead_letter_queue>`.
+
+    The message is delivered once, failed deliveries are not retried.
+
+    Args:
+        msg (Message): The message, as processed by middlewares before.
+
+    Returns:
+        The message processed and delivered by the destination channel,
+        same as :meth:`send_message`.
+    """
+    ticket = sequencer.reserve(_message_sequence_key(msg))
+    ticket.wait()
+    future: 'Future[Optional[Message]]' = Future()
+    _attempt_delivery(msg, ticket, future, retry=False)
+    return future.result()
+
+
+def _attempt_delivery(msg: 'Message', ticket: SequenceTicket, future: 'Future[Optional[Message]]',
+                      attempt: int = 1, retry: bool = True) -> Optional[Exception]:
+    """Make an attempt to deliver a message to the destination channel.
+
+    The future is resolved to the outcome, and the ticket is released,
+    unless the next attempt is scheduled. The ticket is then kept by the
+    next attempt, so that later messages of the chat are not delivered
+    before the message.
+
+    Returns:
+        The exception of the attempt if the next attempt is scheduled.
+    """
+    try:
+        result = _deliver_to_channel(msg)
+    except BaseException as e:
+        if retry and isinstance(e, Exception) and _schedule_retry(msg, e, attempt, ticket, future):
+            return e
+        ticket.release()
+        future.set_exception(e)
+    else:
+        ticket.release()
+        future.set_result(result)
+    return None
+
+
+def _deliver_to_channel(msg: 'Message') -> Optional['Message']:
     msg.verify()
 
     if msg.deliver_to.channel_id == master.channel_id:
-        return master.send_message(msg)
+        channel: Channel = master
     elif msg.deliver_to.channel_id in slaves:
-        return slaves[msg.deliver_to.channel_id].send_message(msg)
+        channel = slaves[msg.deliver_to.channel_id]
     else:
         raise EFBChannelNotFound()
 
+    # The message object MAY be updated in place by the channel.
+    sent_uid = msg.uid
+    result = channel.send_message(msg)
+
+    if result is not None and sent_uid is not None and result.uid is not None and result.uid != sent_uid:
+        _map_message_id(msg, sent_uid, result)
+    if _records_messages(msg):
+        _record_message(result if result is not None else msg)
+    return result
+
+
+def _schedule_retry(msg: 'Message', error: Exception, attempt: int,
+                    ticket: SequenceTicket, future: 'Future[Optional[Message]]') -> bool:
+    """Schedule the next attempt of a failed delivery with the retry policy of the exception.
+
+    Messages still failed after all attempts are put in the dead-letter queue.
+
+    Returns:
+        ``True`` if the next attempt is scheduled.
+    """
+    policy = find_policy(retry_policies, error) if retry_enabled else None
+    if policy is None:
+        return False
+    if attempt >= policy.max_attempts:
+        _put_dead_letter(msg, error, attempt)
+        return False
+    delay = policy.delay(attempt)
+    logging.getLogger(__name__).warning("Attempt %s to send message %s to %s failed, retrying in %.1f "
+                                        "seconds: %r", attempt, msg, msg.deliver_to.channel_id, delay, error)
+    # Wait in a timer thread instead of the thread of the sender.
+    ticket.detach()
+    timer = threading.Timer(delay, _retry_message, (msg, attempt + 1, ticket, future))
+    timer.daemon = True
+    with _dispatch_lock:
+        _retry_timers[timer] = (msg, error, attempt, ticket, future)
+    timer.start()
+    return True
+
+
+def _retry_message(msg: 'Message', attempt: int, ticket: SequenceTicket, future: 'Future[Optional[Message]]'):
+    # Run in the timer thread scheduled by _schedule_retry, holding the
+    # turn of the chat since the first attempt.
+    with _dispatch_lock:
+        if _retry_timers.pop(cast(threading.Timer, threading.current_thread()), None) is None:
+            # Cancelled by stop_dispatch
+            return
+    ticket.wait()
+    if msg.file is not None:
+        # Read the file again from the start.
+        with suppress(Exception):
+            msg.file.seek(0)
+    _attempt_delivery(msg, ticket, future, attempt)
+
+
+def _put_dead_letter(msg: 'Message', error: Exception, attempt: int):
+    try:
+        get_dead_letter_queue().put(msg, error, attempt)
+    except Exception:
+        logging.getLogger(__name__).exception("Failed to queue message %s as a dead letter.", msg)
+
+
+def _map_message_id(msg: 'Message', sent_uid: 'MessageID', result: 'Message'):
+    """Add IDs of a message changed by the destination channel to the message ID map."""
+    chat = result.chat
+    try:
+        id_map = get_message_id_map()
+        if msg.deliver_to.channel_id == master.channel_id:
+            # The master channel gives its own ID to a message from a slave channel.
+            id_map.add(chat.module_id, chat.uid, master_uid=result.uid, slave_uid=sent_uid)  # type: ignore
+            return
+        master_uid = None
+        if msg.edit:
+            # Keep the ID known to the master channel when an edit changes the ID again.
+            master_uid = id_map.get_master_id(chat.module_id, chat.uid, sent_uid)
+        id_map.add(chat.module_id, chat.uid, master_uid=master_uid or sent_uid, slave_uid=result.uid)  # type: ignore
+    except Exception:
+        # Failing to map does not fail the delivery.
+        logging.getLogger(__name__).exception("Failed to map ID of message %s.", result)
+
+
+def send_message_async(msg: 'Message') -> 'Future[Optional[Message]]':
+    """
+    Queue a new message or edited message for delivery to the destination
+    channel, without waiting for it to be delivered.
+
+    Messages are queued per destination channel, and are processed by
+    :data:`dispatch_workers` worker threads of the channel in the same way
+    as :meth:`send_message`. When :data:`dispatch_queue_size` messages are
+    already pending for the destination channel, this method blocks until
+    the queue has room for the message.
+
+    Args:
+        msg (Message): The message
+
+    Returns:
+        A future resolving to the value :meth:`send_message` would return,
+        i.e. the message delivered by the destination channel, or ``None``
+        if the message is not sent. Exceptions raised during the delivery
+        are set to the future. When the delivery is retried, the future
+        resolves to the outcome of the last attempt.
+    """
+    future: 'Future[Optional[Message]]'
+    channel_id = getattr(msg and msg.deliver_to, 'channel_id', None)
+    if msg is None:
+        future = Future()
+        future.set_result(None)
+        return future
+    if channel_id is None or not (channel_id in slaves or channel_id == master.channel_id):
+        future = Future()
+        future.set_exception(EFBChannelNotFound())
+        return future
+
+    return _get_dispatch_queue(channel_id).submit(_deliver_sequenced_message, msg,
+                                                  key=_message_sequence_key(msg))
+
+
+def _get_dispatch_queue(channel_id: ModuleID) -> DispatchQueue:
+    with _dispatch_lock:
+        if channel_id not in dispatch_queues:
+            dispatch_queues[channel_id] = DispatchQueue(channel_id, workers=dispatch_workers,
+                                                        max_size=dispatch_queue_size)
+        return dispatch_queues[channel_id]
+
+
+def _deliver_sequenced_message(msg: 'Message') -> 'Future[Optional[Message]]':
+    # The turn is reserved when the delivery is taken from the queue, which
+    # keeps messages of the chat in order, as they are queued in order.
+    ticket = sequencer.reserve(_message_sequence_key(msg))
+    ticket.wait()
+    future: 'Future[Optional[Message]]' = Future()
+    _deliver_message(msg, ticket, future)
+    return future
+
+
+def stop_dispatch(wait: bool = True):
+    """
+    Stop all dispatch queues after delivering all messages pending,
+    and the pool of :meth:`prefetch_pictures`.
+
+    Messages with retries still scheduled are put in the
+    :meth:`dead-letter queue <get_dead_letter_queue>`.
+
+    Args:
+        wait: Block until all pending messages are processed.
+    """
+    global dispatch_queues, prefetch_pool
+    with _dispatch_lock:
+        queues = list(dispatch_queues.values())
+        dispatch_queues = dict()
+        pool = prefetch_pool
+        prefetch_pool = None
+        timers = list(_retry_timers.items())
+        _retry_timers.clear()
+    for timer, (msg, error, attempt, ticket, future) in timers:
+        timer.cancel()
+        _put_dead_letter(msg, error, attempt)
+        ticket.release()
+        future.set_exception(error)
+    for i in queues:
+        i.stop(wait=wait)
+    if pool is not None:
+        pool.stop(wait=wait)
+
+
+def prefetch_pictures(chats: 'Iterable[BaseChat]') -> 'List[Future[BinaryIO]]':
+    """
+    Retrieve profile pictures of chats and chat members concurrently.
+
+    Pictures are retrieved with :meth:`.SlaveChannel.get_chat_picture` or
+    :meth:`.SlaveChannel.get_chat_member_picture` of the slave channel
+    of each chat or member, by a pool of :data:`prefetch_workers` threads,
+    with up to :data:`prefetch_per_channel` concurrent requests to each
+    slave channel.
+
+    Args:
+        chats: Chats and chat members to retrieve pictures of.
+
+    Returns:
+        Futures resolving to the picture files, in the same order as
+        the chats given. Exceptions raised by the slave channel are set to
+        the futures, and :exc:`.EFBChannelNotFound` is set if the slave
+        channel is not found.
+
+    Examples:
+        .. code-block:: python
+
+            chats = list(slave.iter_chats(limit=20))
+            for chat, picture in zip(chats, coordinator.prefetch_pictures(chats)):
+                with suppress(EFBOperationNotSupported):
+                    render(chat, picture.result())
+    """
+    global prefetch_pool
+    with _dispatch_lock:
+        if prefetch_pool is None:
+            prefetch_pool = PrefetchPool(workers=prefetch_workers, per_channel=prefetch_per_channel)
+        pool = prefetch_pool
+    futures: 'List[Future[BinaryIO]]' = []
+    for chat in chats:
+        channel = slaves.get(chat.module_id)
+        if channel is None:
+            future: 'Future[BinaryIO]' = Future()
+            future.set_exception(EFBChannelNotFound())
+        elif getattr(chat, 'chat', None) is not None:
+            # ChatMember
+            future = pool.submit(channel.channel_id, channel.get_chat_member_picture, chat)
+        else:
+            future = pool.submit(channel.channel_id, channel.get_chat_picture, chat)
+        futures.append(future)
+    return futures
+
+
+def get_media_store() -> MediaStore:
+    """
+    Get the store of media files of the current profile, located at
+    :file:`~/.ehforwarderbot/profiles/{profile_name}/media`.
+
+    The store is created on the first call, with a budget of
+    :data:`media_store_size` bytes and :data:`media_store_age` seconds.
+
+    Returns:
+        The media store of the profile.
+    """
+    global media_store
+    with _media_store_lock:
+        if media_store is None:
+            from . import utils
+            path = utils.get_base_path() / 'profiles' / profile / 'media'
+            media_store = MediaStore(path, max_size=media_store_size, max_age=media_store_age)
+        return media_store
+
+
+def get_message_store() -> MessageStore:
+    """
+    Get the store of messages of the current profile, located at
+    :file:`~/.ehforwarderbot/profiles/{profile_name}/ehforwarderbot/messages.db`.
+
+    The store is created on the first call, keeping at most
+    :data:`message_store_size` messages.
+
+    Returns:
+        The message store of the profile.
+    """
+    global message_store
+    with _message_store_lock:
+        if message_store is None:
+            from . import utils
+            path = utils.get_data_path(ModuleID("ehforwarderbot")) / 'messages.db'
+            message_store = MessageStore(path, max_messages=message_store_size)
+        return message_store
+
+
+def get_message_id_map() -> MessageIDMap:
+    """
+    Get the map of message IDs of the current profile, located at
+    :file:`~/.ehforwarderbot/profiles/{profile_name}/ehforwarderbot/message_ids.db`.
+
+    When a channel changes the ID of a message delivered by
+    :meth:`send_message`, the IDs before and after the delivery are added
+    to the map. Master channels MAY use the map to find messages in slave
+    channels by the IDs they know, instead of keeping their own records.
+
+    The map is created on the first call, keeping at most
+    :data:`message_id_map_size` entries for :data:`message_id_map_age`
+    seconds since their last use.
+
+    Returns:
+        The message ID map of the profile.
+
+    Examples:
+        .. code-block:: python
+
+            slave_uid = coordinator.get_message_id_map().get_slave_id(
+                chat.module_id, chat.uid, master_uid) or master_uid
+    """
+    global message_id_map
+    with _message_id_map_lock:
+        if message_id_map is None:
+            from . import utils
+            path = utils.get_data_path(ModuleID("ehforwarderbot")) / 'message_ids.db'
+            message_id_map = MessageIDMap(path, max_size=message_id_map_size, max_age=message_id_map_age)
+        return message_id_map
+
+
+def get_dead_letter_queue() -> DeadLetterQueue:
+    """
+    Get the queue of messages failed to deliver of the current profile,
+    located at :file:`~/.ehforwarderbot/profiles/{profile_name}/ehforwarderbot/dead_letters`.
+
+    When :data:`retry_enabled` is set, messages still failed to deliver
+    after all attempts of their :data:`retry policies <retry_policies>` are
+    added to the queue.
+
+    Returns:
+        The dead-letter queue of the profile.
+    """
+    global dead_letter_queue
+    with _dead_letter_queue_lock:
+        if dead_letter_queue is None:
+            from . import utils
+            path = utils.get_data_path(ModuleID("ehforwarderbot")) / 'dead_letters'
+            dead_letter_queue = DeadLetterQueue(path)
+        return dead_letter_queue
+
+
+def _records_messages(msg: 'Message') -> bool:
+    """Check if a message delivered is to be recorded in the message store."""
+    if message_store_enabled or getattr(msg.deliver_to, 'use_message_store', False):
+        return True
+    module_id = getattr(msg.chat, 'module_id', None)
+    return module_id in modules and getattr(modules[module_id], 'use_message_store', False)
+
+
+def _record_message(msg: 'Message'):
+    if msg.uid is None:
+        return
+    try:
+        get_message_store().record(msg)
+    except Exception:
+        # Failing to record does not fail the delivery.
+        logging.getLogger(__name__).exception("Failed to record message %s in the message store.", msg)
+
+
+def _forget_message(msg: 'Message'):
+    try:
+        get_message_store().remove(msg.chat.module_id, msg.chat.uid, msg.uid)  # type: ignore
+    except Exception:
+        logging.getLogger(__name__).exception("Failed to remove message %s from the message store.", msg)
+
 
 def send_status(status: 'Status'):
     """
     Deliver a status to the destination channel.
 
+    Chats removed or modified in a :class:`.ChatUpdates` are dropped from
+    :data:`chats` before the status is delivered. Chats updated in a
+    :class:`.ChatUpdates` or a :class:`.MemberUpdates` are dropped from
+    :data:`chat_caches`.
+
     Args:
         status (Status): The status
     """
-    global middlewares, master
     if status is None:
         return
 
-    s: 'Optional[Status]' = status
+    _invalidate_chats(status)
+
+    with sequencer.reserve(_status_sequence_key(status)):
+        _deliver_status(status)
+
+
+def _deliver_status(status: 'Status'):
+    global middlewares, master
 
     # Go through middlewares
-    for i in middlewares:
-        s = i.process_status(cast('Status', s))
-        if s is None:
-            return
+    s: 'Optional[Status]' = _run_middlewares('status', status, _status_route_key)
+    if s is None:
+        return
 
     status = cast('Status', s)
 
@@ -140,6 +878,143 @@ def send_status(status: 'Status'):
 
     status.destination_channel.send_status(status)
 
+    # MessageRemoval
+    message = getattr(status, 'message', None)
+    if message is not None:
+        if _records_messages(message):
+            _forget_message(message)
+        if message_id_map is not None and message.uid is not None:
+            message_id_map.remove(message.chat.module_id, message.chat.uid, message.uid)
+
+
+def register_chat(chat: 'Chat'):
+    """
+    Publish a chat to the registry of chats, so that other modules can
+    look it up with :meth:`get_chat` without calling the slave channel.
+
+    Slave channels SHOULD publish chats they keep track of, e.g. when they
+    are created or listed in :meth:`.SlaveChannel.get_chats`. A chat
+    published with the same identity replaces the one published before.
+
+    Args:
+        chat (Chat): The chat to publish.
+    """
+    chats[(chat.module_id, chat.uid)] = chat
+
+
+def get_chat(module_id: ModuleID, chat_uid: ChatID) -> 'Chat':
+    """
+    Look up a chat by its identity.
+
+    Chats published with :meth:`register_chat` are returned directly.
+    Otherwise the chat is requested from :meth:`.SlaveChannel.get_chat`
+    of the slave channel, and published for later lookups.
+
+    Args:
+        module_id: ID of the slave channel of the chat.
+        chat_uid: ID of the chat.
+
+    Returns:
+        The chat requested.
+
+    Raises:
+        EFBChannelNotFound: When the slave channel is not found.
+        EFBChatNotFound: When the chat is not found in the slave channel.
+    """
+    chat = chats.get((module_id, chat_uid))
+    if chat is not None:
+        return chat
+    try:
+        channel = get_module_by_id(module_id)
+    except NameError:
+        raise EFBChannelNotFound()
+    if not isinstance(channel, SlaveChannel):
+        raise EFBChannelNotFound()
+    chat = channel.get_chat(chat_uid)
+    register_chat(chat)
+    return chat
+
+
+def _invalidate_chats(status: 'Status'):
+    """Drop chats updated in a ``ChatUpdates`` or a ``MemberUpdates``
+    from the registry and caches.
+    """
+    channel_id = _channel_id(getattr(status, 'channel', None))
+    if channel_id is None:
+        return
+    cache = chat_caches.get(channel_id)
+    # ChatUpdates
+    if hasattr(status, 'removed_chats') and hasattr(status, 'modified_chats'):
+        for uid in (*status.removed_chats, *status.modified_chats):  # type: ignore
+            chats.pop((channel_id, uid), None)
+            if cache is not None:
+                cache.invalidate(uid)
+        if cache is not None:
+            # New chats only change the list of all chats.
+            cache.invalidate_list()
+    # MemberUpdates
+    elif hasattr(status, 'chat_id') and cache is not None:
+        cache.invalidate(status.chat_id)  # type: ignore
+
+
+def _channel_id(channel: Optional[Channel]) -> Optional[ModuleID]:
+    return getattr(channel, 'channel_id', None)
+
+
+def _source_id(chat: Any, destination: Optional[ModuleID]) -> Optional[ModuleID]:
+    """Source module of an object delivered to a destination about a chat.
+
+    Objects delivered to the master channel are from the module of the chat,
+    otherwise they are from the master channel.
+    """
+    try:
+        master_id = _channel_id(master)
+    except NameError:
+        master_id = None
+    if destination is not None and destination == master_id:
+        return getattr(chat, 'module_id', None)
+    return master_id
+
+
+def _message_route_key(msg: 'Message') -> _RouteKey:
+    destination = _channel_id(msg.deliver_to)
+    return msg.type, _source_id(msg.chat, destination), destination
+
+
+def _status_route_key(status: 'Status') -> _RouteKey:
+    destination = _channel_id(status.destination_channel)
+    source = _channel_id(getattr(status, 'source_channel', None) or getattr(status, 'channel', None))
+    if source is None:
+        chat = getattr(status, 'chat', None) or getattr(getattr(status, 'message', None), 'chat', None)
+        source = _source_id(chat, destination)
+    return type(status), source, destination
+
+
+def _message_sequence_key(msg: 'Message') -> Optional[Tuple[ModuleID, ChatID]]:
+    """Sequence key of a message, which is the identity of its chat."""
+    chat = getattr(msg, 'chat', None)
+    if chat is None:
+        return None
+    return chat.module_id, chat.uid
+
+
+def _status_sequence_key(status: 'Status') -> Optional[Tuple[ModuleID, ChatID]]:
+    """Sequence key of a status, which is the identity of the chat it is about.
+
+    Returns ``None`` for statuses not related to any specific chat.
+    """
+    # MemberUpdates
+    if hasattr(status, 'chat_id') and hasattr(status, 'channel'):
+        return status.channel.channel_id, status.chat_id  # type: ignore
+    # ReactToMessage, MessageReactionsUpdate
+    chat = getattr(status, 'chat', None)
+    # MessageRemoval
+    if chat is None:
+        chat = getattr(getattr(status, 'message', None), 'chat', None)
+    if chat is None:
+        return None
+    return chat.module_id, chat.uid
+
 
 def get_module_by_id(module_id: ModuleID) -> Union[Channel, Middleware]:
     """
@@ -154,12 +1029,38 @@ def get_module_by_id(module_id: ModuleID) -> Union[Channel, Middleware]:
     Raises:
         NameError: When the module is not found.
     """
-    with suppress(NameError):
+    module = modules.get(module_id)
+    if module is not None and _is_enabled(module):
+        return module
+
+    # Look for modules not registered through ``add_channel``
+    # or ``add_middleware``, or replaced after registered. Modules found
+    # here are not indexed, as :data:`master`, :data:`slaves` and
+    # :data:`middlewares` can be reassigned at any time.
+    module = None
+    with suppress(NameError, AttributeError):
         if master.channel_id == module_id:
-            return master
-    if module_id in slaves:
-        return slaves[module_id]
-    for i in middlewares:
-        if i.middleware_id == module_id:
-            return i
-    raise NameError("Module ID {} is not found".format(module_id))
+            module = master
+    if module is None and module_id in slaves:
+        module = slaves[module_id]
+    if module is None:
+        for i in middlewares:
+            if i.middleware_id == module_id:
+                module = i
+                break
+    if module is None:
+        raise NameError("Module ID {} is not found".format(module_id))
+    return module
+
+
+def _is_enabled(module: Union[Channel, Middleware]) -> bool:
+    """Check if a module is still the master channel, a slave channel
+    or a middleware enabled."""
+    if isinstance(module, Middleware):
+        # Middlewares are registered and removed with ``add_middleware`` and
+        # ``remove_middleware``, which keep :data:`modules` up to date.
+        return True
+    with suppress(NameError):
+        if master is module:
+            return True
+    return slaves.get(module.channel_id) is module
@@ -0,0 +1,389 @@
+# coding=utf-8
+
+"""
+Queued delivery of messages and statuses to channels, and concurrent
+retrieval from channels.
+
+Objects in this module are managed by the :mod:`.coordinator`; channels and
+middlewares are not expected to create them directly.
+"""
+
+import functools
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Queue
+from typing import Callable, List, Any, Optional, Tuple, Dict, Hashable, Deque
+
+from .types import ModuleID
+
+__all__ = ["DispatchQueue", "ChatSequencer", "SequenceTicket", "PrefetchPool"]
+
+
+_Job = Tuple[Optional[Hashable], Future, Callable[..., Any], Tuple[Any, ...]]
+"""A queued call: sequence key, future of the result, callable and arguments."""
+
+
+class DispatchQueue:
+    """
+    A bounded queue of deliveries to one destination channel, processed by
+    a pool of worker threads.
+
+    Deliveries submitted with the same key are run one at a time in the
+    order submitted, while those with different keys are run in parallel.
+    Deliveries waiting for a previous one of the same key do not occupy a
+    worker thread, and are queued after deliveries of other keys submitted
+    in the meantime once the previous one is done, so that a busy key does
+    not hold up others.
+
+    Worker threads are started on the first submission, and are stopped with
+    :meth:`stop`.
+
+    Attributes:
+        channel_id (:obj:`.ModuleID` (str)): ID of the destination channel.
+        workers (int): Number of worker threads delivering to the channel.
+        max_size (int): Maximum number of pending deliveries.
+            Submitting to a full queue blocks until a slot is available.
+            ``0`` for an unbounded queue.
+    """
+
+    def __init__(self, channel_id: ModuleID, workers: int = 1, max_size: int = 0):
+        """
+        Args:
+            channel_id: ID of the destination channel.
+            workers: Number of worker threads, at least 1.
+            max_size: Maximum number of pending deliveries, ``0`` for unbounded.
+        """
+        if workers < 1:
+            raise ValueError("At least 1 worker is required, {} is given.".format(workers))
+        self.channel_id: ModuleID = channel_id
+        self.workers: int = workers
+        self.max_size: int = max_size
+        self.logger = logging.getLogger(__name__)
+        self._queue: 'Queue[Optional[_Job]]' = Queue()
+        self._slots: Optional[threading.Semaphore] = threading.Semaphore(max_size) if max_size else None
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        # Deliveries waiting for the one running or queued of the same key
+        self._keys: Dict[Hashable, Deque[_Job]] = dict()
+        self._stopped = False
+
+    def __len__(self) -> int:
+        """Approximate number of pending deliveries."""
+        with self._lock:
+            return self._queue.qsize() + sum(len(i) for i in self._keys.values())
+
+    def submit(self, fn: Callable[..., Any], *args: Any, key: Optional[Hashable] = None) -> Future:
+        """
+        Queue a call to be run by a worker thread.
+
+        Args:
+            fn: The callable to run.
+            *args: Positional arguments of the callable.
+            key: Calls with the same key are run one at a time in the order
+                submitted. ``None`` to run in parallel with any other call.
+
+        Returns:
+            A future resolving to the return value of the callable, or to
+            the exception raised from it. When the callable returns a
+            future, the call is done when that future is done, and the
+            future returned here resolves to its outcome. The worker
+            thread does not wait for it meanwhile.
+
+        Raises:
+            RuntimeError: When the queue is already stopped.
+        """
+        if self._slots is not None:
+            self._slots.acquire()
+        future: Future = Future()
+        job: _Job = (key, future, fn, args)
+        with self._lock:
+            if self._stopped:
+                if self._slots is not None:
+                    self._slots.release()
+                raise RuntimeError("Dispatch queue of {} is stopped.".format(self.channel_id))
+            if not self._threads:
+                self._start()
+            if key is not None:
+                if key in self._keys:
+                    self._keys[key].append(job)
+                    return future
+                self._keys[key] = deque()
+            self._queue.put(job)
+        return future
+
+    def _start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True,
+                                      name=f"{self.channel_id} dispatch worker {i}")
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: 'Optional[_Job]'):
+        while job is not None:
+            if self._slots is not None:
+                self._slots.release()
+            key, future, fn, args = job
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args)
+                except BaseException as e:
+                    self.logger.debug("Queued delivery to %s failed: %r", self.channel_id, e)
+                    future.set_exception(e)
+                else:
+                    if isinstance(result, Future):
+                        result.add_done_callback(functools.partial(self._chain, key, future))
+                        return
+                    future.set_result(result)
+            job = self._next(key)
+
+    def _chain(self, key: Optional[Hashable], future: Future, result: Future):
+        # Called when the future returned by a call is done.
+        error = result.exception()
+        if error is not None:
+            self.logger.debug("Queued delivery to %s failed: %r", self.channel_id, error)
+            future.set_exception(error)
+        else:
+            future.set_result(result.result())
+        self._run(self._next(key))
+
+    def _next(self, key: Optional[Hashable]) -> 'Optional[_Job]':
+        if key is None:
+            return None
+        with self._lock:
+            pending = self._keys[key]
+            if not pending:
+                del self._keys[key]
+                return None
+            job = pending.popleft()
+            if self._stopped:
+                # Run by the same worker, so that it is not left behind
+                # the signals to stop.
+                return job
+            self._queue.put(job)
+            return None
+
+    def stop(self, wait: bool = True):
+        """
+        Stop accepting new deliveries, and stop worker threads once all
+        pending deliveries are processed.
+
+        Args:
+            wait: Block until all worker threads are stopped.
+        """
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            threads = self._threads.copy()
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+class SequenceTicket:
+    """
+    A reserved turn in a :class:`ChatSequencer`.
+
+    Use the ticket as a context manager to wait for its turn, and release
+    it for the next ticket of the same key when done. Releasing a ticket
+    more than once has no effect.
+
+    Attributes:
+        key (Optional[Hashable]): The sequence key of the ticket. ``None``
+            if the ticket does not need to wait for any other ticket.
+    """
+
+    def __init__(self, sequencer: 'Optional[ChatSequencer]', key: Optional[Hashable]):
+        self.key: Optional[Hashable] = key
+        self._sequencer = sequencer
+        self._turn = threading.Event()
+        self._released = False
+        self._owner: Optional[int] = None
+        if sequencer is None:
+            self._turn.set()
+
+    def wait(self):
+        """Block until all previous tickets of the same key are released."""
+        self._turn.wait()
+        self._owner = threading.get_ident()
+
+    def detach(self):
+        """Keep the turn without the current thread holding it, e.g. when
+        it is passed to another thread, which calls :meth:`wait` to hold it."""
+        self._owner = None
+
+    def release(self):
+        """Give the turn to the next ticket of the same key."""
+        if self._sequencer is not None:
+            self._sequencer._release(self)
+
+    def __enter__(self) -> 'SequenceTicket':
+        self.wait()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class ChatSequencer:
+    """
+    Keep deliveries with the same key in their order of arrival, while
+    deliveries with different keys are not blocked by each other.
+
+    The coordinator uses ``(module_id, chat_uid)`` of the chat involved
+    as the key.
+
+    Reserving a ticket from a thread which is currently holding the turn
+    of the same key gives a ticket that does not wait, so that
+    modules can send messages to the same chat while processing one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Deque[SequenceTicket]] = dict()
+
+    def reserve(self, key: Optional[Hashable]) -> SequenceTicket:
+        """
+        Reserve a turn for the key, after all tickets reserved before.
+
+        Args:
+            key: The sequence key, ``None`` to skip ordering.
+
+        Returns:
+            The ticket reserved.
+        """
+        if key is None:
+            return SequenceTicket(None, key)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending and pending[0]._owner == threading.get_ident():
+                # Re-entrance from the thread holding the turn.
+                return SequenceTicket(None, key)
+            ticket = SequenceTicket(self, key)
+            if not pending:
+                pending = self._pending[key] = deque()
+                ticket._turn.set()
+            pending.append(ticket)
+        return ticket
+
+    def _release(self, ticket: SequenceTicket):
+        with self._lock:
+            if ticket._released:
+                return
+            ticket._released = True
+            pending = self._pending[ticket.key]
+            pending.remove(ticket)
+            if pending:
+                pending[0]._turn.set()
+            else:
+                del self._pending[ticket.key]
+
+    def __len__(self) -> int:
+        """Number of keys with pending tickets."""
+        return len(self._pending)
+
+
+class PrefetchPool:
+    """
+    A pool of worker threads running calls to channels concurrently,
+    with a limit of concurrent calls to each channel.
+
+    Calls to a channel beyond its limit wait in the pool without occupying
+    a worker thread, so that a slow channel does not hold up others.
+    Worker threads are started on demand, and are stopped with :meth:`stop`.
+
+    Attributes:
+        workers (int): Maximum number of worker threads.
+        per_channel (int): Maximum number of concurrent calls to each channel.
+    """
+
+    def __init__(self, workers: int = 8, per_channel: int = 2):
+        """
+        Args:
+            workers: Maximum number of worker threads, at least 1.
+            per_channel: Maximum number of concurrent calls to each channel, at least 1.
+        """
+        if workers < 1:
+            raise ValueError("At least 1 worker is required, {} is given.".format(workers))
+        if per_channel < 1:
+            raise ValueError("At least 1 call per channel is required, {} is given.".format(per_channel))
+        self.workers: int = workers
+        self.per_channel: int = per_channel
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Prefetch worker")
+        self._lock = threading.Lock()
+        self._running: Dict[ModuleID, int] = dict()
+        self._pending: Dict[ModuleID, Deque[Tuple[Future, Callable, Tuple[Any, ...]]]] = dict()
+        self._stopped = False
+
+    def submit(self, channel_id: ModuleID, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        Queue a call to a channel.
+
+        Args:
+            channel_id: ID of the channel called, which the limit applies to.
+            fn: The callable to run.
+            *args: Positional arguments of the callable.
+
+        Returns:
+            A future resolving to the return value of the callable, or to
+            the exception raised from it.
+
+        Raises:
+            RuntimeError: When the pool is already stopped.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("Prefetch pool is stopped.")
+            if self._running.get(channel_id, 0) < self.per_channel:
+                self._running[channel_id] = self._running.get(channel_id, 0) + 1
+                self._executor.submit(self._run, channel_id, future, fn, args)
+            else:
+                self._pending.setdefault(channel_id, deque()).append((future, fn, args))
+        return future
+
+    def _run(self, channel_id: ModuleID, future: Future, fn: Callable, args: Tuple[Any, ...]):
+        while True:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    self.logger.debug("Prefetch from %s failed: %r", channel_id, e)
+                    future.set_exception(e)
+            # Take the next call to the same channel, if any.
+            with self._lock:
+                pending = self._pending.get(channel_id)
+                if not pending:
+                    self._pending.pop(channel_id, None)
+                    self._running[channel_id] -= 1
+                    if not self._running[channel_id]:
+                        del self._running[channel_id]
+                    return
+                future, fn, args = pending.popleft()
+
+    def stop(self, wait: bool = True):
+        """
+        Stop accepting new calls, and stop worker threads once all pending
+        calls are processed.
+
+        Args:
+            wait: Block until all worker threads are stopped.
+        """
+        with self._lock:
+            self._stopped = True
+        self._executor.shutdown(wait=wait)
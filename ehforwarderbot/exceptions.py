@@ -1,5 +1,7 @@
 # coding=utf-8
 
+from concurrent.futures import Future
+
 
 class EFBException(Exception):
     """A general class to indicate that the exception is from EFB framework."""
@@ -33,6 +35,24 @@ class EFBMessageError(EFBException):
     pass
 
 
+class EFBMessageRetrying(EFBException):
+    """
+    Raised by the coordinator when a message failed to deliver, and the
+    next attempt is scheduled according to the retry policy of the error.
+
+    Attributes:
+        error (Exception): The exception raised by the failed attempt.
+        future (concurrent.futures.Future): Resolves to the message
+            delivered by the destination channel, or to the exception
+            raised by the last attempt if all attempts failed.
+    """
+
+    def __init__(self, error: Exception, future: Future):
+        super().__init__("Failed to deliver the message, retrying: {!r}".format(error))
+        self.error: Exception = error
+        self.future: Future = future
+
+
 class EFBMessageNotFound(EFBMessageError):
     """
     Raised by a slave channel when a message indicated is not found.
@@ -0,0 +1,578 @@
+# coding=utf-8
+
+"""
+Files and storage of media attached to messages.
+
+Channels MAY store files received with :class:`MediaStore` before
+delivering them in messages, so that the same content received more
+than once is kept only once on the disk, and files no longer used are
+discarded within a budget of disk space.
+
+Example:
+    .. code-block:: python
+
+        store = coordinator.get_media_store()
+        message.file = store.add(response.raw, suffix=".jpg")
+        message.path = message.file.path
+"""
+
+import hashlib
+import io
+import logging
+import mmap
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from pathlib import Path
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+from typing import Callable, Optional, Union, Dict, BinaryIO, Tuple
+
+from . import coordinator
+
+__all__ = ["MediaFile", "LazyMediaFile", "SpooledMediaFile", "MediaStore", "map_file"]
+
+_CHUNK_SIZE = 64 * 1024
+_TEMP_SUFFIX = ".tmp"
+
+
+class MediaFile(io.BufferedReader):
+    """
+    A read-only binary file of a media, which can be used as
+    :attr:`.Message.file`.
+
+    Besides the usual interface of a binary file, the content can be
+    accessed without copying with :meth:`getbuffer`, which maps the file
+    into memory.
+
+    Attributes:
+        path (pathlib.Path): Path to the file.
+    """
+
+    def __init__(self, path: Union[str, Path], on_close: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            path: Path to the file.
+            on_close: Callback called once when the file is closed.
+        """
+        super().__init__(io.FileIO(str(path), 'rb'))
+        self.path: Path = Path(path)
+        self._on_close = on_close
+        self._mmap: Optional[mmap.mmap] = None
+
+    def getbuffer(self) -> memoryview:
+        """
+        Get a read-only view of the whole content of the file, without
+        reading it into memory. Pages of the file are loaded by the
+        operating system on access.
+
+        The position of the file is not changed. The view SHOULD be
+        released before the file is closed, otherwise the mapping is
+        kept until the view is garbage collected.
+
+        Returns:
+            A view of the content in bytes.
+
+        Raises:
+            ValueError: If the file is closed.
+        """
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if self._mmap is None:
+            if not os.fstat(self.fileno()).st_size:
+                # Empty files cannot be mapped.
+                return memoryview(b"")
+            self._mmap = mmap.mmap(self.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._mmap is not None:
+                with suppress(BufferError):
+                    # Views still exported keep the mapping alive.
+                    self._mmap.close()
+                self._mmap = None
+            super().close()
+        finally:
+            callback, self._on_close = self._on_close, None
+            if callback is not None:
+                callback()
+
+
+class LazyMediaFile(io.BufferedIOBase):
+    """
+    A read-only binary file of a media, which is only opened on the first
+    access to its content.
+
+    This is used as :attr:`.Message.file` of unpickled messages, so that
+    loading many messages does not open a file for each of them.
+
+    The file opened can be released with :meth:`release` when it is not
+    used for a while, and is opened again on the next access from the
+    same position. :meth:`close` releases the file permanently.
+
+    Attributes:
+        path (pathlib.Path): Path to the file.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Args:
+            path: Path to the file.
+        """
+        super().__init__()
+        self.path: Path = Path(path)
+        self._file: Optional[MediaFile] = None
+        self._position = 0
+
+    @property
+    def name(self) -> str:
+        return str(self.path)
+
+    @property
+    def mode(self) -> str:
+        return 'rb'
+
+    @property
+    def opened(self) -> bool:
+        """Whether the file is currently open."""
+        return self._file is not None
+
+    def _open(self) -> MediaFile:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if self._file is None:
+            self._file = MediaFile(self.path)
+            self._file.seek(self._position)
+        return self._file
+
+    def release(self):
+        """
+        Close the file opened, if any. The file is opened again on the next
+        access to its content.
+        """
+        if self._file is not None:
+            self._position = self._file.tell()
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        if not self.closed:
+            self.release()
+        super().close()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        return self._open().read(size)
+
+    def read1(self, size: int = -1) -> bytes:
+        return self._open().read1(size)
+
+    def readinto(self, b) -> int:
+        return self._open().readinto(b)
+
+    def readinto1(self, b) -> int:
+        return self._open().readinto1(b)
+
+    def readline(self, size: Optional[int] = -1) -> bytes:
+        return self._open().readline(size)
+
+    def peek(self, size: int = 0) -> bytes:
+        return self._open().peek(size)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if self._file is None and whence == io.SEEK_SET and not self.closed:
+            # Seeking back before reading, as required before sending,
+            # does not open the file.
+            if offset < 0:
+                raise ValueError("Negative seek position {}".format(offset))
+            self._position = offset
+            return offset
+        return self._open().seek(offset, whence)
+
+    def tell(self) -> int:
+        if self._file is None:
+            if self.closed:
+                raise ValueError("I/O operation on closed file.")
+            return self._position
+        return self._file.tell()
+
+    def fileno(self) -> int:
+        return self._open().fileno()
+
+    def getbuffer(self) -> memoryview:
+        """
+        Get a read-only view of the whole content of the file without
+        copying it, see :meth:`MediaFile.getbuffer`.
+
+        Returns:
+            A view of the content in bytes.
+        """
+        return self._open().getbuffer()
+
+    def __repr__(self) -> str:
+        return "<{} path={!r} opened={}>".format(type(self).__name__, self.name, self.opened)
+
+
+class SpooledMediaFile(SpooledTemporaryFile):
+    """
+    A temporary binary file of a media, kept in memory until it grows
+    larger than a threshold, or until a path to it is required.
+
+    Channels MAY write small media received into this file, and use it as
+    :attr:`.Message.file` without setting :attr:`.Message.path`. The file is
+    written to the disk only when :attr:`path` is accessed, e.g. by a
+    consumer reading :attr:`.Message.path`. The file on disk is deleted
+    once closed.
+
+    Example:
+        .. code-block:: python
+
+            file = SpooledMediaFile(suffix=".ogg")
+            file.write(voice_data)
+            file.seek(0)
+            message = Message(type=MsgType.Voice, file=file, mime="audio/ogg", ...)
+    """
+
+    def __init__(self, max_size: Optional[int] = None, suffix: str = "",
+                 prefix: Optional[str] = None, dir: Optional[str] = None):
+        """
+        Args:
+            max_size: Maximum size in bytes kept in memory, defaulted to
+                :data:`.coordinator.media_spool_size`.
+            suffix: Extension name of the file on disk, e.g. ``".jpg"``.
+            prefix: Prefix of the name of the file on disk.
+            dir: Directory of the file on disk, defaulted to the temporary
+                directory of the system.
+        """
+        if max_size is None:
+            max_size = coordinator.media_spool_size
+        super().__init__(max_size=max_size, mode='w+b', suffix=suffix, prefix=prefix, dir=dir)
+
+    @property
+    def in_memory(self) -> bool:
+        """Whether the file is still kept in memory."""
+        return not self._rolled  # type: ignore
+
+    @property
+    def path(self) -> Path:
+        """Path to the file, written to the disk if it is still in memory."""
+        self.rollover()
+        return Path(self._file.name)  # type: ignore
+
+    def rollover(self):
+        """Write the file to the disk if it is still in memory."""
+        if self._rolled:  # type: ignore
+            return
+        memory = self._file  # type: ignore
+        file = NamedTemporaryFile(**self._TemporaryFileArgs)  # type: ignore
+        file.write(memory.getbuffer())
+        file.seek(memory.tell())
+        self._file = file
+        self._rolled = True
+
+    def getbuffer(self) -> memoryview:
+        """
+        Get a read-only view of the whole content of the file without
+        copying it, see :meth:`MediaFile.getbuffer`.
+
+        Returns:
+            A view of the content in bytes.
+        """
+        if self.in_memory:
+            # The value shares the buffer until the file is modified.
+            return memoryview(self._file.getvalue())  # type: ignore
+        return map_file(self._file)  # type: ignore
+
+
+def map_file(file: BinaryIO) -> memoryview:
+    """
+    Get a read-only view of the whole content of a file, e.g. a
+    :attr:`.Message.file`, without copying it where possible.
+
+    Files in the file system are mapped into memory, and in-memory files
+    (:class:`io.BytesIO`) share their buffers. Other files are read
+    from position 0 as a fallback. The position of the file is not changed.
+
+    Args:
+        file: The file to view.
+
+    Returns:
+        A view of the content in bytes.
+
+    Examples:
+        .. code-block:: python
+
+            view = map_file(message.file)
+            for offset in range(0, len(view), chunk_size):
+                upload(view[offset:offset + chunk_size])
+            view.release()
+    """
+    if isinstance(file, (MediaFile, LazyMediaFile, SpooledMediaFile)):
+        return file.getbuffer()
+    if isinstance(file, io.BytesIO):
+        # The value shares the buffer until the file is modified.
+        return memoryview(file.getvalue())
+    try:
+        fileno = file.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+    else:
+        # Data written but still buffered is not seen by the mapping.
+        file.flush()
+        if not os.fstat(fileno).st_size:
+            return memoryview(b"")
+        with suppress(OSError, ValueError):
+            # The view keeps the mapping open until released.
+            return memoryview(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ))
+    position = file.tell()
+    try:
+        file.seek(0)
+        return memoryview(file.read())
+    finally:
+        file.seek(position)
+
+
+class MediaStore:
+    """
+    A content-addressed store of media files.
+
+    Files are stored by the SHA-256 hash of their content, so that
+    identical content is only stored once. Files handed out are
+    read-only :class:`MediaFile` objects, each of them counted as a reference
+    to its content until closed.
+
+    Files can also be referred by name with :meth:`refer` without keeping
+    them open.
+
+    Content without any reference is evicted from the store, the least
+    recently used first, when the total size of the store exceeds
+    ``max_size``, or when it is not used for ``max_age`` seconds.
+    Content referred by an open file is never evicted.
+
+    Files handed out by the store MUST NOT be deleted or modified by
+    their receivers. Close them when they are not required any more.
+
+    Attributes:
+        path (pathlib.Path): Directory of the store.
+        max_size (int): Maximum total size of files in bytes, ``0`` for unlimited.
+        max_age (Optional[float]): Number of seconds a file is kept since its
+            last use, ``None`` to keep it until the size limit is reached.
+    """
+
+    def __init__(self, path: Path, max_size: int = 1024 * 1024 * 1024,
+                 max_age: Optional[float] = 7 * 24 * 60 * 60):
+        """
+        Args:
+            path: Directory of the store, created if not existing.
+                Files already stored in the directory are reused.
+            max_size: Maximum total size of files in bytes, ``0`` for unlimited.
+            max_age: Number of seconds a file is kept since its last use,
+                ``None`` for no limit.
+        """
+        self.path: Path = path
+        self.max_size: int = max_size
+        self.max_age: Optional[float] = max_age
+        self.logger = logging.getLogger(__name__)
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Files may be closed by garbage collection while the lock is held.
+        self._lock = threading.RLock()
+        self._refs: Dict[str, int] = dict()
+        # Name -> (size, time of last use), in the order of last use.
+        self._files: 'OrderedDict[str, Tuple[int, float]]' = OrderedDict()
+        self._size = 0
+        self._load()
+
+    def _load(self):
+        entries = []
+        for i in self.path.iterdir():
+            if i.name.endswith(_TEMP_SUFFIX):
+                # Left over from an interrupted write.
+                with suppress(OSError):
+                    self._unlink(i)
+                continue
+            if not i.is_file():
+                continue
+            st = i.stat()
+            entries.append((st.st_mtime, i.name, st.st_size))
+        for used, name, size in sorted(entries):
+            self._files[name] = (size, used)
+            self._size += size
+
+    @property
+    def size(self) -> int:
+        """Total size of files stored in bytes."""
+        return self._size
+
+    def __len__(self) -> int:
+        """Number of files stored."""
+        return len(self._files)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._files
+
+    def add(self, file: Union[BinaryIO, bytes], suffix: str = "") -> MediaFile:
+        """
+        Store the content of a file, and open the file stored.
+
+        Args:
+            file: The file to store, read from its current position to
+                the end, or its content in bytes.
+            suffix: Extension name of the file stored, e.g. ``".jpg"``.
+
+        Returns:
+            The file stored, opened for reading at position 0.
+        """
+        digest = hashlib.sha256()
+        with NamedTemporaryFile(dir=str(self.path), suffix=_TEMP_SUFFIX, delete=False) as temp:
+            try:
+                if isinstance(file, (bytes, bytearray, memoryview)):
+                    digest.update(file)
+                    temp.write(file)
+                else:
+                    for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                        temp.write(chunk)
+                size = temp.tell()
+            except BaseException:
+                temp.close()
+                self._unlink(Path(temp.name))
+                raise
+        name = digest.hexdigest() + suffix
+        target = self.path / name
+        with self._lock:
+            if name in self._files and target.exists():
+                self._unlink(Path(temp.name))
+            else:
+                if name in self._files:
+                    # Deleted from outside of the store.
+                    self._size -= self._files[name][0]
+                os.replace(temp.name, str(target))
+                os.chmod(str(target), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                self._size += size
+            self._touch(name, size)
+            media = self._open(name)
+            self._evict()
+        return media
+
+    def add_path(self, path: Union[str, Path], suffix: Optional[str] = None) -> MediaFile:
+        """
+        Store the content of a file in the file system, and open the file
+        stored. The original file is left untouched.
+
+        Args:
+            path: Path to the file to store.
+            suffix: Extension name of the file stored, defaulted to the
+                extension name of the original file.
+
+        Returns:
+            The file stored, opened for reading at position 0.
+        """
+        path = Path(path)
+        with path.open('rb') as f:
+            return self.add(f, path.suffix if suffix is None else suffix)
+
+    def open(self, name: str) -> MediaFile:
+        """
+        Open a file stored by its name.
+
+        Args:
+            name: Name of the file in the store, i.e. ``MediaFile.path.name``.
+
+        Returns:
+            The file stored, opened for reading at position 0.
+
+        Raises:
+            FileNotFoundError: If the file is not in the store.
+        """
+        with self._lock:
+            if name not in self._files:
+                raise FileNotFoundError(name)
+            self._touch(name, self._files[name][0])
+            return self._open(name)
+
+    def refer(self, name: str):
+        """
+        Refer to a file stored by its name without opening it, so that it
+        is not evicted until :meth:`release` is called with the name.
+
+        Args:
+            name: Name of the file in the store, i.e. ``MediaFile.path.name``.
+
+        Raises:
+            FileNotFoundError: If the file is not in the store.
+        """
+        with self._lock:
+            if name not in self._files:
+                raise FileNotFoundError(name)
+            self._touch(name, self._files[name][0])
+            self._refs[name] = self._refs.get(name, 0) + 1
+
+    def release(self, name: str):
+        """
+        Release a reference made with :meth:`refer`.
+
+        Args:
+            name: Name of the file in the store.
+        """
+        self._release(name)
+
+    def evict(self):
+        """Evict files not referred according to the budget of the store."""
+        with self._lock:
+            self._evict()
+
+    def _open(self, name: str) -> MediaFile:
+        media = MediaFile(self.path / name, on_close=lambda: self._release(name))
+        self._refs[name] = self._refs.get(name, 0) + 1
+        return media
+
+    def _release(self, name: str):
+        with self._lock:
+            self._refs[name] -= 1
+            if not self._refs[name]:
+                del self._refs[name]
+
+    def _touch(self, name: str, size: int):
+        now = time.time()
+        self._files[name] = (size, now)
+        self._files.move_to_end(name)
+        with suppress(OSError):
+            # Keep the order of use across restarts.
+            os.utime(str(self.path / name), (now, now))
+
+    def _evict(self):
+        now = time.time()
+        for name, (size, used) in list(self._files.items()):
+            over_size = bool(self.max_size) and self._size > self.max_size
+            expired = self.max_age is not None and now - used > self.max_age
+            if not over_size and not expired:
+                break
+            if self._refs.get(name):
+                continue
+            try:
+                self._unlink(self.path / name)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.logger.warning("Failed to evict %s from media store: %r", name, e)
+                continue
+            del self._files[name]
+            self._size -= size
+
+    @staticmethod
+    def _unlink(path: Path):
+        # Read-only files can only be deleted after becoming writable on some platforms.
+        if os.name == 'nt':
+            with suppress(OSError):
+                os.chmod(str(path), stat.S_IWRITE)
+        path.unlink()
@@ -1,5 +1,6 @@
 # coding=utf-8
 
+import weakref
 from abc import ABC, abstractmethod
 from collections.abc import Collection as CCollection
 from collections.abc import Mapping as CMapping
@@ -7,17 +8,25 @@ from contextlib import suppress
 from enum import Enum
 from os import PathLike
 from pathlib import Path
-from typing import Dict, Optional, List, Any, Tuple, Mapping, Collection, Union, BinaryIO
+from typing import Dict, Optional, List, Any, Tuple, Mapping, Collection, Union, BinaryIO, Set, cast
 
 from . import coordinator
 from .channel import Channel
 from .chat import Chat, ChatMember, SelfChatMember
 from .constants import MsgType
+from .exceptions import EFBChannelNotFound
+from .media import LazyMediaFile
 from .types import Reactions, MessageID
+from .utils import _get_slots_state, _set_slots_state
 
 
 class MessageAttribute(ABC):
-    """Abstract class of a message attribute."""
+    """Abstract class of a message attribute.
+
+    Attributes of built-in subclasses are stored in ``__slots__``.
+    """
+
+    __slots__ = ()
 
     @abstractmethod
     def __init__(self):
@@ -27,6 +36,12 @@ class MessageAttribute(ABC):
     def verify(self):
         raise NotImplementedError()
 
+    def __getstate__(self) -> Dict[str, Any]:
+        return _get_slots_state(self)
+
+    def __setstate__(self, state: Dict[str, Any]):
+        _set_slots_state(self, state)
+
 
 class LinkAttribute(MessageAttribute):
     """
@@ -38,10 +53,7 @@ class LinkAttribute(MessageAttribute):
         image (str, optional): Image/thumbnail URL of the link.
         url (str): URL of the link.
     """
-    title: str = ""
-    description: Optional[str] = None
-    image: Optional[str] = None
-    url: str = ""
+    __slots__ = ('title', 'description', 'image', 'url')
 
     # noinspection PyMissingConstructor
     def __init__(self, title: str, description: Optional[str] = None,
@@ -53,10 +65,10 @@ class LinkAttribute(MessageAttribute):
             image (str, optional): Image/thumbnail URL of the link.
             url (str): URL of the link.
         """
-        self.title = title
-        self.description = description
-        self.image = image
-        self.url = url
+        self.title: str = title
+        self.description: Optional[str] = description
+        self.image: Optional[str] = image
+        self.url: str = url
         self.verify()
 
     def __str__(self):
@@ -76,8 +88,7 @@ class LocationAttribute(MessageAttribute):
         latitude (float): Latitude of the location.
         longitude (float): Longitude of the location.
     """
-    latitude: float = 0
-    longitude: float = 0
+    __slots__ = ('latitude', 'longitude')
 
     # noinspection PyMissingConstructor
     def __init__(self, latitude: float, longitude: float):
@@ -86,8 +97,8 @@ class LocationAttribute(MessageAttribute):
             latitude (float): Latitude of the location.
             longitude (float): Longitude of the location.
         """
-        self.latitude = latitude
-        self.longitude = longitude
+        self.latitude: float = latitude
+        self.longitude: float = longitude
         self.verify()
 
     def __str__(self):
@@ -197,6 +208,8 @@ class StatusAttribute(MessageAttribute):
         Types: List of status types supported
     """
 
+    __slots__ = ('status_type', 'timeout')
+
     class Types(Enum):
         """
         Attributes:
@@ -308,6 +321,17 @@ class Substitutions(Dict[Tuple[int, int], Union[Chat, ChatMember]]):
             i.verify()
 
 
+_VERIFIED_ATTRIBUTES = ('attributes', 'author', 'chat', 'commands', 'deliver_to', 'edit', 'edit_media', 'file',
+                        'mime', '_path', 'substitutions', 'target', 'type')
+"""Attributes of :class:`Message` checked by incremental verification."""
+
+_REQUIRED_ATTRIBUTES = frozenset(('author', 'chat', 'deliver_to', 'type'))
+"""Attributes of :class:`Message` without valid default values."""
+
+_UNVERIFIED = object()
+"""Placeholder of attributes not verified in snapshots of :class:`Message`."""
+
+
 class Message:
     """A message.
 
@@ -359,7 +383,8 @@ class Message:
 
             This attribute will be ignored in _Status_ messages.
         file (Optional[BinaryIO]): File object to multimedia file, type "rb". ``None`` if N/A.
-            Recommended to use :class:`NamedTemporaryFile`.
+            Recommended to use :class:`NamedTemporaryFile`, or
+            :class:`.media.SpooledMediaFile` for small files.
             The file SHOULD be able to be safely deleted (or otherwise discarded)
             once closed. All file object MUST be sought back to 0
             (``file.seek(0)``) before sending.
@@ -367,6 +392,12 @@ class Message:
         is_system (bool): Mark as true if this message is a system message.
         mime (Optional[str]): MIME type of the file. ``None`` if N/A
         path (Optional[Path]): Local path of multimedia file. ``None`` if N/A
+
+            If not set, the path is taken from the ``path`` attribute of
+            :attr:`file` if available, e.g. of :class:`.media.MediaFile`
+            and :class:`.media.SpooledMediaFile`. Files kept in memory
+            are only written to the disk when this attribute is read,
+            and not when the message is pickled or serialized.
         reactions (Dict[str, Collection[:obj:`Chat`]]):
             Indicate reactions to the message. Dictionary key is the canonical name
             of reaction, usually an emoji. Value is a collection of users
@@ -381,7 +412,7 @@ class Message:
             refers to another user or chat.
 
             This attribute will be ignored in _Status_ messages.
-        target (Optional[:obj:`Message`]):
+        target (Union[:obj:`Message`, :obj:`MessageReference`, None]):
             Target message (usually for messages that "replies to"
             another message).
 
@@ -397,6 +428,12 @@ class Message:
                 - :attr:`.Message.type`
                 - :attr:`.Message.uid`
 
+                A :obj:`MessageReference` with only these fields MAY be
+                assigned instead, e.g. with :meth:`MessageReference.from_message`,
+                so that a chain of replies is not embedded in pickles of the
+                message. The complete message can be retrieved with
+                :meth:`MessageReference.resolve`.
+
         text (str): Text of the message.
 
             This attribute will be ignored in _Status_ messages.
@@ -414,8 +451,18 @@ class Message:
             used by any other channels or middlewares that is compatible
             with such information. Note that no guarantee is provided
             for information in this section.
+
+    Note:
+        Attributes of messages are stored in ``__slots__`` to reduce the
+        memory footprint, and :attr:`vendor_specific` is only created when
+        accessed. Extra attributes can still be assigned.
     """
 
+    # ``__dict__`` is only created when attributes not listed here are assigned.
+    __slots__ = ('attributes', 'chat', 'author', 'commands', 'deliver_to', 'edit', 'edit_media',
+                 'file', 'filename', 'is_system', 'mime', '_path', 'reactions', 'substitutions',
+                 'target', 'text', 'type', 'uid', '_vendor_specific', '_verified', '__dict__', '__weakref__')
+
     def __init__(self,
                  *,
                  attributes: Optional[MessageAttribute] = None,
@@ -432,7 +479,7 @@ class Message:
                  path: Optional[Union[str, Path]] = None,
                  reactions: Reactions = None,
                  substitutions: Optional[Substitutions] = None,
-                 target: 'Optional[Message]' = None,
+                 target: 'Union[Message, MessageReference, None]' = None,
                  text: str = "",
                  type: MsgType = MsgType.Unsupported,
                  uid: Optional[MessageID] = None,
@@ -448,18 +495,63 @@ class Message:
         self.filename: Optional[str] = filename
         self.is_system: bool = is_system
         self.mime: Optional[str] = mime
-        self.path: Optional[Path]
+        self._path: Optional[Path]
         if isinstance(path, str):
-            self.path = Path(path)
-        else:
-            self.path = path
+            path = Path(path)
+        self.path = path
         self.reactions: Reactions = reactions if reactions is not None else dict()
         self.substitutions: Optional[Substitutions] = substitutions
-        self.target: Optional[Message] = target
+        self.target: 'Union[Message, MessageReference, None]' = target
         self.text: str = text
         self.type: MsgType = type
         self.uid: Optional[MessageID] = uid
-        self.vendor_specific: Dict[str, Any] = vendor_specific if vendor_specific is not None else dict()
+        # Created on demand, see ``vendor_specific``.
+        self._vendor_specific: Optional[Dict[str, Any]] = vendor_specific
+        # Values of attributes as last verified, see ``_changed_attributes``.
+        self._verified: Optional[Tuple[Any, ...]] = None
+        if coordinator.incremental_verification:
+            # Attributes left to their valid default values are taken as
+            # verified since construction.
+            verified = []
+            for name in _VERIFIED_ATTRIBUTES:
+                value = getattr(self, name)
+                default = name not in _REQUIRED_ATTRIBUTES and (value is None or value is False)
+                verified.append(value if default else _UNVERIFIED)
+            self._verified = tuple(verified)
+
+    @property
+    def vendor_specific(self) -> Dict[str, Any]:
+        if self._vendor_specific is None:
+            self._vendor_specific = dict()
+        return self._vendor_specific  # type: ignore
+
+    @vendor_specific.setter
+    def vendor_specific(self, value: Dict[str, Any]):
+        self._vendor_specific = value
+
+    @property
+    def path(self) -> Optional[Path]:
+        # ``file`` is not yet restored while unpickling.
+        file = getattr(self, 'file', None)
+        if self._path is None and file is not None:
+            # Files kept in memory are written to the disk on demand.
+            path = getattr(file, 'path', None)
+            if isinstance(path, (str, PathLike)):
+                return Path(path)
+        return self._path
+
+    @path.setter
+    def path(self, value: Optional[Path]):
+        self._path = value
+
+    def _saved_path(self) -> Optional[Path]:
+        """Path of the file on the disk, if any, without writing files
+        kept in memory to the disk like :attr:`path` does.
+        """
+        file = getattr(self, 'file', None)
+        if self._path is None and file is not None and getattr(file, 'in_memory', False):
+            return None
+        return self.path
 
     @property
     def status(self) -> Optional[StatusAttribute]:
@@ -496,25 +588,51 @@ class Message:
                "Target messages: {msg.target}; " \
                "UID: {msg.uid}; " \
                "Reactions: {msg.reactions}; " \
-               "File: {msg.file} ({msg.filename} @ {msg.path}), {msg.mime}; " \
+               "File: {msg.file} ({msg.filename} @ {msg._path}), {msg.mime}; " \
                "Vendor: {msg.vendor_specific}>".format(msg=self)
 
+    def _changed_attributes(self) -> Optional[Set[str]]:
+        """Attributes assigned with other objects since the message is
+        created or last verified, ``None`` if not known."""
+        verified = self._verified
+        if verified is None:
+            return None
+        return {name for name, value in zip(_VERIFIED_ATTRIBUTES, verified) if getattr(self, name) is not value}
+
     def verify(self):
         """
         Verify the validity of message.
 
+        When :data:`.coordinator.incremental_verification` is enabled,
+        a message is only verified on attributes assigned since it is
+        created or last verified, attributes left to their default values
+        are not verified. Chats and members involved are always verified
+        with their own cached results. Messages unpickled, or created while
+        incremental verification is disabled, are verified in full for the
+        first time.
+
         Raises:
             AssertionError: when the message is not valid
         """
-        assert isinstance(self.author, ChatMember), f"Author ({self.author!r}) is not valid."
+        fields = self._changed_attributes() if coordinator.incremental_verification else None
+
+        def touched(*names: str) -> bool:
+            return fields is None or not fields.isdisjoint(names)
+
+        if touched('author'):
+            assert isinstance(self.author, ChatMember), f"Author ({self.author!r}) is not valid."
         self.author.verify()
-        assert isinstance(self.chat, Chat), f"Chat ({self.chat!r}) is not valid."
+        if touched('chat'):
+            assert isinstance(self.chat, Chat), f"Chat ({self.chat!r}) is not valid."
         self.chat.verify()
-        assert isinstance(self.type, MsgType), \
-            f"Type ({self.type!r}) is not valid."
-        assert isinstance(self.deliver_to, Channel), \
-            f"deliver_to ({self.deliver_to!r}) is not valid."
-        if self.type in (MsgType.Voice, MsgType.File, MsgType.Image, MsgType.Sticker, MsgType.Video) and \
+        if touched('type'):
+            assert isinstance(self.type, MsgType), \
+                f"Type ({self.type!r}) is not valid."
+        if touched('deliver_to'):
+            assert isinstance(self.deliver_to, Channel), \
+                f"deliver_to ({self.deliver_to!r}) is not valid."
+        if touched('type', 'edit', 'edit_media', 'file', 'mime', '_path') and \
+                self.type in (MsgType.Voice, MsgType.File, MsgType.Image, MsgType.Sticker, MsgType.Video) and \
                 ((not self.edit) or (self.edit and self.edit_media)):
             assert hasattr(self.file, "read") or not hasattr(self.file, "close"), \
                 f"File ({self.file!r}) is not valid."
@@ -526,25 +644,45 @@ class Message:
             # https://github.com/python/mypy/tree/v0.790/mypy
             # Fixed typeshed commit is on 27 Sep 2020 (076983e)
             # https://github.com/python/typeshed/commit/076983eec45e739c68551cb6119fd7d85fd4afa9
-            assert self.path or not isinstance(self.path, (str, PathLike)), f"Path ({self.path!r}) is not valid."  # type: ignore
-        assert self.type != MsgType.Location or isinstance(self.attributes, LocationAttribute), \
-            f"Attribute of location message ({self.attributes!r}) is invalid."
-        assert self.type != MsgType.Link or isinstance(self.attributes, LinkAttribute), \
-            f"Attribute of link message ({self.attributes!r}) is invalid."
-        assert self.type != MsgType.Status or isinstance(self.attributes, StatusAttribute), \
-            f"Attribute of status message ({self.attributes!r}) is invalid."
-
-        if self.attributes:
-            self.attributes.verify()
-
-        if self.commands:
+            # The slot is checked to keep files in memory, see ``path``.
+            assert self._path or not isinstance(self._path, (str, PathLike)), f"Path ({self._path!r}) is not valid."  # type: ignore
+        if touched('type', 'attributes'):
+            assert self.type != MsgType.Location or isinstance(self.attributes, LocationAttribute), \
+                f"Attribute of location message ({self.attributes!r}) is invalid."
+            assert self.type != MsgType.Link or isinstance(self.attributes, LinkAttribute), \
+                f"Attribute of link message ({self.attributes!r}) is invalid."
+            assert self.type != MsgType.Status or isinstance(self.attributes, StatusAttribute), \
+                f"Attribute of status message ({self.attributes!r}) is invalid."
+
+            if self.attributes:
+                self.attributes.verify()
+
+        if self.commands and touched('commands'):
             self.commands.verify()
 
-        if self.substitutions:
+        if self.substitutions and touched('substitutions'):
             self.substitutions.verify()
 
+        if isinstance(self.target, MessageReference) and touched('target'):
+            self.target.verify()
+
+        if coordinator.incremental_verification:
+            self._verified = tuple(getattr(self, name) for name in _VERIFIED_ATTRIBUTES)
+        else:
+            self._verified = None
+
     def __getstate__(self):
-        state = self.__dict__.copy()
+        state = _get_slots_state(self)
+        # Verification state is not carried over
+        state.pop('_verified', None)
+        # Keep the same format as objects pickled without ``__slots__``.
+        state.pop('_vendor_specific', None)
+        state['vendor_specific'] = self.vendor_specific
+        # Files are reopened from the path when unpickled. Files kept in
+        # memory are not written to the disk, and are dropped like others.
+        del state['_path']
+        state['path'] = self._saved_path()
+
         # Remove file object
         if state.get('file', None) is not None:
             del state['file']
@@ -555,7 +693,12 @@ class Message:
         return state
 
     def __setstate__(self, state: Dict[str, Any]):
-        self.__dict__.update(state)
+        # Verified in full for the first time.
+        self._verified = None
+        # Files are dropped when pickled, restore the slot before ``path`` is read.
+        if 'file' not in state:
+            self.file = None
+        _set_slots_state(self, state)
 
         # Try to load "deliver_to" channel
         with suppress(NameError):
@@ -563,7 +706,138 @@ class Message:
             if isinstance(dt, Channel):
                 self.deliver_to = dt
 
-        # Try to load file from original path
-        if self.path:
-            with suppress(IOError):
-                self.file = open(self.path, 'rb')
+        # Reopen the file from the original path on its first access.
+        path = self.path
+        if path and Path(path).is_file():
+            self.file = cast(BinaryIO, LazyMediaFile(path))
+
+    def close(self):
+        """
+        Close the file of the message, if any, to signify the end of its
+        lifecycle.
+
+        The file is closed by the channel which sent it, or by the last
+        channel or middleware which took it over. Files of unpickled messages
+        are only opened on access, and SHOULD also be closed when the
+        message is not required anymore.
+        """
+        if self.file is not None:
+            self.file.close()
+
+
+class MessageReference:
+    """
+    A reference to a message, used as :attr:`Message.target`.
+
+    A reference only carries the fields of a “minimum message”, so that
+    a chain of replies does not embed every message of the chain. The
+    complete message is retrieved with :meth:`resolve` on demand.
+
+    Attributes:
+        chat (:obj:`.Chat`): Chat of the message.
+        author (Optional[:obj:`.ChatMember`]): Author of the message.
+        uid (:obj:`.MessageID` (str)): ID of the message.
+        text (str): Text of the message.
+        type (:obj:`.MsgType`): Type of the message.
+    """
+
+    __slots__ = ('chat', 'author', 'uid', 'text', 'type', '_message')
+
+    def __init__(self, chat: Chat, uid: MessageID, author: Optional[ChatMember] = None,
+                 text: str = "", type: MsgType = MsgType.Unsupported):
+        """
+        Args:
+            chat: Chat of the message.
+            uid: ID of the message.
+            author: Author of the message.
+            text: Text of the message.
+            type: Type of the message.
+        """
+        self.chat: Chat = chat
+        self.uid: MessageID = uid
+        self.author: Optional[ChatMember] = author
+        self.text: str = text
+        self.type: MsgType = type
+        self._message: 'Optional[weakref.ReferenceType[Message]]' = None
+
+    @classmethod
+    def from_message(cls, message: Message) -> 'MessageReference':
+        """
+        Make a reference to a message.
+
+        The message is returned by :meth:`resolve` as long as it is
+        referred elsewhere.
+
+        Args:
+            message: The message to refer to.
+        """
+        reference = cls(chat=message.chat, uid=message.uid, author=message.author,  # type: ignore
+                        text=message.text, type=message.type)
+        reference._message = weakref.ref(message)
+        return reference
+
+    def resolve(self) -> Optional[Message]:
+        """
+        Get the message referred.
+
+        The message is retrieved with :meth:`.Channel.get_message_by_id`
+        of the module of :attr:`chat`, unless the message the reference is
+        made from is still available.
+
+        Returns:
+            The message referred, ``None`` if not found.
+
+        Raises:
+            EFBChannelNotFound: When the channel of the chat is not found.
+            EFBOperationNotSupported: When the channel does not support
+                retrieving messages.
+        """
+        message = self._message() if self._message is not None else None
+        if message is not None:
+            return message
+        try:
+            channel = coordinator.get_module_by_id(self.chat.module_id)
+        except NameError:
+            raise EFBChannelNotFound()
+        if not isinstance(channel, Channel):
+            raise EFBChannelNotFound()
+        message = channel.get_message_by_id(self.chat, self.uid)
+        if message is not None:
+            self._message = weakref.ref(message)
+        return message
+
+    def verify(self):
+        """
+        Verify the validity of the reference.
+
+        Raises:
+            AssertionError: when the reference is not valid
+        """
+        assert isinstance(self.chat, Chat), f"Chat ({self.chat!r}) is not valid."
+        assert self.author is None or isinstance(self.author, ChatMember), \
+            f"Author ({self.author!r}) is not valid."
+        assert self.uid, f"Message ID ({self.uid!r}) is not valid."
+        assert isinstance(self.type, MsgType), f"Type ({self.type!r}) is not valid."
+
+    def __eq__(self, other):
+        return isinstance(other, MessageReference) and other.chat == self.chat and other.uid == self.uid
+
+    def __hash__(self):
+        return hash((self.chat, self.uid))
+
+    def __str__(self):
+        return "<MessageReference, {ref.author}@{ref.chat} [{ref.type.name}]: {ref.text}; {ref.uid}>".format(ref=self)
+
+    def __repr__(self):
+        return "MessageReference(chat={ref.chat!r}, uid={ref.uid!r}, author={ref.author!r}, " \
+               "text={ref.text!r}, type={ref.type!r})".format(ref=self)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = _get_slots_state(self)
+        # The message referred is retrieved again on demand.
+        del state['_message']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        state['_message'] = None
+        _set_slots_state(self, state)
@@ -1,10 +1,11 @@
 # coding=utf-8
 
 from abc import ABC
-from typing import Optional, Dict, Callable, TYPE_CHECKING
+from typing import Optional, Dict, Callable, TYPE_CHECKING, Collection, Type
 from .types import ModuleID, InstanceID, ExtraCommandName
 
 if TYPE_CHECKING:
+    from .constants import MsgType
     from .message import Message
     from .status import Status
 
@@ -23,12 +24,52 @@ class Middleware(ABC):
         middleware_name (str): Human-readable name of the middleware.
         instance_id (str):
             The instance ID if available.
+        subscribed_message_types (Optional[Collection[:class:`~.constants.MsgType`]]):
+            Types of messages to be processed by this middleware.
+            ``None`` to process messages of all types.
+        subscribed_status_types (Optional[Collection[Type[:class:`~.status.Status`]]]):
+            Classes of statuses to be processed by this middleware,
+            subclasses included. ``None`` to process statuses of all classes.
+        subscribed_sources (Optional[Collection[:obj:`.ModuleID` (str)]]):
+            IDs of modules where messages and statuses to be processed
+            are sent from. ``None`` to process those from all modules.
+        subscribed_destinations (Optional[Collection[:obj:`.ModuleID` (str)]]):
+            IDs of channels where messages and statuses to be processed
+            are delivered to. ``None`` to process those to all channels.
+
+    Subscriptions are read by the coordinator when the middleware is
+    registered. Messages and statuses not matching all subscriptions of
+    a middleware skip it without calling :meth:`process_message` or
+    :meth:`process_status`. A middleware that does not override either
+    method is also skipped for that kind of objects.
+
+    The source of a message delivered to the master channel is the module
+    of its :attr:`~.message.Message.chat`, and the source of a message
+    delivered to a slave channel is the master channel. For statuses, the
+    source is the channel issuing it if known, otherwise determined the
+    same way as messages.
+
+    Example:
+        A middleware that only processes images sent from
+        the master channel to slave channel ``foo.demo_slave``.
+
+        .. code-block:: python
+
+            class ImageMiddleware(Middleware):
+                subscribed_message_types = {MsgType.Image}
+                subscribed_destinations = {ModuleID("foo.demo_slave")}
+                subscribed_status_types = set()  # No status is processed.
     """
     middleware_id: ModuleID = ModuleID("efb.empty_middleware")
     middleware_name: str = "Empty Middleware"
     instance_id: Optional[InstanceID] = None
     __version__: str = 'undefined version'
 
+    subscribed_message_types: 'Optional[Collection[MsgType]]' = None
+    subscribed_status_types: 'Optional[Collection[Type[Status]]]' = None
+    subscribed_sources: Optional[Collection[ModuleID]] = None
+    subscribed_destinations: Optional[Collection[ModuleID]] = None
+
     def __init__(self, instance_id: Optional[InstanceID] = None):
         """
         Initialize the middleware.
@@ -0,0 +1,331 @@
+# coding=utf-8
+
+"""
+Retrying of failed deliveries, and the queue of messages failed to deliver.
+
+When enabled, the :mod:`.coordinator` schedules another attempt of a
+message when :meth:`.Channel.send_message` raises an exception with a
+:class:`RetryPolicy` in :data:`.coordinator.retry_policies`, waiting longer
+before each attempt without blocking the sender. Messages still failed
+after all attempts are kept in a :class:`DeadLetterQueue`, to be inspected
+and delivered again later, e.g. with ``ehforwarderbot dead-letters`` in the
+command line.
+"""
+
+import logging
+import os
+import pickle
+import random
+import threading
+import time
+import uuid
+from contextlib import suppress
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Optional, Dict, Type, List, Iterator, Any, BinaryIO, cast, TYPE_CHECKING
+
+from . import coordinator
+from .channel import Channel
+from .media import LazyMediaFile, MediaFile
+from .types import ModuleID
+
+if TYPE_CHECKING:
+    from .message import Message
+
+__all__ = ["RetryPolicy", "find_policy", "DeadLetter", "DeadLetterQueue"]
+
+
+class RetryPolicy:
+    """
+    Policy to retry a delivery with exponential backoff and jitter.
+
+    The delay before the attempt ``n + 1`` is
+    ``initial_delay * multiplier ** (n - 1)``, up to ``max_delay``, randomly
+    reduced by up to a fraction of ``jitter``, so that deliveries failed at
+    the same time are not retried at the same time.
+
+    Attributes:
+        max_attempts (int): Maximum number of attempts, including the first one.
+        initial_delay (float): Delay before the second attempt in seconds.
+        max_delay (float): Maximum delay between attempts in seconds.
+        multiplier (float): Factor of the delay of each attempt over the previous one.
+        jitter (float): Maximum fraction of the delay randomly reduced,
+            between 0 and 1.
+    """
+
+    def __init__(self, max_attempts: int = 3, initial_delay: float = 1.0, max_delay: float = 30.0,
+                 multiplier: float = 2.0, jitter: float = 0.5):
+        """
+        Args:
+            max_attempts: Maximum number of attempts, including the first one.
+            initial_delay: Delay before the second attempt in seconds.
+            max_delay: Maximum delay between attempts in seconds.
+            multiplier: Factor of the delay of each attempt over the previous one.
+            jitter: Maximum fraction of the delay randomly reduced, between 0 and 1.
+        """
+        self.max_attempts: int = max_attempts
+        self.initial_delay: float = initial_delay
+        self.max_delay: float = max_delay
+        self.multiplier: float = multiplier
+        self.jitter: float = jitter
+
+    def delay(self, attempt: int) -> float:
+        """
+        Get the delay after a failed attempt.
+
+        Args:
+            attempt: Number of the attempt failed, starting from 1.
+
+        Returns:
+            Number of seconds to wait before the next attempt.
+        """
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def __repr__(self):
+        return "RetryPolicy(max_attempts={p.max_attempts!r}, initial_delay={p.initial_delay!r}, " \
+               "max_delay={p.max_delay!r}, multiplier={p.multiplier!r}, jitter={p.jitter!r})".format(p=self)
+
+
+def find_policy(policies: 'Dict[Type[Exception], Optional[RetryPolicy]]',
+                exception: Exception) -> Optional[RetryPolicy]:
+    """
+    Find the policy of an exception, from the policy of its class or the
+    closest base class listed.
+
+    Args:
+        policies: Policies by classes of exceptions. ``None`` for exceptions
+            not to retry.
+        exception: The exception raised.
+
+    Returns:
+        The policy of the exception, ``None`` if it is not to be retried.
+    """
+    for cls in type(exception).__mro__:
+        if cls in policies:
+            return policies[cls]
+    return None
+
+
+class DeadLetter:
+    """
+    A message failed to deliver, kept in a :class:`DeadLetterQueue`.
+
+    Attributes:
+        id (str): ID of the entry in the queue.
+        message (:obj:`.Message`): The message failed to deliver.
+        destination (:obj:`.ModuleID` (str)): ID of the channel the message
+            is delivered to.
+        error (str): Description of the last exception raised.
+        attempts (int): Number of attempts made.
+        time (float): Time of the last attempt.
+    """
+
+    def __init__(self, id: str, message: 'Message', destination: ModuleID, error: str, attempts: int,
+                 time: float):
+        self.id: str = id
+        self.message: 'Message' = message
+        self.destination: ModuleID = destination
+        self.error: str = error
+        self.attempts: int = attempts
+        self.time: float = time
+
+    def __repr__(self):
+        return "<DeadLetter {l.id} to {l.destination} after {l.attempts} attempts: {l.error}; " \
+               "{l.message}>".format(l=self)
+
+
+class DeadLetterQueue:
+    """
+    A queue of messages failed to deliver, stored as pickles in a
+    directory.
+
+    Media files of messages are copied to the :class:`.MediaStore` when
+    queued, as the original files are usually discarded by the channel
+    sending the message, and files without a path are only in memory.
+    The queue refers to each file copied by its name until its entry is
+    removed, so that the file is not evicted from the store before the
+    message is delivered again.
+
+    Attributes:
+        path (pathlib.Path): Directory of the queue.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: Directory of the queue, created if not existing.
+                Media files of entries already in the queue are referred
+                again from the media store.
+        """
+        self.path: Path = path
+        self.logger = logging.getLogger(__name__)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Names of files in the media store referred by entries, keyed by entry ID
+        self._media: Dict[str, str] = dict()
+        for i in self.ids():
+            try:
+                self.get(i)
+            except Exception as e:
+                self.logger.warning("Failed to load dead letter %s: %r", i, e)
+
+    def put(self, message: 'Message', error: Exception, attempts: int) -> str:
+        """
+        Add a message failed to deliver to the queue.
+
+        Args:
+            message: The message failed to deliver.
+            error: The last exception raised.
+            attempts: Number of attempts made.
+
+        Returns:
+            ID of the entry in the queue.
+        """
+        letter_id = "{:d}-{}".format(int(time.time() * 1000), uuid.uuid4().hex[:8])
+        store = coordinator.get_media_store()
+        path = message._saved_path()
+        stored: Optional[MediaFile] = None
+        if path is not None and Path(path).is_file():
+            stored = store.add_path(path)
+        elif message.file is not None:
+            # Content only in memory, e.g. a BytesIO or a SpooledMediaFile,
+            # is copied to the store without writing a temporary file first.
+            with suppress(Exception):
+                message.file.seek(0)
+            stored = store.add(message.file, Path(message.filename or "").suffix)
+        if stored is not None:
+            path = stored.path
+            with stored:
+                store.refer(path.name)
+            with self._lock:
+                self._media[letter_id] = path.name
+        destination = cast(ModuleID, getattr(message.deliver_to, 'channel_id', message.deliver_to))
+        try:
+            self._write(letter_id, message, path, destination, error, attempts)
+        except BaseException:
+            if stored is not None:
+                with self._lock:
+                    del self._media[letter_id]
+                store.release(stored.path.name)
+            raise
+        self.logger.warning("Message %s is queued as dead letter %s after %s attempts: %r",
+                            message, letter_id, attempts, error)
+        return letter_id
+
+    def _write(self, letter_id: str, message: 'Message', path: Optional[Path], destination: ModuleID,
+               error: Exception, attempts: int):
+        record = {
+            "message": message,
+            "path": str(path) if path is not None else None,
+            "destination": destination,
+            "error": repr(error),
+            "attempts": attempts,
+            "time": time.time(),
+        }
+        with NamedTemporaryFile(dir=str(self.path), suffix=".tmp", delete=False) as f:
+            pickle.dump(record, f)
+        os.replace(f.name, str(self.path / (letter_id + ".pickle")))
+
+    def ids(self) -> List[str]:
+        """IDs of entries in the queue, the oldest first."""
+        return sorted(i.stem for i in self.path.glob("*.pickle"))
+
+    def __len__(self) -> int:
+        return len(self.ids())
+
+    def __iter__(self) -> Iterator[DeadLetter]:
+        for i in self.ids():
+            letter = self.get(i)
+            if letter is not None:
+                yield letter
+
+    def get(self, letter_id: str) -> Optional[DeadLetter]:
+        """
+        Get an entry in the queue.
+
+        Args:
+            letter_id: ID of the entry.
+
+        Returns:
+            The entry, ``None`` if not found.
+        """
+        try:
+            with (self.path / (letter_id + ".pickle")).open("rb") as f:
+                record: Dict[str, Any] = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        message = record["message"]
+        if record["path"] is not None:
+            message.path = Path(record["path"])
+            self._refer(letter_id, message.path)
+            if message.path.is_file():
+                message.file = cast(BinaryIO, LazyMediaFile(message.path))
+        return DeadLetter(letter_id, message, record["destination"], record["error"],
+                          record["attempts"], record["time"])
+
+    def remove(self, letter_id: str) -> bool:
+        """
+        Remove an entry from the queue.
+
+        Args:
+            letter_id: ID of the entry.
+
+        Returns:
+            ``True`` if the entry is removed, ``False`` if not found.
+        """
+        with self._lock:
+            name = self._media.pop(letter_id, None)
+        if name is not None:
+            coordinator.get_media_store().release(name)
+        try:
+            (self.path / (letter_id + ".pickle")).unlink()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _refer(self, letter_id: str, path: Path):
+        """Refer to the file of an entry if it is in the media store."""
+        with self._lock:
+            if letter_id in self._media:
+                return
+            store = coordinator.get_media_store()
+            if path.parent != store.path:
+                return
+            with suppress(FileNotFoundError):
+                store.refer(path.name)
+                self._media[letter_id] = path.name
+
+    def replay(self, letter_id: str) -> Optional['Message']:
+        """
+        Deliver a message in the queue again with
+        :meth:`.coordinator.redeliver_message`, and remove it from the queue
+        when delivered.
+
+        If the delivery fails again, the entry is kept with the attempt
+        and the exception raised.
+
+        Args:
+            letter_id: ID of the entry.
+
+        Returns:
+            The message delivered, as returned by :meth:`.coordinator.redeliver_message`.
+
+        Raises:
+            KeyError: When the entry is not found.
+            Exception: Any exception raised by the delivery.
+        """
+        letter = self.get(letter_id)
+        if letter is None:
+            raise KeyError(letter_id)
+        message = letter.message
+        if not hasattr(message.deliver_to, 'channel_id'):
+            # The channel is not available when the message is unpickled.
+            message.deliver_to = cast(Channel, coordinator.get_module_by_id(letter.destination))
+        try:
+            result = coordinator.redeliver_message(message)
+        except Exception as e:
+            self._write(letter_id, message, message.path, letter.destination, e, letter.attempts + 1)
+            raise
+        self.remove(letter_id)
+        return result
@@ -0,0 +1,507 @@
+# coding=utf-8
+
+"""
+Compact binary serialization of messages and statuses.
+
+Unlike pickles, which embed every chat with all of its members, payloads
+produced by :func:`dumps` refer to chats by their identity, i.e. module ID
+and chat ID, and to members by their IDs within the chat. Each chat involved
+is stored once in a payload with a snapshot of its own attributes, but not
+of its members.
+
+When loaded with :func:`loads`, chats are looked up with
+:meth:`.coordinator.get_chat` where possible, and members are looked up
+from the chats found. Snapshots are used when a chat cannot be found, e.g.
+when the slave channel is not running.
+
+Target messages assigned as :class:`~.message.MessageReference` are stored
+as references, so that payloads do not grow along a chain of replies. Other
+target messages are stored in full.
+
+Payloads are versioned. A payload is always readable by the version of this
+module that produced it, and by later versions.
+
+Values of :attr:`~.Message.vendor_specific`, command arguments and any
+other values not natively supported by the format are embedded as pickles.
+
+Example:
+    .. code-block:: python
+
+        data = serialization.dumps(message)
+        message = serialization.loads(data)
+"""
+
+import pickle
+import struct
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, List, Dict, Tuple, Union, Optional, Type, cast, BinaryIO
+
+from . import coordinator
+from .channel import Channel
+from .chat import Chat, ChatMember, SelfChatMember, SystemChatMember, PrivateChat, GroupChat, SystemChat, \
+    BaseChat, _restore_chat, _restore_member
+from .constants import MsgType
+from .media import LazyMediaFile
+from .message import Message, LinkAttribute, LocationAttribute, StatusAttribute, MessageCommands, \
+    MessageCommand, Substitutions, MessageReference
+from .status import Status, ChatUpdates, MemberUpdates, MessageRemoval, ReactToMessage, MessageReactionsUpdate
+from .types import ModuleID, ChatID, Reactions
+
+__all__ = ["VERSION", "dumps", "loads"]
+
+VERSION = 2
+"""Version of payloads produced by :func:`dumps`."""
+
+_MAGIC = b"EFB"
+
+# Tags of values, loosely following MessagePack. Non-negative integers below
+# 0x80 are stored as a single byte.
+_NONE = 0xc0
+_FALSE = 0xc2
+_TRUE = 0xc3
+_BYTES = 0xc4
+_PICKLE = 0xc7
+_FLOAT = 0xcb
+_INT = 0xd3
+_STR = 0xd9
+_TUPLE = 0xdc
+_LIST = 0xdd
+_DICT = 0xdf
+
+_DOUBLE = struct.Struct(">d")
+
+
+# Values
+
+def _pack_size(size: int, out: bytearray):
+    while size >= 0x80:
+        out.append((size & 0x7f) | 0x80)
+        size >>= 7
+    out.append(size)
+
+
+def _pack(value: Any, out: bytearray):
+    t = type(value)
+    if value is None:
+        out.append(_NONE)
+    elif t is bool:
+        out.append(_TRUE if value else _FALSE)
+    elif t is int:
+        if 0 <= value < 0x80:
+            out.append(value)
+        else:
+            out.append(_INT)
+            # Zigzag encoding of integers of any size.
+            _pack_size(value << 1 if value >= 0 else (-value << 1) - 1, out)
+    elif t is str:
+        data = value.encode("utf-8", "surrogatepass")
+        out.append(_STR)
+        _pack_size(len(data), out)
+        out += data
+    elif t is float:
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif t is bytes:
+        out.append(_BYTES)
+        _pack_size(len(value), out)
+        out += value
+    elif t is list or t is tuple:
+        out.append(_LIST if t is list else _TUPLE)
+        _pack_size(len(value), out)
+        for i in value:
+            _pack(i, out)
+    elif t is dict:
+        out.append(_DICT)
+        _pack_size(len(value), out)
+        for k, v in value.items():
+            _pack(k, out)
+            _pack(v, out)
+    else:
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        out.append(_PICKLE)
+        _pack_size(len(data), out)
+        out += data
+
+
+class _Unpacker:
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data: bytes, pos: int):
+        self.data = data
+        self.pos = pos
+
+    def size(self) -> int:
+        data = self.data
+        result = 0
+        shift = 0
+        while True:
+            byte = data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def chunk(self) -> bytes:
+        size = self.size()
+        start = self.pos
+        self.pos += size
+        if self.pos > len(self.data):
+            raise ValueError("Payload is truncated.")
+        return self.data[start:self.pos]
+
+    def value(self) -> Any:
+        tag = self.data[self.pos]
+        self.pos += 1
+        if tag < 0x80:
+            return tag
+        if tag == _STR:
+            return self.chunk().decode("utf-8", "surrogatepass")
+        if tag == _NONE:
+            return None
+        if tag == _LIST or tag == _TUPLE:
+            items = [self.value() for _ in range(self.size())]
+            return items if tag == _LIST else tuple(items)
+        if tag == _INT:
+            value = self.size()
+            return value >> 1 if not value & 1 else -((value + 1) >> 1)
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _DICT:
+            result = {}
+            for _ in range(self.size()):
+                key = self.value()
+                result[key] = self.value()
+            return result
+        if tag == _FLOAT:
+            value = _DOUBLE.unpack_from(self.data, self.pos)[0]
+            self.pos += _DOUBLE.size
+            return value
+        if tag == _BYTES:
+            return bytes(self.chunk())
+        if tag == _PICKLE:
+            return pickle.loads(self.chunk())
+        raise ValueError("Unknown tag 0x{:02x} at position {}.".format(tag, self.pos - 1))
+
+
+# Objects
+
+_CHAT_CLASSES: Dict[Type[Chat], str] = {PrivateChat: "P", GroupChat: "G", SystemChat: "S"}
+_CHAT_CODES: Dict[str, Type[Chat]] = {v: k for k, v in _CHAT_CLASSES.items()}
+_MEMBER_CLASSES: Dict[Type[ChatMember], int] = {ChatMember: 0, SelfChatMember: 1, SystemChatMember: 2}
+_MEMBER_CODES: Dict[int, Type[ChatMember]] = {v: k for k, v in _MEMBER_CLASSES.items()}
+
+_MESSAGE = "M"
+_STATUS_CODES: Dict[Type[Status], str] = {
+    ChatUpdates: "CU",
+    MemberUpdates: "MU",
+    MessageRemoval: "MR",
+    ReactToMessage: "RM",
+    MessageReactionsUpdate: "RU",
+}
+_STATUS_CLASSES: Dict[str, Type[Status]] = {v: k for k, v in _STATUS_CODES.items()}
+
+
+def _module_id(module: Any) -> Optional[ModuleID]:
+    if isinstance(module, Channel):
+        return module.channel_id
+    return module
+
+
+def _get_module(module_id: Optional[ModuleID]) -> Any:
+    """Look up a module by its ID, giving the ID back as pickles do if not found."""
+    if module_id is None:
+        return None
+    with suppress(NameError):
+        return coordinator.get_module_by_id(module_id)
+    return module_id
+
+
+class _Encoder:
+    def __init__(self):
+        self.chats: List[Any] = []
+        self.chat_index: Dict[Tuple[ModuleID, ChatID], int] = dict()
+
+    def chat(self, chat: Chat) -> int:
+        key = (chat.module_id, chat.uid)
+        index = self.chat_index.get(key)
+        if index is not None:
+            return index
+        code = _CHAT_CLASSES.get(type(chat))
+        if code is None:
+            # Chats of other classes are embedded as pickles.
+            record: Any = chat
+        else:
+            record = [code, chat.module_id, chat.module_name, chat.channel_emoji, chat.uid,
+                      chat.name, chat.alias, chat.description, chat.notification.value,
+                      chat._vendor_specific or None,
+                      chat.self.uid if chat.self is not None else None]
+        index = self.chat_index[key] = len(self.chats)
+        self.chats.append(record)
+        return index
+
+    def member(self, member: ChatMember) -> Any:
+        code = _MEMBER_CLASSES.get(type(member))
+        if code is None:
+            return member
+        chat = member.chat
+        module = None
+        if member.module is not chat.module:
+            module = [member.module_id, member.module_name, member.channel_emoji]
+        return [self.chat(chat), code, member.uid, member.name, member.alias, member.description,
+                module, member._vendor_specific or None]
+
+    def ref(self, chat: Optional[BaseChat]) -> Any:
+        """Chats are referred by their indices, and members by lists."""
+        if chat is None:
+            return None
+        if isinstance(chat, Chat):
+            return self.chat(chat)
+        if isinstance(chat, ChatMember):
+            return self.member(chat)
+        return chat
+
+    def reactions(self, reactions: Any) -> Dict[str, List[Any]]:
+        return {k: [self.ref(i) for i in v] for k, v in reactions.items()}
+
+    def attributes(self, attributes: Any) -> Any:
+        t = type(attributes)
+        if t is LinkAttribute:
+            return ["L", attributes.title, attributes.description, attributes.image, attributes.url]
+        if t is LocationAttribute:
+            return ["P", attributes.latitude, attributes.longitude]
+        if t is StatusAttribute:
+            return ["S", attributes.status_type.value, attributes.timeout]
+        return attributes
+
+    def message(self, msg: Optional[Message]) -> Any:
+        if msg is None:
+            return None
+        commands = None
+        if msg.commands is not None:
+            commands = [[i.name, i.callable_name, list(i.args), dict(i.kwargs)] for i in msg.commands]
+        substitutions = None
+        if msg.substitutions is not None:
+            substitutions = [[k[0], k[1], self.ref(v)] for k, v in msg.substitutions.items()]
+        # Files kept in memory are not written to the disk to get a path.
+        path = msg._saved_path()
+        flags = msg.edit | msg.edit_media << 1 | msg.is_system << 2
+        return [msg.type.value, msg.uid, msg.text, self.ref(msg.chat), self.ref(msg.author),
+                _module_id(msg.deliver_to), flags, msg.filename, msg.mime,
+                str(path) if path is not None else None,
+                self.attributes(msg.attributes), commands, substitutions,
+                self.reactions(msg.reactions) if msg.reactions else None,
+                self.reference(msg.target), msg._vendor_specific or None]
+
+    def reference(self, reference: Union[Message, MessageReference, None]) -> Any:
+        if reference is None:
+            return None
+        if isinstance(reference, Message):
+            return self.message(reference)
+        return [reference.uid, self.ref(reference.chat), self.ref(reference.author),
+                reference.text, reference.type.value]
+
+    def status(self, status: Status) -> List[Any]:
+        dest = _module_id(status.destination_channel)
+        if isinstance(status, ChatUpdates):
+            return [_module_id(status.channel), list(status.new_chats), list(status.removed_chats),
+                    list(status.modified_chats), dest]
+        if isinstance(status, MemberUpdates):
+            return [_module_id(status.channel), status.chat_id, list(status.new_members),
+                    list(status.removed_members), list(status.modified_members), dest]
+        if isinstance(status, MessageRemoval):
+            return [_module_id(status.source_channel), dest, self.message(status.message)]
+        if isinstance(status, ReactToMessage):
+            return [self.ref(status.chat), status.msg_id, status.reaction, dest]
+        if isinstance(status, MessageReactionsUpdate):
+            return [self.ref(status.chat), status.msg_id, self.reactions(status.reactions), dest]
+        raise TypeError("Status of type {} is not supported.".format(type(status).__name__))
+
+
+class _Decoder:
+    def __init__(self, chats: List[Any], resolve: bool):
+        self.records = chats
+        self.chats: List[Optional[Chat]] = [None] * len(chats)
+        self.snapshots: List[bool] = [False] * len(chats)
+        self.resolve = resolve
+
+    def chat(self, index: int) -> Chat:
+        chat = self.chats[index]
+        if chat is not None:
+            return chat
+        record = self.records[index]
+        if not isinstance(record, list):
+            chat = cast(Chat, record)
+        else:
+            code, module_id, module_name, channel_emoji, uid, name, alias, description, \
+                notification, vendor_specific, self_uid = record
+            chat, self.snapshots[index] = _restore_chat(
+                _CHAT_CODES[code], module_id, module_name, channel_emoji, uid, name, alias, description,
+                notification, vendor_specific, self_uid, resolve=self.resolve)
+        self.chats[index] = chat
+        return chat
+
+    def member(self, record: List[Any]) -> ChatMember:
+        index, code, uid, name, alias, description, module, vendor_specific = record
+        chat = self.chat(index)
+        # Members referred are the only members known of a snapshot.
+        return _restore_member(chat, _MEMBER_CODES[code], uid, name, alias, description, module,
+                               vendor_specific, restored=self.snapshots[index])
+
+    def ref(self, ref: Any) -> Any:
+        if isinstance(ref, int):
+            return self.chat(ref)
+        if isinstance(ref, list):
+            return self.member(ref)
+        return ref
+
+    def reactions(self, reactions: Dict[str, List[Any]]) -> Reactions:
+        return cast(Reactions, {k: [self.ref(i) for i in v] for k, v in reactions.items()})
+
+    @staticmethod
+    def attributes(record: Any) -> Any:
+        if not isinstance(record, list):
+            return record
+        code = record[0]
+        if code == "L":
+            attributes: Any = LinkAttribute.__new__(LinkAttribute)
+            attributes.__setstate__(dict(title=record[1], description=record[2], image=record[3], url=record[4]))
+        elif code == "P":
+            attributes = LocationAttribute.__new__(LocationAttribute)
+            attributes.__setstate__(dict(latitude=record[1], longitude=record[2]))
+        elif code == "S":
+            attributes = StatusAttribute.__new__(StatusAttribute)
+            attributes.__setstate__(dict(status_type=StatusAttribute.Types(record[1]), timeout=record[2]))
+        else:
+            raise ValueError("Unknown message attribute {!r}.".format(code))
+        return attributes
+
+    def reference(self, record: Optional[List[Any]]) -> Union[Message, MessageReference, None]:
+        if record is None:
+            return None
+        if len(record) > 5:
+            # Target messages assigned in full
+            return self.message(record)
+        uid, chat, author, text, type_ = record
+        return MessageReference(chat=self.ref(chat), uid=uid, author=self.ref(author),
+                                text=text, type=MsgType(type_))
+
+    def message(self, record: Optional[List[Any]]) -> Optional[Message]:
+        if record is None:
+            return None
+        type_, uid, text, chat, author, deliver_to, flags, filename, mime, path, attributes, \
+            commands, substitutions, reactions, target, vendor_specific = record
+        msg = Message(
+            type=MsgType(type_), uid=uid, text=text, chat=self.ref(chat), author=self.ref(author),
+            edit=bool(flags & 1), edit_media=bool(flags & 2), is_system=bool(flags & 4),
+            filename=filename, mime=mime, path=path, attributes=self.attributes(attributes),
+            target=self.reference(target), vendor_specific=vendor_specific,
+        )
+        if reactions:
+            msg.reactions = self.reactions(reactions)
+        msg.deliver_to = _get_module(deliver_to)
+        if commands is not None:
+            msg.commands = MessageCommands([MessageCommand(*i) for i in commands])
+        if substitutions is not None:
+            msg.substitutions = Substitutions({(i[0], i[1]): self.ref(i[2]) for i in substitutions})
+        # Same as unpickled messages, files are opened on demand.
+        if msg.path is not None and Path(msg.path).is_file():
+            msg.file = cast(BinaryIO, LazyMediaFile(msg.path))
+        return msg
+
+    def status(self, code: str, record: List[Any]) -> Status:
+        cls = _STATUS_CLASSES.get(code)
+        if cls is None:
+            raise ValueError("Unknown status {!r}.".format(code))
+        # Statuses are restored without calling constructors, same as unpickled ones.
+        status = cls.__new__(cls)
+        state: Dict[str, Any]
+        if cls is ChatUpdates:
+            state = dict(channel=_get_module(record[0]), new_chats=record[1], removed_chats=record[2],
+                         modified_chats=record[3], destination_channel=_get_module(record[4]))
+        elif cls is MemberUpdates:
+            state = dict(channel=_get_module(record[0]), chat_id=record[1], new_members=record[2],
+                         removed_members=record[3], modified_members=record[4],
+                         destination_channel=_get_module(record[5]))
+        elif cls is MessageRemoval:
+            state = dict(source_channel=_get_module(record[0]), destination_channel=_get_module(record[1]),
+                         message=self.message(record[2]))
+        elif cls is ReactToMessage:
+            state = dict(chat=self.ref(record[0]), msg_id=record[1], reaction=record[2],
+                         destination_channel=_get_module(record[3]))
+        else:
+            state = dict(chat=self.ref(record[0]), msg_id=record[1], reactions=self.reactions(record[2]),
+                         destination_channel=_get_module(record[3]))
+        status.__dict__.update(state)
+        return status
+
+
+def dumps(obj: Union[Message, Status]) -> bytes:
+    """
+    Serialize a message or a status.
+
+    File objects of messages are not serialized. Files are opened again from
+    :attr:`.Message.path` when loaded, same as unpickled messages. Files
+    kept in memory, e.g. :class:`.media.SpooledMediaFile` not written to the
+    disk yet, have no path and are not written to the disk to get one.
+
+    Args:
+        obj: The message or status to serialize.
+
+    Returns:
+        The payload in bytes.
+
+    Raises:
+        TypeError: When the object is not supported.
+    """
+    encoder = _Encoder()
+    body: Any
+    if isinstance(obj, Message):
+        kind = _MESSAGE
+        body = encoder.message(obj)
+    elif isinstance(obj, Status) and type(obj) in _STATUS_CODES:
+        kind = _STATUS_CODES[type(obj)]
+        body = encoder.status(obj)
+    else:
+        raise TypeError("Object of type {} is not supported.".format(type(obj).__name__))
+    out = bytearray(_MAGIC)
+    out.append(VERSION)
+    _pack([kind, encoder.chats, body], out)
+    return bytes(out)
+
+
+def loads(data: bytes, resolve_chats: bool = True) -> Union[Message, Status]:
+    """
+    Load a message or a status serialized with :func:`dumps`.
+
+    Args:
+        data: The payload in bytes.
+        resolve_chats: Look up chats with :meth:`.coordinator.get_chat`.
+            If disabled, or if a chat is not found, the chat is restored
+            from the snapshot in the payload, with only members referred
+            in the payload.
+
+    Returns:
+        The message or status loaded.
+
+    Raises:
+        ValueError: When the payload is not valid, or is produced by an
+            unsupported version.
+    """
+    if data[:len(_MAGIC)] != _MAGIC or len(data) <= len(_MAGIC):
+        raise ValueError("Payload is not produced by ehforwarderbot.serialization.")
+    version = data[len(_MAGIC)]
+    if version > VERSION:
+        raise ValueError("Payload of version {} is not supported, the latest supported version is {}."
+                         .format(version, VERSION))
+    try:
+        kind, chats, body = _Unpacker(data, len(_MAGIC) + 1).value()
+    except (IndexError, struct.error) as e:
+        raise ValueError("Payload is truncated.") from e
+    decoder = _Decoder(chats, resolve_chats)
+    if kind == _MESSAGE:
+        return cast(Message, decoder.message(body))
+    return decoder.status(kind, body)
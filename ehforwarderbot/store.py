@@ -0,0 +1,448 @@
+# coding=utf-8
+
+"""
+Persistent storage of messages delivered through the coordinator.
+
+Messages are stored in an SQLite database with :mod:`.serialization`,
+indexed by the module ID of the chat, the chat ID and the message ID.
+When enabled, the :mod:`.coordinator` records messages delivered, so that
+channels can look them up with the default implementation of
+:meth:`.Channel.get_message_by_id`, instead of keeping their own records.
+
+IDs of messages changed by the destination channel on delivery are kept
+in a :class:`MessageIDMap`, so that either side can find the message by
+the ID it knows.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Dict, TYPE_CHECKING, cast, Any, Hashable, Set
+
+from .types import ModuleID, ChatID, MessageID
+
+if TYPE_CHECKING:
+    from .message import Message
+
+__all__ = ["MessageStore", "MessageIDMap"]
+
+_Key = Tuple[ModuleID, ChatID, MessageID]
+
+
+class _BatchedStore:
+    """Base of stores in an SQLite database with writes committed in batches.
+
+    Pending writes are kept in :attr:`_pending` by key, and committed by
+    :meth:`_commit` when ``batch_size`` writes are pending, or
+    ``flush_interval`` seconds after the first pending write.
+    """
+
+    _name = "Store"
+
+    def __init__(self, path: Path, batch_size: int, flush_interval: float):
+        self.path: Path = path
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+        self.logger = logging.getLogger(__name__)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # Key -> value to write, or None for removal, in the order of writes.
+        self._pending: Dict[Hashable, Any] = dict()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _write(self, key: Hashable, value: Any):
+        with self._lock:
+            if self._closed:
+                raise ValueError("{} is closed.".format(self._name))
+            # Move the key to the end, so that writes are committed in order.
+            self._pending.pop(key, None)
+            self._pending[key] = value
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            else:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_periodically, daemon=True,
+                                                     name="{} flusher".format(self._name))
+                    self._flusher.start()
+                self._wakeup.set()
+
+    def _flush_periodically(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Collect writes within the interval into one batch.
+            if self._stop.wait(self.flush_interval):
+                break
+            with self._lock:
+                if self._closed:
+                    break
+                self.flush()
+
+    def _commit(self, pending: Dict[Any, Any]):
+        raise NotImplementedError()
+
+    def flush(self):
+        """Commit pending writes to the database."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending = self._pending
+            self._pending = dict()
+            with self._db:
+                self._commit(pending)
+
+    def close(self):
+        """Commit pending writes and close the database."""
+        with self._lock:
+            if self._closed:
+                return
+            self.flush()
+            self._closed = True
+            self._stop.set()
+            self._wakeup.set()
+            self._db.close()
+
+
+class MessageStore(_BatchedStore):
+    """
+    A persistent store of messages, indexed by
+    ``(module_id, chat_uid, message_uid)``.
+
+    Writes are kept in memory and committed in batches, when
+    ``batch_size`` writes are pending, or ``flush_interval`` seconds after
+    the first pending write. Pending writes are visible to reads
+    immediately. The database is opened in WAL mode, so that reads are not
+    blocked by writes from other connections.
+
+    When there are more than ``max_messages`` messages stored, the messages
+    least recently written are pruned.
+
+    Messages are stored as when they are recorded, including the path to
+    the media file if any, but not the file itself. Channels that need the
+    file of a stored message SHOULD keep it in the :class:`.MediaStore`.
+
+    Attributes:
+        path (pathlib.Path): Path to the database.
+        max_messages (int): Maximum number of messages stored, ``0`` for unlimited.
+        batch_size (int): Number of pending writes to commit at once.
+        flush_interval (float): Number of seconds a write is kept pending at most.
+    """
+
+    _name = "Message store"
+
+    def __init__(self, path: Path, max_messages: int = 100000, batch_size: int = 256,
+                 flush_interval: float = 1.0):
+        """
+        Args:
+            path: Path to the database, created if not existing.
+            max_messages: Maximum number of messages stored, ``0`` for unlimited.
+            batch_size: Number of pending writes to commit at once.
+            flush_interval: Number of seconds a write is kept pending at most.
+        """
+        super().__init__(path, batch_size, flush_interval)
+        self.max_messages: int = max_messages
+        self._db.execute("CREATE TABLE IF NOT EXISTS messages ("
+                         "module_id TEXT NOT NULL, chat_uid TEXT NOT NULL, uid TEXT NOT NULL, "
+                         "data BLOB NOT NULL, PRIMARY KEY (module_id, chat_uid, uid))")
+        self._db.commit()
+        # Number of rows, over-estimated by writes replacing existing rows.
+        self._count: int = self._db.execute("SELECT count(*) FROM messages").fetchone()[0]
+
+    @staticmethod
+    def _key(msg: 'Message') -> _Key:
+        return msg.chat.module_id, msg.chat.uid, msg.uid  # type: ignore
+
+    def record(self, msg: 'Message'):
+        """
+        Record a message, replacing the one recorded with the same
+        chat and ID if any, e.g. when the message is edited.
+
+        The message is serialized when recorded, later changes to the
+        object are not stored.
+
+        Args:
+            msg: The message to record. It MUST have a chat and an ID.
+        """
+        if msg.uid is None:
+            raise ValueError("Message without ID cannot be recorded.")
+        from . import serialization
+        self._write(self._key(msg), serialization.dumps(msg))
+
+    def remove(self, module_id: ModuleID, chat_uid: ChatID, uid: MessageID):
+        """
+        Remove a message recorded, if any.
+
+        Args:
+            module_id: Module ID of the chat of the message.
+            chat_uid: ID of the chat of the message.
+            uid: ID of the message.
+        """
+        self._write((module_id, chat_uid, uid), None)
+
+    def get(self, module_id: ModuleID, chat_uid: ChatID, uid: MessageID) -> Optional['Message']:
+        """
+        Get a message recorded.
+
+        Args:
+            module_id: Module ID of the chat of the message.
+            chat_uid: ID of the chat of the message.
+            uid: ID of the message.
+
+        Returns:
+            A new object of the message, ``None`` if not found.
+        """
+        key = (module_id, chat_uid, uid)
+        with self._lock:
+            if key in self._pending:
+                data = self._pending[key]
+            else:
+                row = self._db.execute("SELECT data FROM messages WHERE module_id = ? AND chat_uid = ? AND uid = ?",
+                                       key).fetchone()
+                data = row[0] if row is not None else None
+        if data is None:
+            return None
+        from . import serialization
+        return cast('Message', serialization.loads(data))
+
+    def __contains__(self, key: _Key) -> bool:
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key] is not None
+            return self._db.execute("SELECT 1 FROM messages WHERE module_id = ? AND chat_uid = ? AND uid = ?",
+                                    key).fetchone() is not None
+
+    def __len__(self) -> int:
+        """Number of messages stored, including pending writes."""
+        with self._lock:
+            self.flush()
+            return self._db.execute("SELECT count(*) FROM messages").fetchone()[0]
+
+    def _commit(self, pending: Dict[_Key, Optional[bytes]]):
+        removed = [k for k, v in pending.items() if v is None]
+        written = [(*k, v) for k, v in pending.items() if v is not None]
+        if removed:
+            self._db.executemany("DELETE FROM messages WHERE module_id = ? AND chat_uid = ? AND uid = ?",
+                                 removed)
+        if written:
+            # Replaced rows get new row IDs, which keeps row IDs in the order of writes.
+            self._db.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)", written)
+        self._count += len(written)
+
+    def flush(self):
+        """Commit pending writes to the database."""
+        with self._lock:
+            super().flush()
+            if self.max_messages and self._count > self.max_messages:
+                self.prune()
+
+    def prune(self):
+        """Remove messages least recently written beyond :attr:`max_messages`."""
+        with self._lock:
+            count = self._db.execute("SELECT count(*) FROM messages").fetchone()[0]
+            if self.max_messages and count > self.max_messages:
+                with self._db:
+                    self._db.execute("DELETE FROM messages WHERE rowid IN "
+                                     "(SELECT rowid FROM messages ORDER BY rowid LIMIT ?)",
+                                     (count - self.max_messages,))
+                self.logger.debug("Pruned %s messages from the message store.", count - self.max_messages)
+                count = self.max_messages
+            self._count = count
+
+
+class MessageIDMap(_BatchedStore):
+    """
+    A persistent bidirectional map between IDs of messages known to the
+    master channel and to slave channels, within each chat.
+
+    Message IDs in :class:`.Message` are IDs from the slave channel, but a
+    slave channel MAY change the ID of a message delivered to it, even when
+    the message is edited. The coordinator adds the IDs before and after
+    the delivery to this map, so that the master channel can find the
+    message in the slave channel by the ID it knows for edits, replies,
+    removals and reactions, and vice versa.
+
+    All entries are kept in memory for constant-time lookups in both
+    directions. Writes to the database are committed in batches in the
+    same way as :class:`MessageStore`. Entries are discarded when not used
+    for ``max_age`` seconds, or the least recently used first when there
+    are more than ``max_size`` of them. Lookups only update the time of use
+    in memory, which is written to the database along with the next batch
+    of writes.
+
+    Attributes:
+        path (pathlib.Path): Path to the database.
+        max_size (int): Maximum number of entries, ``0`` for unlimited.
+        max_age (Optional[float]): Number of seconds an entry is kept since
+            its last use, ``None`` for no limit.
+        batch_size (int): Number of pending writes to commit at once.
+        flush_interval (float): Number of seconds a write is kept pending at most.
+    """
+
+    _name = "Message ID map"
+
+    def __init__(self, path: Path, max_size: int = 100000, max_age: Optional[float] = 30 * 24 * 60 * 60,
+                 batch_size: int = 256, flush_interval: float = 1.0):
+        """
+        Args:
+            path: Path to the database, created if not existing.
+            max_size: Maximum number of entries, ``0`` for unlimited.
+            max_age: Number of seconds an entry is kept since its last use,
+                ``None`` for no limit.
+            batch_size: Number of pending writes to commit at once.
+            flush_interval: Number of seconds a write is kept pending at most.
+        """
+        super().__init__(path, batch_size, flush_interval)
+        self.max_size: int = max_size
+        self.max_age: Optional[float] = max_age
+        self._db.execute("CREATE TABLE IF NOT EXISTS message_ids ("
+                         "module_id TEXT NOT NULL, chat_uid TEXT NOT NULL, master_uid TEXT NOT NULL, "
+                         "slave_uid TEXT NOT NULL, used REAL NOT NULL, "
+                         "PRIMARY KEY (module_id, chat_uid, master_uid))")
+        self._db.commit()
+        # Master key -> (slave ID, time of last use), in the order of last use.
+        self._by_master: 'OrderedDict[_Key, Tuple[MessageID, float]]' = OrderedDict()
+        # Slave key -> master ID
+        self._by_slave: Dict[_Key, MessageID] = dict()
+        # Master keys looked up since the last flush, with their time of use not written yet.
+        self._used: Set[_Key] = set()
+        self._load()
+
+    def _load(self):
+        for module_id, chat_uid, master_uid, slave_uid, used in \
+                self._db.execute("SELECT * FROM message_ids ORDER BY used"):
+            self._set(module_id, chat_uid, master_uid, slave_uid, used)
+        # Drop entries beyond the limits of this instance.
+        self.evict()
+
+    def __len__(self) -> int:
+        """Number of entries."""
+        return len(self._by_master)
+
+    def _set(self, module_id: ModuleID, chat_uid: ChatID, master_uid: MessageID, slave_uid: MessageID,
+             used: float):
+        self._by_master[(module_id, chat_uid, master_uid)] = (slave_uid, used)
+        self._by_slave[(module_id, chat_uid, slave_uid)] = master_uid
+
+    def _discard(self, module_id: ModuleID, chat_uid: ChatID, master_uid: MessageID):
+        self._used.discard((module_id, chat_uid, master_uid))
+        entry = self._by_master.pop((module_id, chat_uid, master_uid), None)
+        if entry is not None:
+            self._by_slave.pop((module_id, chat_uid, entry[0]), None)
+            self._write((module_id, chat_uid, master_uid), None)
+
+    def add(self, module_id: ModuleID, chat_uid: ChatID, master_uid: MessageID, slave_uid: MessageID):
+        """
+        Map the ID of a message known to the master channel to the ID in
+        the slave channel, replacing entries of either ID.
+
+        Args:
+            module_id: Module ID of the chat of the message.
+            chat_uid: ID of the chat of the message.
+            master_uid: ID of the message known to the master channel.
+            slave_uid: ID of the message in the slave channel.
+        """
+        with self._lock:
+            self._discard(module_id, chat_uid, master_uid)
+            previous = self._by_slave.get((module_id, chat_uid, slave_uid))
+            if previous is not None:
+                self._discard(module_id, chat_uid, previous)
+            used = time.time()
+            self._set(module_id, chat_uid, master_uid, slave_uid, used)
+            self._write((module_id, chat_uid, master_uid), (slave_uid, used))
+            self.evict()
+
+    def remove(self, module_id: ModuleID, chat_uid: ChatID, slave_uid: MessageID):
+        """
+        Remove the entry of a message, if any.
+
+        Args:
+            module_id: Module ID of the chat of the message.
+            chat_uid: ID of the chat of the message.
+            slave_uid: ID of the message in the slave channel.
+        """
+        with self._lock:
+            master_uid = self._by_slave.get((module_id, chat_uid, slave_uid))
+            if master_uid is not None:
+                self._discard(module_id, chat_uid, master_uid)
+
+    def get_slave_id(self, module_id: ModuleID, chat_uid: ChatID, master_uid: MessageID) -> Optional[MessageID]:
+        """
+        Get the ID in the slave channel of a message.
+
+        Args:
+            module_id: Module ID of the chat of the message.
+            chat_uid: ID of the chat of the message.
+            master_uid: ID of the message known to the master channel.
+
+        Returns:
+            The ID in the slave channel, ``None`` if not found.
+        """
+        with self._lock:
+            return self._use((module_id, chat_uid, master_uid))
+
+    def get_master_id(self, module_id: ModuleID, chat_uid: ChatID, slave_uid: MessageID) -> Optional[MessageID]:
+        """
+        Get the ID known to the master channel of a message.
+
+        Args:
+            module_id: Module ID of the chat of the message.
+            chat_uid: ID of the chat of the message.
+            slave_uid: ID of the message in the slave channel.
+
+        Returns:
+            The ID known to the master channel, ``None`` if not found.
+        """
+        with self._lock:
+            master_uid = self._by_slave.get((module_id, chat_uid, slave_uid))
+            if master_uid is None:
+                return None
+            return master_uid if self._use((module_id, chat_uid, master_uid)) is not None else None
+
+    def _use(self, key: _Key) -> Optional[MessageID]:
+        """Look up the slave ID of a master key, and refresh its time of use in memory."""
+        entry = self._by_master.get(key)
+        if entry is None or self._expired(entry[1]):
+            return None
+        self._by_master.move_to_end(key)
+        self._by_master[key] = (entry[0], time.time())
+        self._used.add(key)
+        return entry[0]
+
+    def _expired(self, used: float) -> bool:
+        return self.max_age is not None and used < time.time() - self.max_age
+
+    def evict(self):
+        """Discard entries expired or beyond :attr:`max_size`."""
+        with self._lock:
+            while self._by_master:
+                key, (_, used) = next(iter(self._by_master.items()))
+                if not (self.max_size and len(self._by_master) > self.max_size) and not self._expired(used):
+                    break
+                self._discard(*key)
+
+    def flush(self):
+        """Commit pending writes, and times of use of entries looked up, to the database."""
+        with self._lock:
+            if not self._closed:
+                for key in self._used:
+                    self._pending[key] = self._by_master[key]
+                self._used.clear()
+            super().flush()
+
+    def _commit(self, pending: Dict[_Key, Optional[Tuple[MessageID, float]]]):
+        removed = [k for k, v in pending.items() if v is None]
+        written = [(*k, *v) for k, v in pending.items() if v is not None]
+        if removed:
+            self._db.executemany("DELETE FROM message_ids WHERE module_id = ? AND chat_uid = ? AND master_uid = ?",
+                                 removed)
+        if written:
+            self._db.executemany("INSERT OR REPLACE INTO message_ids VALUES (?, ?, ?, ?, ?)", written)
@@ -1,10 +1,14 @@
 # coding=utf-8
 
 import logging
+import operator
 import os
 import pydoc
+from collections import deque
+from contextlib import suppress
+from itertools import repeat
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Callable, Optional, Tuple, List, Dict, Any
 
 import pkg_resources
 
@@ -147,6 +151,75 @@ def locate_module(module_id: ModuleID, module_type: str = None):
     return pydoc.locate(module_id)
 
 
+_slot_names: Dict[type, Tuple[str, ...]] = dict()
+_slot_getters: Dict[type, Tuple[Tuple[str, ...], Callable[[Any], Tuple[Any, ...]]]] = dict()
+
+
+def _get_slot_names(cls: type) -> Tuple[str, ...]:
+    """Names of all ``__slots__`` declared in a class and its base classes."""
+    if cls in _slot_names:
+        return _slot_names[cls]
+    names: List[str] = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for name in slots:
+            if name not in ('__dict__', '__weakref__') and name not in names:
+                names.append(name)
+    result = _slot_names[cls] = tuple(names)
+    return result
+
+
+def _get_slot_getter(cls: type) -> Tuple[Tuple[str, ...], Callable[[Any], Tuple[Any, ...]]]:
+    """Names of all ``__slots__`` of a class, and a getter of all of them at once."""
+    if cls in _slot_getters:
+        return _slot_getters[cls]
+    names = _get_slot_names(cls)
+    getter: Callable[[Any], Tuple[Any, ...]]
+    if len(names) > 1:
+        getter = operator.attrgetter(*names)
+    elif names:
+        single = operator.attrgetter(names[0])
+        getter = lambda obj: (single(obj),)  # noqa: E731
+    else:
+        getter = lambda obj: ()  # noqa: E731
+    result = _slot_getters[cls] = (names, getter)
+    return result
+
+
+def _get_slots_state(obj: Any) -> Dict[str, Any]:
+    """Collect attributes of an object with ``__slots__`` into a dict,
+    in the same format as its ``__dict__`` would be without slots.
+    """
+    names, getter = _get_slot_getter(type(obj))
+    try:
+        state = dict(zip(names, getter(obj)))
+    except AttributeError:
+        # Some slots are not assigned, collect the rest one by one.
+        state = dict()
+        for name in names:
+            with suppress(AttributeError):
+                state[name] = getattr(obj, name)
+    # Attributes of subclasses without ``__slots__``
+    state.update(getattr(obj, '__dict__', ()))
+    return state
+
+
+def _set_slots_state(obj: Any, state: Dict[str, Any]):
+    """Restore attributes from a state given by :func:`_get_slots_state`,
+    or from a ``__dict__`` pickled before ``__slots__`` are introduced.
+    """
+    try:
+        # Assign all attributes without a loop in Python.
+        deque(map(object.__setattr__, repeat(obj), state.keys(), state.values()), maxlen=0)
+    except AttributeError:
+        for name, value in state.items():
+            # Attributes no longer defined are dropped.
+            with suppress(AttributeError):
+                object.__setattr__(obj, name, value)
+
+
 class LogLevelFilter:
     def __init__(self, min_level=float('-inf'), max_level=float('inf')):
         self.min_level = min_level
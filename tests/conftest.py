@@ -37,9 +37,20 @@ def coord(tmp_path_factory):
 
     yield coordinator
 
+    coordinator.stop_dispatch()
+    if coordinator.message_store is not None:
+        coordinator.message_store.close()
+        coordinator.message_store = None
+    if coordinator.message_id_map is not None:
+        coordinator.message_id_map.close()
+        coordinator.message_id_map = None
+    coordinator.dead_letter_queue = None
+
     coordinator.master = None
     coordinator.slaves = {}
     coordinator.middlewares = []
+    coordinator.modules = {}
+    coordinator.chats.clear()
     coordinator.master_thread = None
     coordinator.slave_threads = {}
 
@@ -67,6 +67,10 @@ class MockSlaveChannel(SlaveChannel):
         if chat.uid in self.__picture_dict:
             return open('tests/mocks/' + self.__picture_dict[chat.uid], 'rb')
 
+    def get_chat_member_picture(self, chat_member):
+        if chat_member.uid in self.__picture_dict:
+            return open('tests/mocks/' + self.__picture_dict[chat_member.uid], 'rb')
+
     def get_message_by_id(self, chat: Chat, msg_id: MessageID) -> Optional['Message']:
         pass
 
@@ -0,0 +1,150 @@
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from ehforwarderbot.cache import ChatCache, PictureCache
+from ehforwarderbot.exceptions import EFBChatNotFound
+from ehforwarderbot.status import ChatUpdates, MemberUpdates
+
+
+@pytest.fixture()
+def cache(slave_channel):
+    cache = ChatCache(slave_channel, ttl=60, max_size=2)
+    cache.install()
+    yield cache
+    cache.uninstall()
+
+
+def test_get_chat(cache, slave_channel):
+    get_chat = mock.Mock(wraps=cache._originals["get_chat"])
+    with mock.patch.dict(cache._originals, get_chat=get_chat):
+        assert slave_channel.get_chat("alice") is slave_channel.alice
+        assert slave_channel.get_chat("alice") is slave_channel.alice
+        get_chat.assert_called_once_with("alice")
+    assert (cache.hits, cache.misses) == (1, 1)
+    with pytest.raises(EFBChatNotFound):
+        slave_channel.get_chat("__nonexistent_chat__")
+    assert len(cache) == 1
+
+
+def test_expiry(cache, slave_channel):
+    slave_channel.get_chat("alice")
+    with mock.patch("time.monotonic", return_value=float("inf")):
+        slave_channel.get_chat("alice")
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_eviction(cache, slave_channel):
+    slave_channel.get_chat("alice")
+    slave_channel.get_chat("bob")
+    slave_channel.get_chat("alice")
+    slave_channel.get_chat("wonderland001")
+    assert len(cache) == 2
+    slave_channel.get_chat("alice")
+    slave_channel.get_chat("bob")
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_get_chats(cache, slave_channel):
+    chats = slave_channel.get_chats()
+    assert list(chats) == slave_channel.chats
+    assert list(slave_channel.get_chats()) == slave_channel.chats
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.invalidate_list()
+    slave_channel.get_chats()
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_uninstall(slave_channel):
+    cache = ChatCache(slave_channel)
+    cache.install()
+    cache.uninstall()
+    assert "get_chat" not in vars(slave_channel)
+    assert "get_chats" not in vars(slave_channel)
+
+
+def test_invalidate_by_status(coord, cache, slave_channel):
+    coord.chat_caches[slave_channel.channel_id] = cache
+    try:
+        slave_channel.get_chat("alice")
+        slave_channel.get_chat("wonderland001")
+        coord.send_status(ChatUpdates(slave_channel, modified_chats=["alice"]))
+        coord.send_status(MemberUpdates(slave_channel, "wonderland001", new_members=["bob"]))
+        assert len(cache) == 0
+    finally:
+        del coord.chat_caches[slave_channel.channel_id]
+
+
+@pytest.fixture()
+def picture_cache(slave_channel, tmp_path):
+    cache = PictureCache(slave_channel, path=tmp_path)
+    cache.install()
+    yield cache
+    cache.uninstall()
+
+
+def test_picture_cache_version(picture_cache, slave_channel):
+    with mock.patch.object(slave_channel, "get_chat_picture_version", return_value="v1"):
+        with slave_channel.get_chat_picture(slave_channel.alice) as f:
+            content = f.read()
+        with slave_channel.get_chat_picture(slave_channel.alice) as f:
+            assert f.name.endswith(".png")
+            assert f.read() == content
+        assert (picture_cache.hits, picture_cache.misses) == (1, 1)
+    with mock.patch.object(slave_channel, "get_chat_picture_version", return_value="v2"):
+        slave_channel.get_chat_picture(slave_channel.alice).close()
+    assert (picture_cache.hits, picture_cache.misses) == (1, 2)
+
+
+def test_picture_cache_no_version(picture_cache, slave_channel):
+    slave_channel.get_chat_picture(slave_channel.alice).close()
+    slave_channel.get_chat_picture(slave_channel.alice).close()
+    assert (picture_cache.hits, picture_cache.misses) == (0, 2)
+    picture_cache.ttl = 60
+    slave_channel.get_chat_picture(slave_channel.alice).close()
+    assert (picture_cache.hits, picture_cache.misses) == (1, 2)
+
+
+def test_picture_cache_persistence(picture_cache, slave_channel, tmp_path):
+    member = slave_channel.wonderland.get_member("bob")
+    with mock.patch.object(slave_channel, "get_chat_picture_version", return_value="v1"):
+        slave_channel.get_chat_member_picture(member).close()
+        slave_channel.get_chat_picture(slave_channel.bob).close()
+        assert len(picture_cache) == 2
+        # Same picture is stored once.
+        assert picture_cache.size == Path("tests/mocks/B.png").stat().st_size
+        picture_cache.save()
+        cache = PictureCache(slave_channel, path=tmp_path)
+        cache.get_chat_member_picture(member).close()
+        assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_picture_cache_eviction(picture_cache, slave_channel):
+    picture_cache.max_size = 1
+    with mock.patch.object(slave_channel, "get_chat_picture_version", return_value="v1"):
+        slave_channel.get_chat_picture(slave_channel.alice).close()
+    assert len(picture_cache) == 0
+    assert picture_cache.size == 0
+    picture_cache.save()
+    assert [i.name for i in picture_cache.path.iterdir()] == [PictureCache.INDEX_NAME]
+
+
+def test_picture_cache_batch_save(slave_channel, tmp_path):
+    cache = PictureCache(slave_channel, path=tmp_path, batch_size=2)
+    cache.install()
+    index = tmp_path / PictureCache.INDEX_NAME
+    try:
+        with mock.patch.object(slave_channel, "get_chat_picture_version", return_value="v1"):
+            slave_channel.get_chat_picture(slave_channel.alice).close()
+            assert not index.exists()
+            slave_channel.get_chat_picture(slave_channel.bob).close()
+            assert index.exists()
+            slave_channel.get_chat_picture(slave_channel.wonderland).close()
+            # Pictures not in the saved index are discarded on load.
+            assert len(PictureCache(slave_channel, path=tmp_path)) == 2
+            # Retrieved again as the discarded picture is missing.
+            slave_channel.get_chat_picture(slave_channel.wonderland).close()
+    finally:
+        cache.uninstall()
+    assert len(PictureCache(slave_channel, path=tmp_path)) == 3
@@ -1,3 +1,6 @@
+from ehforwarderbot.chat import GroupChat
+
+
 def test_get_extra_functions(slave_channel):
     extras = slave_channel.get_extra_functions()
     assert len(extras) == 3
@@ -13,3 +16,11 @@ def test_set_extra_function(slave_channel):
     assert len(slave_channel.function_a.name) > 0
     assert len(slave_channel.function_a.desc) > 0
     assert "{function_name}" in slave_channel.function_a.desc
+
+
+def test_iter_chats(slave_channel):
+    assert list(slave_channel.iter_chats()) == list(slave_channel.get_chats())
+    assert list(slave_channel.iter_chats(offset=1, limit=1)) == [slave_channel.bob]
+    assert list(slave_channel.iter_chats(limit=0)) == []
+    groups = slave_channel.iter_chats(filter=lambda chat: isinstance(chat, GroupChat))
+    assert list(groups) == [slave_channel.wonderland]
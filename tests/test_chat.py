@@ -1,10 +1,14 @@
 import pickle
+import threading
 
 import pytest
 from typing import Type
+from unittest.mock import patch
 
 from ehforwarderbot import Chat
-from ehforwarderbot.chat import PrivateChat, SelfChatMember, SystemChat, GroupChat, ChatMember, SystemChatMember
+from ehforwarderbot.chat import PrivateChat, SelfChatMember, SystemChat, GroupChat, ChatMember, SystemChatMember, \
+    ChatMembers, identity_pickling
+from ehforwarderbot.exceptions import EFBChannelNotFound, EFBChatNotFound
 
 
 def test_generate_with_channel(slave_channel):
@@ -136,3 +140,352 @@ def test_add_system_member(slave_channel):
     assert member.uid == "__member_id__"
     assert member.chat is chat
     assert member in chat.members
+
+
+def test_verify_cached(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    chat.add_member(name="__member_name__", uid="__member_id__")
+    chat.verify()
+    assert chat._is_verified()
+    chat.members.append("__not_a_member__")
+    assert not chat._is_verified()
+    with pytest.raises(AssertionError):
+        chat.verify()
+    chat.members.pop()
+    chat.verify()
+    chat.name = None
+    with pytest.raises(AssertionError):
+        chat.verify()
+
+
+def test_verify_member_cached(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    member = chat.add_member(name="__member_name__", uid="__member_id__")
+    member.verify()
+    assert member._is_verified()
+    member.uid = ""
+    assert not member._is_verified()
+    with pytest.raises(AssertionError):
+        member.verify()
+
+
+def test_get_member(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    member = chat.add_member(name="__member_name__", uid="__member_id__")
+    assert isinstance(chat.members, ChatMembers)
+    assert chat.get_member("__member_id__") is member
+    assert chat.get_member(SelfChatMember.SELF_ID) is chat.self
+    with pytest.raises(KeyError):
+        chat.get_member("__non_existing_id__")
+
+
+def test_get_member_updated_uid(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    member = chat.add_member(name="__member_name__", uid="__member_id__")
+    assert chat.get_member("__member_id__") is member
+    member.uid = "__new_member_id__"
+    assert chat.get_member("__new_member_id__") is member
+    with pytest.raises(KeyError):
+        chat.get_member("__member_id__")
+    chat.self.uid = "__self_id__"
+    assert chat.get_member("__self_id__") is chat.self
+
+
+def test_members_mutation(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    member = chat.add_member(name="__member_name__", uid="__member_id__")
+    chat.members.remove(member)
+    with pytest.raises(KeyError):
+        chat.get_member("__member_id__")
+    del chat.members[0]
+    assert not chat.has_self
+    chat.members = [member]
+    assert isinstance(chat.members, ChatMembers)
+    assert chat.get_member("__member_id__") is member
+    assert chat.members == [member]
+
+
+def test_pickle_members(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    chat.add_member(name="__member_name__", uid="__member_id__")
+    chat_dup = pickle.loads(pickle.dumps(chat))
+    assert isinstance(chat_dup.members, ChatMembers)
+    assert chat_dup.has_self
+    assert chat_dup.get_member("__member_id__").chat is chat_dup
+    assert chat_dup.members == chat.members
+
+
+def test_identity_pickling(coord, slave_channel):
+    group = slave_channel.wonderland
+    carol = group.get_member("carol")
+    full = pickle.dumps(carol)
+    with identity_pickling():
+        data = pickle.dumps([group, carol, group.self])
+    chat, member, self_member = pickle.loads(data)
+    # Resolved through the slave channel.
+    assert chat is group
+    assert member is carol
+    assert self_member is group.self
+    # Pickled as usual outside of the context.
+    assert pickle.loads(full) is not carol
+
+
+def test_identity_pickling_size(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    chat.add_members({"name": f"Member {i}", "uid": f"member{i}"} for i in range(50))
+    member = chat.get_member("member0")
+    with identity_pickling():
+        size = len(pickle.dumps(member))
+    assert size * 10 < len(pickle.dumps(member))
+
+
+def test_identity_pickling_unknown_chat(coord, slave_channel, middleware):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    chat.self.uid = "__self_id__"
+    chat.vendor_specific["key"] = "value"
+    chat.add_member(name="__member_1__", uid="__member_id_1__")
+    member = chat.add_member(name="__member_2__", uid="__member_id_2__", middleware=middleware)
+    with identity_pickling():
+        chat_dup, member_dup = pickle.loads(pickle.dumps([chat, member]))
+    assert chat_dup is not chat and chat_dup == chat
+    assert (chat_dup.name, chat_dup.vendor_specific) == ("__name__", {"key": "value"})
+    assert chat_dup.self.uid == "__self_id__"
+    # Only members pickled are restored.
+    assert [i.uid for i in chat_dup.members] == ["__self_id__", "__member_id_2__"]
+    assert member_dup.chat is chat_dup
+    assert member_dup.module_id == middleware.middleware_id
+    chat_dup.verify()
+
+
+def test_unpickle_members_list(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    member = chat.add_member(name="__member_name__", uid="__member_id__")
+    state = chat.__getstate__()
+    state['members'] = list(state.pop('_members'))
+    chat_dup = GroupChat.__new__(GroupChat)
+    chat_dup.__setstate__(state)
+    assert chat_dup.get_member("__member_id__") is member
+
+
+def test_unpickle_member_dict(slave_channel):
+    # Members pickled before ``__slots__`` are introduced
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    state = dict(module_name=chat.module_name, channel_emoji=chat.channel_emoji,
+                 module_id=chat.module_id, name="__member_name__", alias=None,
+                 uid="__member_id__", vendor_specific={"key": "value"},
+                 description="", chat=chat, _verified=None)
+    member = ChatMember.__new__(ChatMember)
+    member.__setstate__(state.copy())
+    member.verify()
+    assert member.vendor_specific == {"key": "value"}
+    assert member.module is chat.module
+    for key in ("module_id", "module_name", "channel_emoji", "name", "uid", "chat"):
+        assert getattr(member, key) == state[key]
+
+
+def test_copy_vendor_specific(slave_channel):
+    chat = PrivateChat(channel=slave_channel, uid="__id__")
+    chat.vendor_specific["key"] = "value"
+    chat_dup = chat.copy()
+    assert chat_dup.vendor_specific is chat.vendor_specific
+    chat_dup.other.extra = "value"
+    assert chat_dup.other.extra == "value"
+
+
+def test_module_descriptor(slave_channel, middleware):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    member = chat.add_member(name="__member_name__", uid="__member_id__")
+    system = chat.add_system_member(middleware=middleware)
+    assert member.module is chat.module
+    assert system.module_id == middleware.middleware_id
+    assert system.channel_emoji == ""
+
+    member.module_name = "__module_name__"
+    assert member.module is not chat.module
+    assert member.module_id == chat.module_id
+    assert chat.module_name == slave_channel.channel_name
+    with pytest.raises(AttributeError):
+        chat.module.module_id = "__module_id__"
+
+
+def test_pickle_module_descriptor(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    chat.add_members({"name": f"__member_{i}__", "uid": f"__member_{i}__"} for i in range(10))
+    chat_dup = pickle.loads(pickle.dumps(chat))
+    assert chat_dup.module is chat.module
+    assert all(i.module is chat.module for i in chat_dup.members)
+
+
+def test_add_members(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    existing = chat.add_member(name="__member_name__", uid="__member_0__")
+    member = ChatMember(chat, name="__member_name__", uid="__member_2__")
+    result = chat.add_members([
+        {"name": "__member_name__", "uid": "__member_0__"},
+        {"name": "__member_name__", "uid": "__member_1__", "alias": "__alias__"},
+        member,
+        {"name": "__member_name__", "uid": "__member_1__"},
+    ])
+    assert result[0] is existing
+    assert result[1].alias == "__alias__"
+    assert result[2] is member
+    assert result[3] is result[1]
+    assert len(chat.members) == 4
+    assert chat.get_member("__member_1__") is result[1]
+
+
+def test_add_members_index(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__", with_self=False)
+    existing = chat.add_member(name="__member_name__", uid="__member_0__")
+    # ID changed without notifying the index.
+    object.__setattr__(existing, "chat", None)
+    existing.uid = "__member_1__"
+    existing.chat = chat
+    self_member = SelfChatMember(chat)
+    result = chat.add_members([
+        {"name": "__member_name__", "uid": "__member_0__"},
+        {"name": "__member_name__", "uid": "__member_1__"},
+        self_member,
+    ])
+    assert result[0] is not existing
+    assert result[1] is existing
+    assert chat.get_member("__member_0__") is result[0]
+    assert chat.has_self
+    assert chat.members.self_member is self_member
+
+
+def test_replace_members(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__")
+    kept = chat.add_member(name="__member_name__", uid="__member_0__")
+    chat.add_member(name="__member_name__", uid="__member_1__")
+    result = chat.replace_members([
+        {"name": "__new_name__", "uid": "__member_0__"},
+        {"name": "__member_name__", "uid": "__member_2__"},
+    ])
+    assert result[0] is kept
+    assert kept.name == "__new_name__"
+    assert chat.has_self
+    assert [i.uid for i in chat.members] == [SelfChatMember.SELF_ID, "__member_0__", "__member_2__"]
+    with pytest.raises(KeyError):
+        chat.get_member("__member_1__")
+
+
+def test_member_loader(slave_channel):
+    calls = []
+
+    def loader(chat):
+        calls.append(chat)
+        return [{"name": "__member_name__", "uid": "__member_0__"},
+                {"name": "__member_name__", "uid": "__member_1__"}]
+
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__", member_loader=loader)
+    assert chat.has_self
+    assert not chat.members_loaded
+    assert chat.get_member(SelfChatMember.SELF_ID) is chat.self
+    assert not calls
+    member = chat.get_member("__member_1__")
+    assert member.chat is chat
+    assert calls == [chat]
+    assert chat.members_loaded
+    assert len(chat.members) == 3
+    assert len(calls) == 1
+
+
+def test_member_loader_failure(slave_channel):
+    def loader(chat):
+        raise ConnectionError()
+
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__", member_loader=loader)
+    with pytest.raises(ConnectionError):
+        chat.load_members()
+    assert not chat.members_loaded
+
+
+def test_member_loader_concurrent(slave_channel):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader(chat):
+        calls.append(chat)
+        yield {"name": "__member_name__", "uid": "__member_0__"}
+        started.set()
+        release.wait(timeout=5)
+        yield {"name": "__member_name__", "uid": "__member_1__"}
+
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__", member_loader=loader)
+    loading = threading.Thread(target=chat.load_members)
+    loading.start()
+    assert started.wait(timeout=5)
+    sizes = []
+    reader = threading.Thread(target=lambda: sizes.append(len(chat.members)))
+    reader.start()
+    # Readers wait for the whole roster instead of seeing a partial one.
+    reader.join(timeout=0.1)
+    assert reader.is_alive()
+    assert not chat.members_loaded
+    release.set()
+    loading.join(timeout=5)
+    reader.join(timeout=5)
+    assert sizes == [3]
+    assert len(calls) == 1
+
+
+def test_member_loader_retry(slave_channel):
+    results = [ConnectionError(), [{"name": "__member_name__", "uid": "__member_0__"}]]
+
+    def loader(chat):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__", member_loader=loader)
+    with pytest.raises(ConnectionError):
+        chat.load_members()
+    assert not chat.members_loaded
+    assert chat.get_member("__member_0__").uid == "__member_0__"
+    assert chat.members_loaded
+
+
+def test_pickle_member_loader(slave_channel):
+    origin = slave_channel.get_chat("wonderland001")
+    chat = GroupChat(channel=slave_channel, name=origin.name, uid=origin.uid,
+                     member_loader=lambda c: [])
+    assert not chat.copy().members_loaded
+    chat_dup = pickle.loads(pickle.dumps(chat))
+    assert not chat_dup.members_loaded
+    assert [i.uid for i in chat_dup.members] == [i.uid for i in origin.members]
+    assert all(i.chat is chat_dup for i in chat_dup.members)
+
+
+@pytest.mark.parametrize("error", [NameError, EFBChannelNotFound, EFBChatNotFound])
+def test_pickle_member_loader_module_unavailable(slave_channel, error):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__id__",
+                     member_loader=lambda c: [])
+    chat.add_member(name="__member__", uid="__member__")
+    data = pickle.dumps(chat)
+    with patch("ehforwarderbot.coordinator.get_module_by_id", side_effect=error()):
+        chat_dup = pickle.loads(data)
+        assert [i.uid for i in chat_dup.members if not isinstance(i, SelfChatMember)] == ["__member__"]
+        with pytest.raises(KeyError):
+            chat_dup.get_member("__unknown__")
+    assert chat_dup.members_loaded
+
+
+def test_pickle_member_loader_chat_not_found(slave_channel):
+    chat = GroupChat(channel=slave_channel, name="__name__", uid="__unknown_chat__",
+                     member_loader=lambda c: [])
+    chat.add_member(name="__member__", uid="__member__")
+    chat_dup = pickle.loads(pickle.dumps(chat))
+    assert [i.uid for i in chat_dup.members if not isinstance(i, SelfChatMember)] == ["__member__"]
+
+
+def test_hash(slave_channel):
+    chat = PrivateChat(channel=slave_channel, name="__name__", uid="__id__")
+    chat_dup = chat.copy()
+    chat_dup.name = "__another_name__"
+    assert len({chat, chat_dup}) == 1
+    members = {chat.other: 1, chat_dup.other: 2}
+    assert members[chat.other] == 2
+    assert len({chat.other, chat.self}) == 2
@@ -1,5 +1,17 @@
+import gc
+import threading
+from unittest import mock
+
 import pytest
 
+from ehforwarderbot import Message, MsgType
+from ehforwarderbot.message import LinkAttribute
+from ehforwarderbot.chat import PrivateChat
+from ehforwarderbot.exceptions import EFBChannelNotFound, EFBChatNotFound
+from ehforwarderbot.status import ChatUpdates
+from .mocks.middleware import MockMiddleware
+from .mocks.slave import MockSlaveChannel
+
 
 def test_matching_keys(coord):
     assert coord.slaves.keys() == coord.slave_threads.keys()
@@ -11,3 +23,216 @@ def test_get_module_by_id(coord, master_channel, slave_channel, middleware):
     assert coord.get_module_by_id(middleware.middleware_id) is not None
     with pytest.raises(NameError):
         coord.get_module_by_id("non_existing.module")
+
+
+def test_get_module_by_id_reassigned(coord, slave_channel):
+    replacement = MockSlaveChannel()
+    assert coord.get_module_by_id(slave_channel.channel_id) is slave_channel
+    with mock.patch.object(coord, "slaves", {slave_channel.channel_id: replacement}):
+        assert coord.get_module_by_id(slave_channel.channel_id) is replacement
+    with mock.patch.object(coord, "slaves", {}):
+        with pytest.raises(NameError):
+            coord.get_module_by_id(slave_channel.channel_id)
+    assert coord.get_module_by_id(slave_channel.channel_id) is slave_channel
+    assert coord.modules[slave_channel.channel_id] is slave_channel
+
+
+def test_get_module_by_id_middleware(coord, middleware):
+    # Middlewares registered are looked up without going through the list.
+    with mock.patch.object(coord, "middlewares", []):
+        assert coord.get_module_by_id(middleware.middleware_id) is middleware
+    coord.remove_middleware(middleware)
+    try:
+        with pytest.raises(NameError):
+            coord.get_module_by_id(middleware.middleware_id)
+    finally:
+        coord.middlewares.insert(0, middleware)
+        coord.modules[middleware.middleware_id] = middleware
+    assert coord.get_module_by_id(middleware.middleware_id) is middleware
+
+
+def test_send_message_async(coord, slave_channel):
+    wonderland = slave_channel.get_chat('wonderland001')
+    msg = Message(
+        deliver_to=slave_channel,
+        chat=wonderland,
+        author=wonderland.self,
+        type=MsgType.Text,
+        text="Hello, world.",
+    )
+    future = coord.send_message_async(msg)
+    assert future.result(timeout=5) is msg
+    assert slave_channel.channel_id in coord.dispatch_queues
+    assert coord.send_message_async(None).result(timeout=5) is None
+
+
+def test_send_message_async_channel_not_found(coord, slave_channel):
+    alice = slave_channel.get_chat('alice')
+    msg = Message(
+        chat=alice,
+        author=alice.self,
+        type=MsgType.Text,
+        text="Hello, world.",
+    )
+    with pytest.raises(EFBChannelNotFound):
+        coord.send_message_async(msg).result(timeout=5)
+
+
+def test_stop_dispatch(coord):
+    coord.stop_dispatch()
+    assert not coord.dispatch_queues
+
+
+def test_send_message_async_in_order(coord, slave_channel):
+    wonderland = slave_channel.get_chat('wonderland001')
+    messages = [Message(
+        deliver_to=slave_channel,
+        chat=wonderland,
+        author=wonderland.self,
+        type=MsgType.Text,
+        text=str(i),
+        uid=str(i),
+    ) for i in range(16)]
+    delivered = []
+    coord.stop_dispatch()
+    with mock.patch.object(coord, "dispatch_workers", 4), \
+            mock.patch.object(slave_channel, "send_message", side_effect=lambda m: delivered.append(m.uid) or m):
+        futures = [coord.send_message_async(i) for i in messages]
+        for i in futures:
+            i.result(timeout=5)
+    assert delivered == [i.uid for i in messages]
+    assert len(coord.sequencer) == 0
+    assert coord.dispatch_queues[slave_channel.channel_id].workers == 4
+    coord.stop_dispatch()
+
+
+def test_send_message_async_concurrent_producers(coord, slave_channel):
+    wonderland = slave_channel.get_chat('wonderland001')
+    delivered = []
+    futures = []
+
+    def produce(producer):
+        for i in range(8):
+            futures.append(coord.send_message_async(Message(
+                deliver_to=slave_channel,
+                chat=wonderland,
+                author=wonderland.self,
+                type=MsgType.Text,
+                text=str(i),
+                uid="{}-{}".format(producer, i),
+            )))
+
+    coord.stop_dispatch()
+    with mock.patch.object(coord, "dispatch_workers", 1), \
+            mock.patch.object(slave_channel, "send_message", side_effect=lambda m: delivered.append(m.uid) or m):
+        producers = [threading.Thread(target=produce, args=(i,)) for i in range(4)]
+        for i in producers:
+            i.start()
+        for i in producers:
+            i.join()
+        for i in futures:
+            i.result(timeout=5)
+    assert len(delivered) == 32
+    for producer in range(4):
+        uids = [i for i in delivered if i.startswith("{}-".format(producer))]
+        assert uids == ["{}-{}".format(producer, i) for i in range(8)]
+    assert len(coord.sequencer) == 0
+    coord.stop_dispatch()
+
+
+def test_incremental_verification(coord, slave_channel, master_channel):
+    alice = slave_channel.get_chat('alice')
+
+    def make_message():
+        return Message(
+            deliver_to=master_channel,
+            chat=alice,
+            author=alice.other,
+            type=MsgType.Link,
+            text="Hello, world.",
+            uid="incremental",
+            attributes=LinkAttribute(title="Title", url="https://example.com"),
+        )
+
+    # Changes are not tracked when disabled.
+    assert make_message()._verified is None
+    with mock.patch.object(coord, "incremental_verification", True), \
+            mock.patch.object(LinkAttribute, "verify") as link_verify:
+        msg = make_message()
+        # Attributes left to defaults are not tracked from construction.
+        assert msg._changed_attributes() == {'chat', 'author', 'deliver_to', 'type', 'attributes'}
+        link_verify.reset_mock()
+        coord.send_message(msg)
+        link_verify.assert_called_once()
+        link_verify.reset_mock()
+
+        # Untouched attributes are skipped when the message is sent again.
+        msg.text = "Edited"
+        msg.edit = True
+        coord.send_message(msg)
+        link_verify.assert_not_called()
+    assert not msg._changed_attributes()
+
+
+def test_module_index(coord, master_channel, slave_channel, middleware):
+    assert coord.modules[master_channel.channel_id] is master_channel
+    assert coord.modules[slave_channel.channel_id] is slave_channel
+    assert coord.modules[middleware.middleware_id] is middleware
+
+
+def test_remove_middleware(coord):
+    extra_middleware = MockMiddleware(instance_id="removable")
+    coord.add_middleware(extra_middleware)
+    assert coord.get_module_by_id(extra_middleware.middleware_id) is extra_middleware
+    coord.remove_middleware(extra_middleware)
+    assert extra_middleware not in coord.middlewares
+    with pytest.raises(NameError):
+        coord.get_module_by_id(extra_middleware.middleware_id)
+
+
+def test_remove_channel(coord):
+    extra_slave = MockSlaveChannel(instance_id="removable")
+    coord.add_channel(extra_slave)
+    assert coord.get_module_by_id(extra_slave.channel_id) is extra_slave
+    coord.remove_channel(extra_slave)
+    assert extra_slave.channel_id not in coord.slaves
+    with pytest.raises(NameError):
+        coord.get_module_by_id(extra_slave.channel_id)
+    with pytest.raises(EFBChannelNotFound):
+        coord.remove_channel(extra_slave)
+
+
+def test_get_chat(coord, slave_channel):
+    with mock.patch.object(slave_channel, "get_chat", wraps=slave_channel.get_chat) as get_chat:
+        chat = coord.get_chat(slave_channel.channel_id, slave_channel.alice.uid)
+        assert chat is slave_channel.alice
+        assert coord.get_chat(slave_channel.channel_id, slave_channel.alice.uid) is chat
+        get_chat.assert_called_once_with(slave_channel.alice.uid)
+    with pytest.raises(EFBChatNotFound):
+        coord.get_chat(slave_channel.channel_id, "__nonexistent_chat__")
+    with pytest.raises(EFBChannelNotFound):
+        coord.get_chat("__nonexistent_channel__", slave_channel.alice.uid)
+
+
+def test_register_chat(coord, slave_channel):
+    chat = PrivateChat(channel=slave_channel, name="__name__", uid="__registered__")
+    coord.register_chat(chat)
+    assert coord.get_chat(slave_channel.channel_id, "__registered__") is chat
+    coord.send_status(ChatUpdates(slave_channel, modified_chats=["__registered__"]))
+    assert (slave_channel.channel_id, "__registered__") not in coord.chats
+    coord.register_chat(chat)
+    del chat
+    gc.collect()
+    assert (slave_channel.channel_id, "__registered__") not in coord.chats
+
+
+def test_prefetch_pictures(coord, slave_channel):
+    member = slave_channel.wonderland.get_member("bob")
+    chat = PrivateChat(module_id="__nonexistent_channel__", uid="__id__")
+    futures = coord.prefetch_pictures([slave_channel.alice, member, chat])
+    with futures[0].result(timeout=5) as f:
+        assert f.name.endswith("A.png")
+    with futures[1].result(timeout=5) as f:
+        assert f.name.endswith("B.png")
+    with pytest.raises(EFBChannelNotFound):
+        futures[2].result(timeout=5)
@@ -0,0 +1,161 @@
+import threading
+from concurrent.futures import Future
+
+from ehforwarderbot.dispatch import ChatSequencer, DispatchQueue, PrefetchPool
+
+
+def test_dispatch_queue():
+    queue = DispatchQueue("tests.dispatch", workers=2, max_size=4)
+    futures = [queue.submit(pow, i, 2) for i in range(8)]
+    assert [i.result(timeout=5) for i in futures] == [i ** 2 for i in range(8)]
+    queue.stop()
+
+
+def test_dispatch_queue_keys():
+    queue = DispatchQueue("tests.dispatch", workers=2, max_size=8)
+    release = threading.Event()
+    order = []
+
+    def deliver(i):
+        if i == 0:
+            release.wait(timeout=5)
+        order.append(i)
+        return i
+
+    futures = [queue.submit(deliver, i, key="chat_a") for i in range(4)]
+    # Deliveries waiting behind the blocked one do not occupy the other worker.
+    assert queue.submit(deliver, "b", key="chat_b").result(timeout=5) == "b"
+    assert order == ["b"]
+    release.set()
+    assert [i.result(timeout=5) for i in futures] == list(range(4))
+    assert order == ["b", 0, 1, 2, 3]
+    assert not queue._keys
+    queue.stop()
+
+
+def test_dispatch_queue_keys_fairness():
+    queue = DispatchQueue("tests.dispatch", workers=1)
+    release = threading.Event()
+    order = []
+
+    def deliver(i):
+        if i == "a0":
+            release.wait(timeout=5)
+        order.append(i)
+
+    futures = [queue.submit(deliver, "a0", key="chat_a"),
+               queue.submit(deliver, "b0", key="chat_b")]
+    futures += [queue.submit(deliver, "a{}".format(i), key="chat_a") for i in range(1, 50)]
+    release.set()
+    for i in futures:
+        i.result(timeout=5)
+    # A busy chat does not hold up others queued in the meantime.
+    assert order[:3] == ["a0", "b0", "a1"]
+    assert [i for i in order if i != "b0"] == ["a{}".format(i) for i in range(50)]
+    queue.stop()
+
+
+def test_dispatch_queue_stop_keys():
+    queue = DispatchQueue("tests.dispatch", workers=1)
+    release = threading.Event()
+
+    def deliver(i):
+        if i == 0:
+            release.wait(timeout=5)
+        return i
+
+    futures = [queue.submit(deliver, i, key="chat_a") for i in range(4)]
+    threading.Timer(0.1, release.set).start()
+    queue.stop()
+    assert [i.result(timeout=0) for i in futures] == list(range(4))
+
+
+def test_dispatch_queue_chained_future():
+    queue = DispatchQueue("tests.dispatch", workers=1)
+    pending = Future()
+    first = queue.submit(lambda: pending, key="chat_a")
+    second = queue.submit(lambda: "a1", key="chat_a")
+    # The worker is not held by the pending call.
+    assert queue.submit(lambda: "b0", key="chat_b").result(timeout=5) == "b0"
+    assert not first.done() and not second.done()
+    pending.set_result("a0")
+    assert first.result(timeout=5) == "a0"
+    assert second.result(timeout=5) == "a1"
+    queue.stop()
+
+
+def test_sequencer_same_key():
+    sequencer = ChatSequencer()
+    first = sequencer.reserve(("module", "chat"))
+    second = sequencer.reserve(("module", "chat"))
+    first.wait()
+    order = []
+
+    def run_second():
+        with second:
+            order.append("second")
+
+    thread = threading.Thread(target=run_second)
+    thread.start()
+    thread.join(timeout=0.1)
+    assert thread.is_alive()
+    order.append("first")
+    first.release()
+    thread.join(timeout=5)
+    assert order == ["first", "second"]
+    assert len(sequencer) == 0
+
+
+def test_sequencer_different_keys():
+    sequencer = ChatSequencer()
+    with sequencer.reserve(("module", "chat_a")):
+        ticket = sequencer.reserve(("module", "chat_b"))
+        assert ticket._turn.is_set()
+        ticket.release()
+
+
+def test_sequencer_reentrance():
+    sequencer = ChatSequencer()
+    with sequencer.reserve(("module", "chat")):
+        with sequencer.reserve(("module", "chat")):
+            pass
+    assert len(sequencer) == 0
+
+
+def test_sequencer_release_twice():
+    sequencer = ChatSequencer()
+    first = sequencer.reserve(("module", "chat"))
+    second = sequencer.reserve(("module", "chat"))
+    first.release()
+    first.release()
+    assert second._turn.is_set()
+    second.release()
+    assert len(sequencer) == 0
+
+
+def test_prefetch_pool_per_channel():
+    pool = PrefetchPool(workers=4, per_channel=2)
+    lock = threading.Lock()
+    release = threading.Event()
+    started = threading.Semaphore(0)
+    running = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+
+    def fetch(channel_id, i):
+        with lock:
+            running[channel_id] += 1
+            peak[channel_id] = max(peak[channel_id], running[channel_id])
+        started.release()
+        release.wait(timeout=5)
+        with lock:
+            running[channel_id] -= 1
+        return i
+
+    futures = [pool.submit(c, fetch, c, i) for i in range(6) for c in ("a", "b")]
+    # Wait until calls allowed are all running.
+    for _ in range(4):
+        assert started.acquire(timeout=5)
+    release.set()
+    assert [i.result(timeout=5) for i in futures] == [i for i in range(6) for _ in "ab"]
+    assert peak == {"a": 2, "b": 2}
+    pool.stop()
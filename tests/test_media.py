@@ -0,0 +1,203 @@
+import hashlib
+import io
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from ehforwarderbot import coordinator
+from ehforwarderbot.media import MediaStore, MediaFile, LazyMediaFile, SpooledMediaFile, map_file
+
+PICTURE = Path(__file__).parent / "mocks" / "A.png"
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return MediaStore(tmp_path / "media", max_size=1024, max_age=None)
+
+
+def test_add(store):
+    with store.add(b"content", suffix=".txt") as f:
+        assert isinstance(f, MediaFile)
+        assert f.read() == b"content"
+        assert f.path.name == hashlib.sha256(b"content").hexdigest() + ".txt"
+        assert not f.path.stat().st_mode & 0o222
+        with pytest.raises(io.UnsupportedOperation):
+            f.write(b"")
+    assert len(store) == 1
+    assert store.size == len(b"content")
+
+
+def test_add_path(store):
+    with store.add_path(PICTURE) as f:
+        assert f.path.suffix == ".png"
+        assert f.read() == PICTURE.read_bytes()
+
+
+def test_deduplication(store):
+    a = store.add(io.BytesIO(b"content"))
+    b = store.add(b"content")
+    assert a.path == b.path
+    assert len(store) == 1
+    assert store.size == len(b"content")
+    assert store._refs[a.path.name] == 2
+    a.close()
+    a.close()
+    assert store._refs[a.path.name] == 1
+    b.close()
+    assert a.path.name not in store._refs
+
+
+def test_eviction_by_size(store):
+    with store.add(b"a" * 512) as a:
+        pass
+    b = store.add(b"b" * 512)
+    c = store.add(b"c" * 512)
+    # Least recently used file without reference is evicted.
+    assert not a.path.exists()
+    assert a.path.name not in store
+    # Files referred are kept even beyond the budget.
+    d = store.add(b"d" * 512)
+    assert b.path.exists() and c.path.exists() and d.path.exists()
+    assert store.size == 512 * 3
+    for i in (b, c, d):
+        i.close()
+    store.evict()
+    assert store.size <= store.max_size
+
+
+def test_refer_by_name(store):
+    with store.add(b"a" * 1024) as a:
+        store.refer(a.path.name)
+    store.add(b"b" * 512).close()
+    assert a.path.exists()
+    store.release(a.path.name)
+    store.evict()
+    assert not a.path.exists()
+    with pytest.raises(FileNotFoundError):
+        store.refer(a.path.name)
+
+
+def test_eviction_by_age(store):
+    store.max_age = 60
+    with store.add(b"a") as a:
+        pass
+    store.evict()
+    assert a.path.exists()
+    with mock.patch("time.time", return_value=float("inf")):
+        store.evict()
+    assert not a.path.exists()
+    assert len(store) == 0
+
+
+def test_persistence(store):
+    with store.add(b"content") as f:
+        name = f.path.name
+    (store.path / "interrupted.tmp").write_bytes(b"")
+    store = MediaStore(store.path)
+    assert name in store
+    assert store.size == len(b"content")
+    assert not (store.path / "interrupted.tmp").exists()
+    with store.open(name) as f:
+        assert f.read() == b"content"
+    with pytest.raises(FileNotFoundError):
+        store.open("__nonexistent_file__")
+
+
+def test_get_media_store(coord):
+    store = coord.get_media_store()
+    assert store is coord.get_media_store()
+    assert store.path.parent.name == coordinator.profile
+    assert store.max_size == coordinator.media_store_size
+
+
+def test_getbuffer(store):
+    with store.add_path(PICTURE) as f:
+        f.seek(10)
+        view = f.getbuffer()
+        assert view.readonly
+        assert view == PICTURE.read_bytes()
+        assert f.tell() == 10
+        view.release()
+    with pytest.raises(ValueError):
+        f.getbuffer()
+    with store.add(b"") as f:
+        assert len(f.getbuffer()) == 0
+
+
+def test_getbuffer_after_close(store):
+    f = store.add(b"content")
+    view = f.getbuffer()
+    f.close()
+    # The mapping is kept until the view is released.
+    assert view == b"content"
+    view.release()
+
+
+def test_map_file(tmp_path):
+    assert map_file(io.BytesIO(b"content")) == b"content"
+    with PICTURE.open("rb") as f:
+        view = map_file(f)
+        assert view.readonly
+        assert view == PICTURE.read_bytes()
+        view.release()
+    empty = tmp_path / "empty"
+    empty.write_bytes(b"")
+    with empty.open("rb") as f:
+        assert len(map_file(f)) == 0
+
+
+def test_spooled_media_file():
+    with SpooledMediaFile(max_size=8, suffix=".bin") as f:
+        f.write(b"content")
+        assert f.in_memory
+        assert f.getbuffer() == b"content"
+        f.write(b"more content")
+        # Spilled beyond the threshold.
+        assert not f.in_memory
+        assert f.getbuffer() == b"contentmore content"
+        assert f.path.read_bytes() == b"contentmore content"
+    assert not f.path.exists()
+
+
+def test_spooled_media_file_path():
+    with SpooledMediaFile(max_size=1024, suffix=".bin") as f:
+        f.write(b"content")
+        f.seek(1)
+        path = f.path
+        assert not f.in_memory
+        assert path.suffix == ".bin"
+        assert path.read_bytes() == b"content"
+        assert f.tell() == 1
+        assert f.read() == b"ontent"
+    assert not path.exists()
+
+
+def test_spooled_media_file_default_size(coord):
+    with SpooledMediaFile() as f:
+        assert f._max_size == coordinator.media_spool_size
+
+
+def test_lazy_media_file():
+    f = LazyMediaFile(PICTURE)
+    assert not f.opened
+    assert f.seek(0) == 0 and f.tell() == 0
+    assert not f.opened
+    assert f.read(4) == PICTURE.read_bytes()[:4]
+    assert f.opened
+    f.release()
+    assert not f.opened
+    # Reopened from the same position.
+    assert f.tell() == 4
+    assert f.read() == PICTURE.read_bytes()[4:]
+    assert f.getbuffer() == PICTURE.read_bytes()
+    f.close()
+    assert f.closed and not f.opened
+    with pytest.raises(ValueError):
+        f.read()
+
+
+def test_lazy_media_file_missing(tmp_path):
+    f = LazyMediaFile(tmp_path / "missing")
+    with pytest.raises(FileNotFoundError):
+        f.read()
@@ -1,4 +1,6 @@
+import io
 import pickle
+from pathlib import Path
 from tempfile import NamedTemporaryFile
 from unittest import mock
 
@@ -6,8 +8,9 @@ import pytest
 
 from ehforwarderbot import Message, Chat, MsgType, coordinator
 from ehforwarderbot.chat import PrivateChat
+from ehforwarderbot.media import SpooledMediaFile, LazyMediaFile
 from ehforwarderbot.message import LinkAttribute, LocationAttribute, StatusAttribute, MessageCommands, \
-    MessageCommand, Substitutions
+    MessageCommand, Substitutions, MessageReference
 
 
 @pytest.fixture(scope="module")
@@ -215,6 +218,64 @@ def test_pickle_media_message(media_type, base_message):
             assert getattr(msg, attr) == getattr(msg_dup, attr)
 
 
+def test_lazy_path(base_message):
+    msg = base_message
+    msg.type = MsgType.Voice
+    msg.mime = "audio/ogg"
+    msg.file = SpooledMediaFile()
+    msg.file.write(b"voice")
+    msg.file.seek(0)
+    msg.verify()
+    repr(msg)
+    assert msg.file.in_memory
+    path = msg.path
+    assert not msg.file.in_memory
+    assert path.read_bytes() == b"voice"
+    msg.path = Path("voice.ogg")
+    assert msg.path == Path("voice.ogg")
+    msg.file.close()
+
+
+def test_unpickle_lazy_file(base_message):
+    with NamedTemporaryFile() as f:
+        f.write(b"content")
+        f.flush()
+        msg = base_message
+        msg.type = MsgType.File
+        msg.file = f
+        msg.path = f.name
+        msg_dup = pickle.loads(pickle.dumps(msg))
+        assert isinstance(msg_dup.file, LazyMediaFile)
+        assert not msg_dup.file.opened
+        assert msg_dup.file.read() == b"content"
+        msg_dup.close()
+        assert msg_dup.file.closed
+    msg_dup = pickle.loads(pickle.dumps(msg))
+    assert msg_dup.file is None
+
+
+def test_pickle_pathless_file(base_message):
+    msg = base_message
+    msg.type = MsgType.File
+    msg.file = io.BytesIO(b"content")
+    msg_dup = pickle.loads(pickle.dumps(msg))
+    assert msg_dup.path is None
+    assert msg_dup.file is None
+
+
+def test_pickle_spooled_file(base_message):
+    msg = base_message
+    msg.type = MsgType.File
+    msg.file = SpooledMediaFile()
+    msg.file.write(b"content")
+    msg_dup = pickle.loads(pickle.dumps(msg))
+    # Files kept in memory are not written to the disk.
+    assert msg.file.in_memory
+    assert msg_dup.path is None
+    assert msg_dup.file is None
+    msg.file.close()
+
+
 def test_pickle_link_attribute():
     link = LinkAttribute(title="a", description="b", image="c", url="d")
     link_dup = pickle.loads(pickle.dumps(link))
@@ -222,6 +283,33 @@ def test_pickle_link_attribute():
         assert getattr(link, attr) == getattr(link_dup, attr)
 
 
+def test_unpickle_link_attribute_dict():
+    # Attributes pickled before ``__slots__`` are introduced
+    link = LinkAttribute.__new__(LinkAttribute)
+    link.__setstate__({"title": "a", "description": "b", "image": "c", "url": "d"})
+    assert link.title == "a"
+    assert link.url == "d"
+
+
+def test_unpickle_link_attribute_removed():
+    # Attributes no longer defined are dropped.
+    link = LinkAttribute.__new__(LinkAttribute)
+    link.__setstate__({"title": "a", "removed": "b", "url": "d"})
+    assert link.title == "a"
+    assert link.url == "d"
+    assert not hasattr(link, "removed")
+
+
+def test_message_vendor_specific(base_message):
+    msg = base_message
+    assert not hasattr(msg, "__dict__") or not msg.__dict__
+    msg.vendor_specific["key"] = "value"
+    msg_dup = pickle.loads(pickle.dumps(msg))
+    assert msg_dup.vendor_specific == {"key": "value"}
+    msg_dup.extra = "value"
+    assert msg_dup.extra == "value"
+
+
 def test_pickle_location_attribute():
     location = LocationAttribute(latitude=1.0, longitude=-1.0)
     location_dup = pickle.loads(pickle.dumps(location))
@@ -249,3 +337,80 @@ def test_pickle_status():
         status_dup = pickle.loads(pickle.dumps(status))
         assert status.status_type == status_dup.status_type
         assert status.timeout == status_dup.timeout
+
+
+def test_verify_incremental(chat, master_channel):
+    with mock.patch.object(coordinator, "incremental_verification", True):
+        msg = Message(
+            deliver_to=master_channel,
+            author=chat.other,
+            chat=chat,
+            type=MsgType.Link,
+            text="Message",
+            attributes=LinkAttribute(title="Title", url="https://example.com"),
+        )
+        msg.verify()
+    with mock.patch.object(coordinator, "incremental_verification", True), \
+            mock.patch.object(LinkAttribute, "verify") as link_verify:
+        msg.text = "Edited message"
+        msg.verify()
+        link_verify.assert_not_called()
+        msg.deliver_to = None
+        with pytest.raises(AssertionError):
+            msg.verify()
+        msg.deliver_to = master_channel
+        msg.attributes = LinkAttribute(title="Title", url="https://example.com")
+        link_verify.reset_mock()
+        msg.verify()
+        link_verify.assert_called_once()
+
+
+def test_target_message(base_message, chat, master_channel):
+    base_message.uid = None
+    msg = Message(deliver_to=master_channel, author=chat.self, chat=chat, text="Reply", uid="1",
+                  target=base_message)
+    assert msg.target is base_message
+    msg.verify()
+
+
+def test_target_reference(base_message, chat, master_channel):
+    msg = Message(deliver_to=master_channel, author=chat.self, chat=chat, text="Reply", uid="1",
+                  target=MessageReference.from_message(base_message))
+    assert isinstance(msg.target, MessageReference)
+    assert (msg.target.chat, msg.target.uid, msg.target.author, msg.target.text, msg.target.type) == \
+           (chat, "0", chat.other, "Message", MsgType.Unsupported)
+    assert msg.target == MessageReference(chat, "0")
+    assert msg.target.resolve() is base_message
+    msg.verify()
+
+
+def test_target_chain_is_bounded(base_message, chat, master_channel):
+    msg = base_message
+    for i in range(1, 50):
+        msg = Message(deliver_to=master_channel, author=chat.self, chat=chat, text="Reply", uid=str(i),
+                      target=MessageReference.from_message(msg))
+    assert msg.target.uid == "48"
+    assert not hasattr(msg.target, "target")
+    # Pickles do not grow along the chain.
+    reply = Message(deliver_to=master_channel, author=chat.self, chat=chat, text="Reply", uid="a",
+                    target=MessageReference.from_message(base_message))
+    assert len(pickle.dumps(msg)) < len(pickle.dumps(reply)) + 10
+
+
+def test_target_resolve(base_message, chat, slave_channel):
+    reference = MessageReference(chat, "0")
+    with mock.patch.object(slave_channel, "get_message_by_id", return_value=base_message) as get_message_by_id:
+        assert reference.resolve() is base_message
+        assert reference.resolve() is base_message
+    get_message_by_id.assert_called_once_with(chat, "0")
+    assert MessageReference(chat, "1").resolve() is None
+
+
+def test_pickle_target(base_message, chat, master_channel):
+    msg = Message(deliver_to=master_channel, author=chat.self, chat=chat, text="Reply", uid="1",
+                  target=MessageReference.from_message(base_message))
+    msg_dup = pickle.loads(pickle.dumps(msg))
+    assert isinstance(msg_dup.target, MessageReference)
+    assert msg_dup.target == msg.target
+    assert msg_dup.target.text == "Message"
+    assert msg_dup.target._message is None
@@ -1,3 +1,9 @@
+from unittest import mock
+
+from ehforwarderbot import Middleware, MsgType
+from ehforwarderbot.status import ChatUpdates
+
+
 def test_append_text(master_channel, middleware):
     middleware.mode = "append_text"
     assert middleware.middleware_id in master_channel.send_text_msg().text
@@ -24,3 +30,61 @@ def test_get_extra_functions(middleware):
     assert len(extras) == 1
     assert "echo" in extras
     assert extras['echo'] == middleware.echo
+
+
+def test_subscribed_message_types(coord, master_channel, middleware):
+    middleware.mode = "interrupt"
+    with mock.patch.object(middleware, "subscribed_message_types", {MsgType.Link}):
+        coord._invalidate_routes()
+        assert master_channel.send_text_msg() is not None
+        assert master_channel.send_link_msg() is None
+    coord._invalidate_routes()
+
+
+def test_subscribed_destinations(coord, master_channel, middleware):
+    middleware.mode = "interrupt"
+    with mock.patch.object(middleware, "subscribed_destinations", {master_channel.channel_id}):
+        coord._invalidate_routes()
+        assert master_channel.send_text_msg() is not None
+    with mock.patch.object(middleware, "subscribed_sources", {master_channel.channel_id}):
+        coord._invalidate_routes()
+        assert master_channel.send_text_msg() is None
+    coord._invalidate_routes()
+
+
+def test_subscribed_status_types(coord, master_channel, middleware):
+    middleware.mode = "interrupt"
+    with mock.patch.object(middleware, "process_status", wraps=middleware.process_status) as process_status, \
+            mock.patch.object(middleware, "subscribed_status_types", {ChatUpdates}):
+        coord._invalidate_routes()
+        master_channel.send_message_recall_status()
+        process_status.assert_not_called()
+    coord._invalidate_routes()
+
+
+def test_skip_middleware_not_processing(coord, master_channel):
+    class NoOpMiddleware(Middleware):
+        middleware_id = "tests.test_middleware.NoOpMiddleware"
+
+    no_op = NoOpMiddleware()
+    coord.add_middleware(no_op)
+    try:
+        route = coord._get_route('message', (MsgType.Text, master_channel.channel_id, "any.slave"))
+        assert all(i[1] is not no_op for i in route)
+    finally:
+        coord.remove_middleware(no_op)
+
+
+def test_route_middleware_replaced(coord, master_channel, middleware):
+    class NoOpMiddleware(Middleware):
+        middleware_id = "tests.test_middleware.NoOpMiddleware"
+
+    key = (MsgType.Text, master_channel.channel_id, "any.slave")
+    index = coord.middlewares.index(middleware)
+    assert any(i[1] is middleware for i in coord._get_route('message', key))
+    coord.middlewares[index] = NoOpMiddleware()
+    try:
+        assert all(i[1] is not middleware for i in coord._get_route('message', key))
+    finally:
+        coord.middlewares[index] = middleware
+    assert any(i[1] is middleware for i in coord._get_route('message', key))
@@ -0,0 +1,307 @@
+import io
+import os
+import threading
+import time
+from pathlib import Path
+from shutil import copyfile
+from unittest import mock
+
+import pytest
+
+import ehforwarderbot.__main__
+from ehforwarderbot import Message, MsgType, coordinator
+from ehforwarderbot.exceptions import EFBMessageError, EFBChatNotFound, EFBMessageTypeNotSupported, \
+    EFBMessageRetrying
+from ehforwarderbot.media import SpooledMediaFile
+from ehforwarderbot.retry import RetryPolicy, DeadLetterQueue, find_policy
+
+PICTURE = Path(__file__).parent / "mocks" / "A.png"
+
+
+@pytest.fixture()
+def retry(coord):
+    policies = {k: v and RetryPolicy(initial_delay=0, jitter=0) for k, v in coordinator.retry_policies.items()}
+    with mock.patch.object(coordinator, "retry_enabled", True), \
+            mock.patch.object(coordinator, "retry_policies", policies), \
+            mock.patch("threading.Timer", wraps=threading.Timer) as timer:
+        yield timer
+    coord.stop_dispatch()
+    queue = coord.get_dead_letter_queue()
+    for i in queue.ids():
+        queue.remove(i)
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError("Timed out")
+
+
+def make_message(slave_channel, text="Message"):
+    alice = slave_channel.alice
+    return Message(chat=alice, author=alice.self, type=MsgType.Text, text=text, uid="retry",
+                   deliver_to=slave_channel)
+
+
+def test_delay():
+    policy = RetryPolicy(initial_delay=1, max_delay=5, multiplier=2, jitter=0.5)
+    for attempt, delay in ((1, 1), (2, 2), (3, 4), (4, 5), (10, 5)):
+        assert delay / 2 <= policy.delay(attempt) <= delay
+    assert RetryPolicy(initial_delay=1, jitter=0).delay(3) == 4
+
+
+def test_find_policy():
+    policy = RetryPolicy()
+    policies = {EFBMessageError: policy, EFBMessageTypeNotSupported: None}
+    assert find_policy(policies, EFBMessageError()) is policy
+    assert find_policy(policies, EFBMessageTypeNotSupported()) is None
+    assert find_policy(policies, EFBChatNotFound()) is None
+    assert find_policy(coordinator.retry_policies, ConnectionResetError()) is not None
+
+
+def test_setup_retry_policies():
+    policies = {EFBMessageError: RetryPolicy(jitter=0), ConnectionError: RetryPolicy(), EFBChatNotFound: None}
+    with mock.patch.object(coordinator, "retry_policies", policies):
+        ehforwarderbot.__main__.setup_retry_policies({
+            "max_attempts": 5,
+            "policies": {"EFBMessageError": {"max_attempts": 10, "max_delay": 5},
+                         "ConnectionError": None,
+                         "TimeoutError": {"initial_delay": 2}},
+        })
+        assert policies[EFBMessageError].max_attempts == 10
+        assert policies[EFBMessageError].max_delay == 5
+        assert policies[EFBMessageError].jitter == 0
+        assert policies[ConnectionError] is None
+        assert policies[TimeoutError].max_attempts == 5
+        assert policies[TimeoutError].initial_delay == 2
+        assert policies[EFBChatNotFound] is None
+        with pytest.raises(ValueError):
+            ehforwarderbot.__main__.setup_retry_policies({"policies": {"UnknownError": None}})
+
+
+def test_retry(retry, slave_channel):
+    msg = make_message(slave_channel)
+    with mock.patch.object(slave_channel, "send_message",
+                           side_effect=[EFBMessageError("Offline"), EFBMessageError(), msg]) as send_message:
+        # The sender is not blocked by retries.
+        with pytest.raises(EFBMessageRetrying) as exc_info:
+            coordinator.send_message(msg)
+        assert "Offline" in str(exc_info.value.error)
+        assert exc_info.value.future.result(timeout=5) is msg
+        assert send_message.call_count == 3
+    assert retry.call_count == 2
+    assert not len(coordinator.get_dead_letter_queue())
+
+
+def test_retry_async(retry, slave_channel):
+    msg = make_message(slave_channel)
+    with mock.patch.object(slave_channel, "send_message", side_effect=[EFBMessageError(), msg]):
+        assert coordinator.send_message_async(msg).result(timeout=5) is msg
+    with mock.patch.object(slave_channel, "send_message", side_effect=EFBMessageError("Offline")):
+        with pytest.raises(EFBMessageError, match="Offline"):
+            coordinator.send_message_async(msg).result(timeout=5)
+    assert len(coordinator.get_dead_letter_queue()) == 1
+
+
+def test_retry_order(retry, slave_channel):
+    policies = dict(coordinator.retry_policies)
+    policies[EFBMessageError] = RetryPolicy(initial_delay=0.1, jitter=0)
+    delivered = []
+
+    def send_message(m):
+        if m.text == "First" and not delivered:
+            delivered.append(None)
+            raise EFBMessageError()
+        delivered.append(m.text)
+        return m
+
+    with mock.patch.object(coordinator, "retry_policies", policies), \
+            mock.patch.object(slave_channel, "send_message", side_effect=send_message):
+        with pytest.raises(EFBMessageRetrying) as exc_info:
+            coordinator.send_message(make_message(slave_channel, "First"))
+        assert coordinator.send_message(make_message(slave_channel, "Second")).text == "Second"
+        assert exc_info.value.future.result(timeout=5).text == "First"
+        # Later messages of the chat wait for the message retried.
+        assert delivered == [None, "First", "Second"]
+
+        delivered.clear()
+        first = coordinator.send_message_async(make_message(slave_channel, "First"))
+        third = coordinator.send_message_async(make_message(slave_channel, "Third"))
+        assert third.result(timeout=5).text == "Third"
+        assert first.result(timeout=5).text == "First"
+    assert delivered == [None, "First", "Third"]
+
+
+def test_no_retry(retry, slave_channel):
+    msg = make_message(slave_channel)
+    with mock.patch.object(slave_channel, "send_message", side_effect=EFBChatNotFound()) as send_message:
+        with pytest.raises(EFBChatNotFound):
+            coordinator.send_message(msg)
+    send_message.assert_called_once()
+    retry.assert_not_called()
+    assert not len(coordinator.get_dead_letter_queue())
+
+
+def test_retry_disabled(coord, slave_channel):
+    msg = make_message(slave_channel)
+    with mock.patch.object(slave_channel, "send_message", side_effect=EFBMessageError()) as send_message:
+        with pytest.raises(EFBMessageError):
+            coordinator.send_message(msg)
+    send_message.assert_called_once()
+    assert not len(coord.get_dead_letter_queue())
+
+
+def test_dead_letter(retry, slave_channel):
+    msg = make_message(slave_channel)
+    queue = coordinator.get_dead_letter_queue()
+    with mock.patch.object(slave_channel, "send_message", side_effect=EFBMessageError("Offline")):
+        with pytest.raises(EFBMessageRetrying) as exc_info:
+            coordinator.send_message(msg)
+        with pytest.raises(EFBMessageError, match="Offline"):
+            exc_info.value.future.result(timeout=5)
+    assert len(queue) == 1
+    letter, = queue
+    assert letter.message.text == "Message"
+    assert letter.message.deliver_to is slave_channel
+    assert letter.destination == slave_channel.channel_id
+    assert letter.attempts == 3
+    assert "Offline" in letter.error
+
+    # Failed again, replays are not retried.
+    with mock.patch.object(slave_channel, "send_message", side_effect=EFBMessageError("Still offline")):
+        with pytest.raises(EFBMessageError):
+            queue.replay(letter.id)
+    letter, = queue
+    assert letter.attempts == 4
+    assert "Still offline" in letter.error
+
+    with mock.patch.object(slave_channel, "send_message", side_effect=lambda m: m) as send_message:
+        assert queue.replay(letter.id).text == "Message"
+    send_message.assert_called_once()
+    assert not len(queue)
+    with pytest.raises(KeyError):
+        queue.replay(letter.id)
+
+
+def test_stop_with_retry_scheduled(retry, slave_channel):
+    policies = dict(coordinator.retry_policies)
+    policies[EFBMessageError] = RetryPolicy(initial_delay=60)
+    with mock.patch.object(coordinator, "retry_policies", policies), \
+            mock.patch.object(slave_channel, "send_message", side_effect=EFBMessageError("Offline")) as send_message:
+        future = coordinator.send_message_async(make_message(slave_channel))
+        wait_for(lambda: coordinator._retry_timers)
+        coordinator.stop_dispatch()
+        with pytest.raises(EFBMessageError):
+            future.result(timeout=0)
+        # The chat is not held by the message any more.
+        with mock.patch.object(slave_channel, "send_message", side_effect=lambda m: m):
+            assert coordinator.send_message(make_message(slave_channel)) is not None
+    send_message.assert_called_once()
+    assert not coordinator._retry_timers
+    letter, = coordinator.get_dead_letter_queue()
+    assert letter.attempts == 1
+
+
+def test_dead_letter_file(tmp_path, coord, slave_channel):
+    path = tmp_path / "A.png"
+    copyfile(str(PICTURE), str(path))
+    msg = make_message(slave_channel)
+    msg.type = MsgType.Image
+    msg.path = path
+    msg.file = path.open("rb")
+    queue = DeadLetterQueue(tmp_path / "dead_letters")
+    letter_id = queue.put(msg, EFBMessageError(), 1)
+    msg.file.close()
+    os.remove(str(path))
+
+    # The file is kept in the media store until the entry is removed.
+    store = coord.get_media_store()
+    with mock.patch.object(store, "max_size", 1):
+        store.evict()
+        letter = queue.get(letter_id)
+        assert letter.message.path != path
+        assert letter.message.file.read() == PICTURE.read_bytes()
+        letter.message.close()
+
+        # References are restored when the queue is loaded again.
+        store.release(queue._media.pop(letter_id))
+        queue = DeadLetterQueue(tmp_path / "dead_letters")
+        store.evict()
+        assert letter.message.path.is_file()
+        assert queue.remove(letter_id)
+        store.evict()
+        assert not letter.message.path.is_file()
+    assert not queue.remove(letter_id)
+    assert queue.get(letter_id) is None
+
+
+def test_dead_letter_pathless_file(tmp_path, coord, slave_channel):
+    msg = make_message(slave_channel)
+    msg.type = MsgType.File
+    msg.filename = "content.txt"
+    msg.file = io.BytesIO(b"content")
+    msg.file.read()
+    queue = DeadLetterQueue(tmp_path / "dead_letters")
+    letter_id = queue.put(msg, EFBMessageError(), 1)
+    letter = queue.get(letter_id)
+    # The content is kept in the media store.
+    assert letter.message.path.parent == coord.get_media_store().path
+    assert letter.message.path.suffix == ".txt"
+    assert letter.message.file.read() == b"content"
+    letter.message.close()
+    assert [i.id for i in queue] == [letter_id]
+    assert queue.remove(letter_id)
+
+
+def test_dead_letter_spooled_file(tmp_path, coord, slave_channel):
+    msg = make_message(slave_channel)
+    msg.type = MsgType.File
+    msg.file = SpooledMediaFile(suffix=".txt")
+    msg.file.write(b"content")
+    queue = DeadLetterQueue(tmp_path / "dead_letters")
+    letter_id = queue.put(msg, EFBMessageError(), 1)
+    # The content is copied to the media store without a temporary file.
+    assert msg.file.in_memory
+    letter = queue.get(letter_id)
+    assert letter.message.path.parent == coord.get_media_store().path
+    assert letter.message.file.read() == b"content"
+    letter.message.close()
+    msg.file.close()
+    assert queue.remove(letter_id)
+
+
+def test_dead_letter_no_open_files(tmp_path, coord, slave_channel):
+    queue = DeadLetterQueue(tmp_path / "dead_letters")
+    for i in range(3):
+        msg = make_message(slave_channel)
+        msg.type = MsgType.File
+        msg.file = io.BytesIO(str(i).encode())
+        queue.put(msg, EFBMessageError(), 1)
+    with mock.patch("ehforwarderbot.media.MediaFile") as media_file:
+        queue = DeadLetterQueue(tmp_path / "dead_letters")
+    # Files are referred by name when the queue is loaded.
+    media_file.assert_not_called()
+    assert len(queue._media) == 3
+    for i in queue.ids():
+        queue.remove(i)
+
+
+def test_cli(retry, slave_channel, capsys):
+    with mock.patch.object(slave_channel, "send_message", side_effect=EFBMessageError("Offline")):
+        with pytest.raises(EFBMessageError):
+            coordinator.send_message_async(make_message(slave_channel)).result(timeout=5)
+    letter_id, = coordinator.get_dead_letter_queue().ids()
+
+    args = ehforwarderbot.__main__.parser.parse_args(["dead-letters"])
+    assert args.action == "list"
+    ehforwarderbot.__main__.dead_letters(args, {})
+    output = capsys.readouterr().out
+    assert letter_id in output and "Offline" in output
+
+    args = ehforwarderbot.__main__.parser.parse_args(["dead-letters", "remove", letter_id, "unknown"])
+    ehforwarderbot.__main__.dead_letters(args, {})
+    output = capsys.readouterr().out
+    assert "Removed" in output and "Not found" in output
+    assert not coordinator.get_dead_letter_queue().ids()
@@ -0,0 +1,188 @@
+import pickle
+from tempfile import NamedTemporaryFile
+
+import pytest
+
+from ehforwarderbot import Message, MsgType, serialization
+from ehforwarderbot.chat import GroupChat, PrivateChat, ChatMember, SystemChatMember
+from ehforwarderbot.media import LazyMediaFile, SpooledMediaFile
+from ehforwarderbot.message import LinkAttribute, LocationAttribute, StatusAttribute, MessageCommands, \
+    MessageCommand, Substitutions, MessageReference
+from ehforwarderbot.status import ChatUpdates, MemberUpdates, MessageRemoval, ReactToMessage, \
+    MessageReactionsUpdate
+
+MESSAGE_ATTRIBUTES = ("type", "uid", "text", "chat", "author", "deliver_to", "edit", "edit_media",
+                      "is_system", "filename", "mime", "path", "substitutions", "reactions", "vendor_specific")
+
+
+@pytest.fixture()
+def group_message(coord, slave_channel, master_channel):
+    group = slave_channel.wonderland
+    carol = group.get_member("carol")
+    target = Message(chat=group, author=group.self, type=MsgType.Text, text="Hi", uid="1",
+                     deliver_to=slave_channel)
+    return Message(
+        chat=group, author=carol, type=MsgType.Link, text="@dave @you see this", uid="2",
+        deliver_to=master_channel,
+        attributes=LinkAttribute(title="Title", description="Description", url="https://example.com/"),
+        commands=MessageCommands([MessageCommand("Echo", "echo", args=("a",), kwargs={"b": 1})]),
+        substitutions=Substitutions({(0, 5): group.get_member("dave"), (6, 10): group.self}),
+        reactions={"👍": [group.get_member("bob"), carol]},
+        target=target,
+        vendor_specific={"key": ["value", 1, 2.5, None, True]},
+    )
+
+
+def assert_same_message(a, b):
+    for attr in MESSAGE_ATTRIBUTES:
+        assert getattr(a, attr) == getattr(b, attr), attr
+    assert (a.target is None) == (b.target is None)
+    if a.target is not None:
+        for attr in ("uid", "chat", "author", "text", "type"):
+            assert getattr(a.target, attr) == getattr(b.target, attr), "target." + attr
+
+
+def test_round_trip_message(group_message):
+    data = serialization.dumps(group_message)
+    msg = serialization.loads(data)
+    assert_same_message(msg, group_message)
+    assert_same_message(msg, pickle.loads(pickle.dumps(group_message)))
+    assert msg.chat is group_message.chat
+    assert msg.author is group_message.author
+    assert msg.attributes.title == "Title" and msg.attributes.url == "https://example.com/"
+    command = msg.commands[0]
+    assert (command.name, command.callable_name, command.args, command.kwargs) == ("Echo", "echo", ("a",), {"b": 1})
+    msg.verify()
+
+
+def test_target_reference(group_message):
+    assert isinstance(serialization.loads(serialization.dumps(group_message)).target, Message)
+    group_message.target = MessageReference.from_message(group_message.target)
+    msg = serialization.loads(serialization.dumps(group_message))
+    assert isinstance(msg.target, MessageReference)
+    assert_same_message(msg, group_message)
+
+
+def test_smaller_than_pickle(slave_channel, master_channel):
+    group = GroupChat(channel=slave_channel, name="Large group", uid="large_group")
+    for i in range(100):
+        group.add_member(name=f"Member {i}", uid=f"member{i}")
+    msg = Message(chat=group, author=group.get_member("member0"), type=MsgType.Text, text="Hi", uid="1",
+                  deliver_to=master_channel)
+    assert len(serialization.dumps(msg)) * 10 < len(pickle.dumps(msg))
+
+
+def test_snapshot(group_message, slave_channel):
+    msg = serialization.loads(serialization.dumps(group_message), resolve_chats=False)
+    assert_same_message(msg, group_message)
+    assert isinstance(msg.chat, GroupChat)
+    assert msg.chat is not slave_channel.wonderland
+    assert msg.chat.name == "Wonderland"
+    # Members referred are restored in the same chat object.
+    assert msg.author.chat is msg.chat
+    assert msg.author is msg.chat.get_member("carol")
+    assert msg.substitutions[(6, 10)] is msg.chat.self
+    assert msg.target.chat is msg.chat
+    assert {i.uid for i in msg.chat.members} == {"__self__", "carol", "dave", "bob"}
+    msg.verify()
+
+
+def test_unknown_chat(slave_channel, master_channel):
+    chat = PrivateChat(channel=slave_channel, name="Nobody", uid="__nonexistent_chat__")
+    system = chat.make_system_member(name="System", uid="system")
+    middleware_member = ChatMember(chat, name="Middleware", uid="mw")
+    middleware_member.module_id = "tests.mocks.middleware"
+    msg = Message(chat=chat, author=system, type=MsgType.Location, text="", uid="3",
+                  attributes=LocationAttribute(latitude=1.5, longitude=-2.5),
+                  substitutions=Substitutions({(0, 1): middleware_member}),
+                  deliver_to=master_channel)
+    result = serialization.loads(serialization.dumps(msg))
+    assert result.chat == chat and result.chat is not chat
+    assert isinstance(result.author, SystemChatMember)
+    assert result.attributes.latitude == 1.5 and result.attributes.longitude == -2.5
+    assert result.substitutions[(0, 1)].module_id == "tests.mocks.middleware"
+    assert result.substitutions[(0, 1)].module_name == chat.module_name
+
+
+def test_message_file(group_message):
+    with NamedTemporaryFile() as f:
+        f.write(b"content")
+        f.flush()
+        group_message.type = MsgType.File
+        group_message.attributes = None
+        group_message.file = f
+        group_message.path = f.name
+        msg = serialization.loads(serialization.dumps(group_message))
+        assert isinstance(msg.file, LazyMediaFile)
+        assert msg.file.read() == b"content"
+        msg.close()
+    msg = serialization.loads(serialization.dumps(group_message))
+    assert msg.file is None
+
+
+def test_message_spooled_file(group_message):
+    group_message.type = MsgType.File
+    group_message.attributes = None
+    group_message.file = SpooledMediaFile()
+    group_message.file.write(b"content")
+    msg = serialization.loads(serialization.dumps(group_message))
+    # Files kept in memory are not written to the disk.
+    assert group_message.file.in_memory
+    assert msg.path is None
+    assert msg.file is None
+    group_message.file.close()
+
+
+def test_status_attribute(group_message):
+    group_message.type = MsgType.Status
+    group_message.attributes = StatusAttribute(StatusAttribute.Types.UPLOADING_FILE, timeout=100)
+    msg = serialization.loads(serialization.dumps(group_message))
+    assert msg.attributes.status_type == StatusAttribute.Types.UPLOADING_FILE
+    assert msg.attributes.timeout == 100
+
+
+@pytest.mark.parametrize("make_status", [
+    lambda s, m, msg: ChatUpdates(s, new_chats=["a"], removed_chats=["b"], modified_chats=["c"]),
+    lambda s, m, msg: MemberUpdates(s, "wonderland001", new_members=["a"], removed_members=[],
+                                    modified_members=["c"]),
+    lambda s, m, msg: MessageRemoval(m, s, msg),
+    lambda s, m, msg: ReactToMessage(s.wonderland, "1", "👍"),
+    lambda s, m, msg: MessageReactionsUpdate(s.wonderland, "1", {"👍": [s.wonderland.self]}),
+], ids=["ChatUpdates", "MemberUpdates", "MessageRemoval", "ReactToMessage", "MessageReactionsUpdate"])
+def test_round_trip_status(make_status, group_message, slave_channel, master_channel):
+    status = make_status(slave_channel, master_channel, group_message)
+    result = serialization.loads(serialization.dumps(status))
+    expected = pickle.loads(pickle.dumps(status))
+    assert type(result) is type(status)
+    for key, value in vars(expected).items():
+        if isinstance(value, Message):
+            assert_same_message(getattr(result, key), value)
+        elif isinstance(value, (list, tuple)):
+            assert list(getattr(result, key)) == list(value)
+        else:
+            assert getattr(result, key) == value, key
+    result.verify()
+
+
+def test_invalid_payload(group_message):
+    data = serialization.dumps(group_message)
+    with pytest.raises(ValueError):
+        serialization.loads(b"not a payload")
+    with pytest.raises(ValueError):
+        serialization.loads(data[:-5])
+    with pytest.raises(ValueError):
+        serialization.loads(data[:3] + bytes([serialization.VERSION + 1]) + data[4:])
+    with pytest.raises(TypeError):
+        serialization.dumps("text")
+
+
+@pytest.mark.parametrize("value", [
+    None, True, False, 0, 127, 128, -1, -2 ** 70, 2 ** 70, 1.5, "", "文字", b"\x00\xff",
+    [1, [2]], (1, (2,)), {"a": {1: None}}, {1, 2}, MsgType.Text,
+])
+def test_values(value):
+    out = bytearray()
+    serialization._pack(value, out)
+    result = serialization._Unpacker(bytes(out), 0).value()
+    assert result == value
+    assert type(result) is type(value)
@@ -0,0 +1,223 @@
+import time
+from unittest import mock
+
+import pytest
+
+from ehforwarderbot import Message, MsgType, coordinator
+from ehforwarderbot.channel import Channel
+from ehforwarderbot.status import MessageRemoval
+from ehforwarderbot.store import MessageStore, MessageIDMap
+
+
+@pytest.fixture()
+def store(tmp_path):
+    store = MessageStore(tmp_path / "messages.db", max_messages=10, batch_size=4, flush_interval=60)
+    yield store
+    store.close()
+
+
+def make_message(chat, uid, text="Message", deliver_to=None):
+    return Message(chat=chat, author=chat.other, type=MsgType.Text, text=text, uid=uid,
+                   deliver_to=deliver_to)
+
+
+def test_record(store, slave_channel):
+    alice = slave_channel.alice
+    store.record(make_message(alice, "1"))
+    msg = store.get(alice.module_id, alice.uid, "1")
+    assert msg.text == "Message"
+    assert msg.chat is alice
+    assert (alice.module_id, alice.uid, "1") in store
+    assert store.get(alice.module_id, alice.uid, "2") is None
+
+    store.record(make_message(alice, "1", text="Edited"))
+    assert store.get(alice.module_id, alice.uid, "1").text == "Edited"
+    store.remove(alice.module_id, alice.uid, "1")
+    assert store.get(alice.module_id, alice.uid, "1") is None
+    assert len(store) == 0
+
+
+def test_batched_writes(store, slave_channel):
+    alice = slave_channel.alice
+    with mock.patch.object(store, "flush", wraps=store.flush) as flush:
+        for i in range(3):
+            store.record(make_message(alice, str(i)))
+        flush.assert_not_called()
+        # Pending writes are visible to reads.
+        assert store.get(alice.module_id, alice.uid, "0") is not None
+        store.record(make_message(alice, "3"))
+        flush.assert_called_once()
+    assert not store._pending
+
+
+def test_flush_interval(tmp_path, slave_channel):
+    store = MessageStore(tmp_path / "messages.db", flush_interval=0.01)
+    store.record(make_message(slave_channel.alice, "1"))
+    store._flusher.join(0.5)
+    for _ in range(100):
+        if not store._pending:
+            break
+        store._stop.wait(0.01)
+    assert not store._pending
+    store.close()
+
+
+def test_persistence(tmp_path, slave_channel):
+    alice = slave_channel.alice
+    store = MessageStore(tmp_path / "messages.db")
+    store.record(make_message(alice, "1"))
+    store.close()
+    with pytest.raises(ValueError):
+        store.record(make_message(alice, "2"))
+    store = MessageStore(tmp_path / "messages.db")
+    assert store.get(alice.module_id, alice.uid, "1").text == "Message"
+    assert store._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    store.close()
+
+
+def test_pruning(store, slave_channel):
+    alice = slave_channel.alice
+    for i in range(12):
+        store.record(make_message(alice, str(i)))
+    # Rewriting a message makes it the most recent one.
+    store.record(make_message(alice, "0"))
+    store.flush()
+    assert len(store) == 10
+    assert (alice.module_id, alice.uid, "0") in store
+    assert (alice.module_id, alice.uid, "1") not in store
+    assert (alice.module_id, alice.uid, "2") not in store
+    assert (alice.module_id, alice.uid, "3") in store
+
+
+def test_record_without_id(store, slave_channel):
+    with pytest.raises(ValueError):
+        store.record(make_message(slave_channel.alice, None))
+
+
+def test_coordinator_records_messages(coord, slave_channel, master_channel):
+    store = coord.get_message_store()
+    assert store is coord.get_message_store()
+    alice = slave_channel.alice
+    key = (alice.module_id, alice.uid, "store_1")
+
+    coordinator.send_message(make_message(alice, "store_1", deliver_to=master_channel))
+    assert key not in store
+
+    with mock.patch.object(slave_channel, "use_message_store", True):
+        coordinator.send_message(make_message(alice, "store_1", deliver_to=master_channel))
+        assert key in store
+        # Default implementation of get_message_by_id
+        assert Channel.get_message_by_id(slave_channel, alice, "store_1").text == "Message"
+
+        coordinator.send_status(MessageRemoval(slave_channel, master_channel,
+                                               make_message(alice, "store_1")))
+        assert key not in store
+        assert Channel.get_message_by_id(slave_channel, alice, "store_1") is None
+
+    with pytest.raises(NotImplementedError):
+        Channel.get_message_by_id(slave_channel, alice, "store_1")
+
+
+def test_coordinator_records_all_messages(coord, slave_channel, master_channel):
+    alice = slave_channel.alice
+    with mock.patch.object(coordinator, "message_store_enabled", True):
+        coordinator.send_message(make_message(alice, "store_2", deliver_to=slave_channel))
+    assert (alice.module_id, alice.uid, "store_2") in coord.get_message_store()
+
+
+@pytest.fixture()
+def id_map(tmp_path):
+    id_map = MessageIDMap(tmp_path / "message_ids.db", max_size=3, max_age=None, batch_size=4, flush_interval=60)
+    yield id_map
+    id_map.close()
+
+
+def test_id_map(id_map):
+    id_map.add("slave", "chat", master_uid="m1", slave_uid="s1")
+    assert id_map.get_slave_id("slave", "chat", "m1") == "s1"
+    assert id_map.get_master_id("slave", "chat", "s1") == "m1"
+    assert id_map.get_slave_id("slave", "other_chat", "m1") is None
+    assert id_map.get_master_id("slave", "chat", "m1") is None
+
+    # The slave channel changes the ID again.
+    id_map.add("slave", "chat", master_uid="m1", slave_uid="s2")
+    assert id_map.get_slave_id("slave", "chat", "m1") == "s2"
+    assert id_map.get_master_id("slave", "chat", "s1") is None
+    assert id_map.get_master_id("slave", "chat", "s2") == "m1"
+
+    id_map.remove("slave", "chat", "s2")
+    assert id_map.get_slave_id("slave", "chat", "m1") is None
+    assert len(id_map) == 0
+
+
+def test_id_map_eviction(id_map):
+    for i in range(3):
+        id_map.add("slave", "chat", master_uid=f"m{i}", slave_uid=f"s{i}")
+    # Used entries are kept over the least recently used ones.
+    assert id_map.get_slave_id("slave", "chat", "m0") == "s0"
+    id_map.add("slave", "chat", master_uid="m3", slave_uid="s3")
+    assert len(id_map) == 3
+    assert id_map.get_slave_id("slave", "chat", "m1") is None
+    assert id_map.get_master_id("slave", "chat", "s1") is None
+    assert id_map.get_slave_id("slave", "chat", "m0") == "s0"
+
+    id_map.max_age = 60
+    with mock.patch("time.time", return_value=time.time() + 120):
+        assert id_map.get_slave_id("slave", "chat", "m0") is None
+        id_map.evict()
+    assert len(id_map) == 0
+
+
+def test_id_map_lazy_recency(tmp_path):
+    id_map = MessageIDMap(tmp_path / "message_ids.db", max_size=2, max_age=None, batch_size=4, flush_interval=60)
+    id_map.add("slave", "chat", master_uid="m0", slave_uid="s0")
+    id_map.add("slave", "chat", master_uid="m1", slave_uid="s1")
+    id_map.flush()
+    # Lookups do not queue writes.
+    assert id_map.get_slave_id("slave", "chat", "m0") == "s0"
+    assert id_map.get_master_id("slave", "chat", "s0") == "m0"
+    assert not id_map._pending
+    # Times of use are written on flush, and kept across restarts.
+    id_map.close()
+    id_map = MessageIDMap(tmp_path / "message_ids.db", max_size=2, max_age=None, batch_size=4, flush_interval=60)
+    id_map.add("slave", "chat", master_uid="m2", slave_uid="s2")
+    assert id_map.get_slave_id("slave", "chat", "m0") == "s0"
+    assert id_map.get_slave_id("slave", "chat", "m1") is None
+    id_map.close()
+
+
+def test_id_map_persistence(tmp_path):
+    id_map = MessageIDMap(tmp_path / "message_ids.db")
+    id_map.add("slave", "chat", master_uid="m1", slave_uid="s1")
+    id_map.add("slave", "chat", master_uid="m2", slave_uid="s2")
+    id_map.remove("slave", "chat", "s2")
+    id_map.close()
+    id_map = MessageIDMap(tmp_path / "message_ids.db")
+    assert len(id_map) == 1
+    assert id_map.get_slave_id("slave", "chat", "m1") == "s1"
+    assert id_map.get_master_id("slave", "chat", "s1") == "m1"
+    id_map.close()
+
+
+def test_coordinator_maps_message_ids(coord, slave_channel, master_channel):
+    alice = slave_channel.alice
+
+    def send_message(msg):
+        msg.uid = "slave_" + msg.uid
+        return msg
+
+    with mock.patch.object(slave_channel, "send_message", side_effect=send_message):
+        coordinator.send_message(make_message(alice, "1", deliver_to=slave_channel))
+        id_map = coord.get_message_id_map()
+        assert id_map.get_slave_id(alice.module_id, alice.uid, "1") == "slave_1"
+
+        # Edits are sent with the ID from the slave channel.
+        edit = make_message(alice, "slave_1", deliver_to=slave_channel)
+        edit.edit = True
+        coordinator.send_message(edit)
+        assert id_map.get_slave_id(alice.module_id, alice.uid, "1") == "slave_slave_1"
+        assert id_map.get_master_id(alice.module_id, alice.uid, "slave_slave_1") == "1"
+
+    coordinator.send_status(MessageRemoval(master_channel, slave_channel,
+                                           make_message(alice, "slave_slave_1")))
+    assert id_map.get_slave_id(alice.module_id, alice.uid, "1") is None